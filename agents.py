@@ -8,31 +8,122 @@ This module defines the four specialized agents for our story-writing crew:
 4. Narrative Editor - Reviews and refines for coherence and polish
 """
 
+import uuid
+
 from crewai import Agent
-from langchain_ollama import ChatOllama
 from config import *
+from concurrency import get_default_concurrency_limiter
+from deadlines import get_default_latency_tracker
+from cassette import cassette_transport
+from generation_limits import StageChatOllama, StageValidator
+from llm_cache import get_default_cache
+from llm_adapter import LangChainChatLLM
+from ollama_pool import SESSION_HEADER, get_default_pool
+from prompt_prefix import prefix_first_layout, shared_num_ctx
 
 class StoryWritingAgents:
     """Container class for all story-writing agents"""
     
-    def __init__(self):
+    def __init__(self, cache=None, callback_factory=None, endpoint_pool=None, transport=None, deadline=None,
+                 prefix_tracker=None, prefix_reuse=PROMPT_PREFIX_REUSE):
         """
         Initialize agents with Ollama LLM
         
+        Each agent gets its own LLM configured from its stage's entry in
+        STAGE_LLM_SETTINGS (see config.py), so stages can run on different models.
+        
         Args:
-            model_name: Ollama model name to use (defaults to llama3.2)
+            cache: Optional LLM response cache (e.g. llm_cache.DiskLLMCache);
+                defaults to the shared cache configured by LLM_CACHE_PATH
+            callback_factory: Optional callable taking a stage name ("plot", "characters",
+                "scenes" or "editing") and an optional branch label, and returning LangChain
+                callback handlers for that stage's LLM
+            endpoint_pool: Optional ollama_pool.OllamaEndpointPool to spread calls over several
+                Ollama servers; defaults to the shared pool configured by OLLAMA_URLS
+            transport: Optional httpx transport shared by every LLM's HTTP client, so
+                connections are pooled across agents (and across crews that share it);
+                takes precedence over endpoint_pool
+            deadline: Optional deadlines.RunDeadline bounding every LLM call of a run
+            prefix_tracker: Optional prompt_prefix.PrefixReuseTracker measuring the prompt
+                prefixes the stages share
+            prefix_reuse: Lay prompts out so stages share their prefix, give stages on one model
+                the same num_ctx and keep these agents' calls on one endpoint of the pool
         """
-        self.llm = ChatOllama(
-            model=LLM_MODEL,
-            temperature=0.7,
-            base_url=OLLAMA_URL
-        )
+        self.cache = cache if cache is not None else get_default_cache()
+        self.callback_factory = callback_factory
+        self.endpoint_pool = endpoint_pool if endpoint_pool is not None else get_default_pool()
+        self.transport = transport
+        self.deadline = deadline
+        self.latency = get_default_latency_tracker()
+        self.limiter = get_default_concurrency_limiter()
+        self.prefix_tracker = prefix_tracker
+        self.prefix_reuse = prefix_reuse
+        # Session id the endpoint pool uses to route all of these agents' calls to the same server
+        self.session = uuid.uuid4().hex if prefix_reuse else None
+        self._num_ctx = shared_num_ctx(STAGE_LLM_SETTINGS) if prefix_reuse else {}
+        
+        self.llm = self._create_llm()
         
         self.plot_architect = self._create_plot_architect()
         self.character_crafter = self._create_character_crafter()
         self.scene_weaver = self._create_scene_weaver()
         self.narrative_editor = self._create_narrative_editor()
     
+    def _create_llm(self, stage=None, branch=None):
+        """
+        Create an Ollama LLM with the stage's model settings and callbacks when a stage is given
+        
+        branch labels an agent that runs alongside others of the same stage (a variant,
+        act or edit chunk, e.g. "v2" or "act1") so it can get callbacks of its own.
+        """
+        settings = STAGE_LLM_SETTINGS.get(stage, {})
+        callbacks = None
+        if stage and self.callback_factory:
+            callbacks = self.callback_factory(stage, branch)
+        
+        # With a pool, every request is routed by the transport; base_url is only a placeholder
+        transport = self.transport
+        if transport is None and self.endpoint_pool is not None:
+            transport = self.endpoint_pool.transport()
+        # Record the calls to a cassette, or answer them from one, when OLLAMA_CASSETTE_MODE is set
+        transport = cassette_transport(transport)
+        sync_client_kwargs = {}
+        if transport is not None:
+            sync_client_kwargs["transport"] = transport
+        # A stalled server must not keep the reading thread forever
+        if LLM_CALL_TIMEOUT:
+            sync_client_kwargs["timeout"] = LLM_CALL_TIMEOUT
+        if self.session:
+            sync_client_kwargs["headers"] = {SESSION_HEADER: self.session}
+        
+        return StageChatOllama(
+            model=ollama_model_name(settings.get("model", LLM_MODEL)),
+            temperature=settings.get("temperature", LLM_TEMPERATURE),
+            # A model loaded with another num_ctx is reloaded, which drops its prompt cache
+            num_ctx=self._num_ctx.get(stage) or settings.get("num_ctx"),
+            num_predict=settings.get("num_predict"),
+            base_url=OLLAMA_URL,
+            keep_alive=OLLAMA_KEEP_ALIVE or None,  # Keep the model pinned between stages
+            cache=self.cache,
+            callbacks=callbacks,
+            sync_client_kwargs=sync_client_kwargs,
+            # End long-form stages once they meet their word or character limits
+            validator=StageValidator(settings.get("max_words"), settings.get("max_characters")),
+            deadline=self.deadline,
+            latency=self.latency,
+            limiter=self.limiter
+        )
+    
+    def _agent_llm(self, stage, branch=None):
+        """Create the stage's LLM wrapped so CrewAI calls the ChatOllama instance directly"""
+        return LangChainChatLLM(
+            self._create_llm(stage, branch),
+            stop=STAGE_LLM_SETTINGS[stage]["stop"],
+            prompt_layout=prefix_first_layout if self.prefix_reuse else None,
+            prefix_tracker=self.prefix_tracker,
+            stage=stage
+        )
+    
     def _create_plot_architect(self):
         """Create the Plot Architect agent"""
         return Agent(
@@ -43,9 +134,9 @@ class StoryWritingAgents:
             engage readers from beginning to end. Your expertise lies in developing three-act 
             structures, character-driven plots, and thematic coherence. You understand how to 
             balance pacing, tension, and resolution to create emotionally satisfying stories.""",
-            verbose=True,
+            verbose=CREW_VERBOSE,
             allow_delegation=False,
-            llm=self.llm
+            llm=self._agent_llm("plot")
         )
     
     def _create_character_crafter(self):
@@ -59,13 +150,13 @@ class StoryWritingAgents:
             characters drive the plot forward through their desires, fears, and relationships. 
             You understand how character arcs intersect with plot development to create 
             emotionally resonant narratives.""",
-            verbose=True,
+            verbose=CREW_VERBOSE,
             allow_delegation=False,
-            llm=self.llm
+            llm=self._agent_llm("characters")
         )
     
-    def _create_scene_weaver(self):
-        """Create the Scene Weaver agent"""
+    def _create_scene_weaver(self, branch=None):
+        """Create the Scene Weaver agent, optionally for one branch of the scene stage"""
         return Agent(
             role="Scene Weaver",
             goal="Write engaging, vivid scenes that bring the plot and characters to life through dialogue, action, and description",
@@ -74,13 +165,13 @@ class StoryWritingAgents:
             to create scenes that advance the plot while developing characters. Your writing 
             is vivid and emotionally compelling, drawing readers into the world of the story. 
             You understand pacing, tension, and the importance of showing rather than telling.""",
-            verbose=True,
+            verbose=CREW_VERBOSE,
             allow_delegation=False,
-            llm=self.llm
+            llm=self._agent_llm("scenes", branch)
         )
     
-    def _create_narrative_editor(self):
-        """Create the Narrative Editor agent"""
+    def _create_narrative_editor(self, branch=None):
+        """Create the Narrative Editor agent, optionally for one branch of the editing stage"""
         return Agent(
             role="Narrative Editor",
             goal="Review and refine the story for coherence, pacing, flow, and overall narrative quality",
@@ -89,9 +180,9 @@ class StoryWritingAgents:
             and areas where the story can be strengthened. Your expertise lies in ensuring 
             thematic coherence, character consistency, and smooth transitions between scenes. 
             You polish prose while maintaining the author's voice and vision.""",
-            verbose=True,
+            verbose=CREW_VERBOSE,
             allow_delegation=False,
-            llm=self.llm
+            llm=self._agent_llm("editing", branch)
         )
     
     def get_all_agents(self):
@@ -0,0 +1,242 @@
+"""
+Run Artifacts
+
+This module gives every crew run its own directory for the files it produces
+(plot, characters, draft, final story, run report), so concurrent runs in one
+working directory no longer overwrite each other's plot_structure.txt or
+final_story.txt. Files are handed to a write-behind thread and written
+atomically (temporary file, then rename), which keeps disk I/O off the
+critical path of the run.
+
+An append-only index.jsonl in the artifact root records every run's id,
+prompt, status and location for quick lookup, and finished runs can be
+packed into a compressed tar archive.
+"""
+
+import atexit
+import json
+import os
+import queue
+import shutil
+import tarfile
+import threading
+import time
+
+from config import ARTIFACT_DIR, ARTIFACT_ARCHIVE
+
+INDEX_FILE = "index.jsonl"
+
+
+def _write_atomic(path, data):
+    """Write text or bytes to path through a temporary file and a rename"""
+    tmp_path = f"{path}.tmp"
+    if isinstance(data, bytes):
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+    else:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+    os.replace(tmp_path, path)
+
+
+class RunArtifacts:
+    """The artifact directory of one run"""
+
+    def __init__(self, store, run_id, story_prompt):
+        self.store = store
+        self.run_id = run_id
+        self.story_prompt = story_prompt
+        self.directory = os.path.join(store.root, run_id)
+        self.files = []
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, name):
+        """Path of an artifact of this run"""
+        return os.path.join(self.directory, name)
+
+    def write(self, name, content):
+        """Queue an artifact to be written atomically in the background"""
+        if name not in self.files:
+            self.files.append(name)
+        self.store.submit(_write_atomic, self.path(name), content)
+
+    def write_json(self, name, payload):
+        """Queue a JSON artifact"""
+        self.write(name, json.dumps(payload, indent=2, ensure_ascii=False))
+
+
+class RunArtifactStore:
+    """Root directory of per-run artifact directories with a write-behind thread and an index"""
+
+    def __init__(self, root=ARTIFACT_DIR, archive=ARTIFACT_ARCHIVE):
+        """
+        Open (or create) the store
+
+        Args:
+            root: Directory holding one subdirectory (or archive) per run and index.jsonl
+            archive: Pack each finished run into <run_id>.tar.gz and remove its directory
+        """
+        self.root = root
+        self.archive = archive
+        self.index_path = os.path.join(root, INDEX_FILE)
+        os.makedirs(root, exist_ok=True)
+
+        self._runs = {}
+        self._by_prompt = {}
+        self._lock = threading.Lock()
+        self._load_index()
+
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_behind, name="artifact-writer", daemon=True)
+        self._writer.start()
+        # Queued writes are part of the run's output; don't lose them at interpreter exit
+        atexit.register(self.flush)
+
+    def _load_index(self):
+        """Read the index; later records of a run replace earlier ones"""
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    self._remember(json.loads(line))
+                except ValueError:
+                    # A torn last line from a crash; the next record of that run fixes it
+                    continue
+
+    def _remember(self, record):
+        self._runs[record["run_id"]] = record
+        run_ids = self._by_prompt.setdefault(record["story_prompt"], [])
+        if record["run_id"] not in run_ids:
+            run_ids.append(record["run_id"])
+
+    def _write_behind(self):
+        while True:
+            function, args, done = self._queue.get()
+            try:
+                if function is not None:
+                    function(*args)
+            except Exception as e:
+                print(f"⚠️  Could not write run artifact: {e}")
+            finally:
+                if done is not None:
+                    done.set()
+                self._queue.task_done()
+
+    def submit(self, function, *args):
+        """Run function(*args) on the write-behind thread, after everything queued before it"""
+        self._queue.put((function, args, None))
+
+    def flush(self, timeout=None):
+        """
+        Wait until every queued write is on disk
+
+        Returns:
+            True when the queue drained within the timeout
+        """
+        done = threading.Event()
+        self._queue.put((None, (), done))
+        return done.wait(timeout)
+
+    def start_run(self, story_prompt, run_id):
+        """
+        Create the artifact directory of a new run and index it as running
+
+        Args:
+            story_prompt: The run's story prompt
+            run_id: Unique id of the run, used as its directory name
+
+        Returns:
+            The run's RunArtifacts
+        """
+        run = RunArtifacts(self, run_id, story_prompt)
+        self._index({
+            "run_id": run_id,
+            "story_prompt": story_prompt,
+            "status": "running",
+            "started": time.time(),
+            "path": run.directory
+        })
+        return run
+
+    def finished_path(self, run):
+        """Where a run's artifacts end up once it is finished: its directory or its archive"""
+        return f"{run.directory}.tar.gz" if self.archive else run.directory
+
+    def finish_run(self, run, status):
+        """Index a run as finished once its artifacts are written, archiving it if configured"""
+        record = dict(self.get(run.run_id) or {}, status=status, finished=time.time(), files=list(run.files),
+                      path=self.finished_path(run))
+        if self.archive:
+            self.submit(self._archive, run.directory, record["path"])
+        self.submit(self._index, record)
+
+    @staticmethod
+    def _archive(directory, archive_path):
+        """Pack a run directory into a .tar.gz archive and remove the directory"""
+        tmp_path = f"{archive_path}.tmp"
+        with tarfile.open(tmp_path, "w:gz") as archive:
+            archive.add(directory, arcname=os.path.basename(directory))
+        os.replace(tmp_path, archive_path)
+        shutil.rmtree(directory, ignore_errors=True)
+
+    def _index(self, record):
+        """Append a run record to the index"""
+        with self._lock:
+            self._remember(record)
+            # One short line per append, so concurrent processes don't interleave records
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def get(self, run_id):
+        """Return the index record of a run, or None"""
+        with self._lock:
+            return self._runs.get(run_id)
+
+    def find(self, story_prompt):
+        """Return the index records of every run of a prompt, newest first"""
+        with self._lock:
+            return [self._runs[run_id] for run_id in reversed(self._by_prompt.get(story_prompt, []))]
+
+    def read(self, run_id, name):
+        """
+        Read an artifact of a finished run, from its directory or its archive
+
+        Returns:
+            The artifact's text, or None when the run or artifact does not exist
+        """
+        self.flush()
+        record = self.get(run_id)
+        if record is None:
+            return None
+        path = record["path"]
+        try:
+            if path.endswith(".tar.gz"):
+                with tarfile.open(path, "r:gz") as archive:
+                    return archive.extractfile(f"{run_id}/{name}").read().decode("utf-8")
+            with open(os.path.join(path, name), 'r', encoding='utf-8') as f:
+                return f.read()
+        except (OSError, KeyError):
+            return None
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_artifact_store():
+    """
+    Return the process-wide artifact store configured by ARTIFACT_DIR
+
+    Returns:
+        A shared RunArtifactStore, or None when ARTIFACT_DIR is not set
+    """
+    global _default_store
+
+    if not ARTIFACT_DIR:
+        return None
+
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = RunArtifactStore()
+        return _default_store
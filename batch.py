@@ -0,0 +1,212 @@
+"""
+Batch Story Generation
+
+This module runs many story prompts through independent crews at once.
+A bounded worker pool keeps a fixed number of crews in flight so a single
+Ollama server with several parallel slots stays busy, each job is held to a
+timeout, and results are appended to a JSONL file as soon as each job finishes.
+The timeout is passed to the crew as its run deadline, so a job that runs out
+of time fails its next LLM call and stops instead of running on unobserved.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from dotenv import load_dotenv
+
+# config reads the environment at import time, so .env has to be loaded first
+load_dotenv()
+
+from config import BATCH_CONCURRENCY, BATCH_JOB_TIMEOUT, BATCH_ARTIFACT_DIR, OLLAMA_WARMUP, RUN_SLO_SECONDS
+from artifacts import RunArtifactStore, get_default_artifact_store
+from warmup import preload_models, release_models, print_warmup_report
+from ollama_pool import get_default_pool
+from concurrency import get_default_concurrency_limiter
+
+
+def load_prompts(path):
+    """
+    Load story jobs from a JSONL or CSV file
+
+    JSONL lines may be objects with a "prompt" (and optional "id") field or
+    bare JSON strings. CSV files need a "prompt" column and may have an "id"
+    column.
+
+    Args:
+        path: Path to a .jsonl/.json or .csv file
+
+    Returns:
+        A list of {"id": ..., "prompt": ...} dicts
+    """
+    jobs = []
+    extension = os.path.splitext(path)[1].lower()
+
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if extension == ".csv":
+            rows = list(csv.DictReader(f))
+        elif extension in (".jsonl", ".json"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            raise ValueError(f"Unsupported prompt file type: {extension} (use .jsonl or .csv)")
+
+    for index, row in enumerate(rows, 1):
+        if isinstance(row, str):
+            row = {"prompt": row}
+        prompt = (row.get("prompt") or "").strip()
+        if not prompt:
+            raise ValueError(f"Job {index} in {path} has no prompt")
+        jobs.append({"id": str(row.get("id") or index), "prompt": prompt})
+
+    return jobs
+
+
+def _default_crew_factory(story_prompt, job_timeout=None, artifact_store=None):
+    """Build a fresh crew for one prompt whose run deadline is the job timeout"""
+    from crew import StoryWritingCrew
+    slo_seconds = min(filter(None, (job_timeout, RUN_SLO_SECONDS)), default=0)
+    return StoryWritingCrew(story_prompt=story_prompt, slo_seconds=slo_seconds, artifact_store=artifact_store)
+
+
+class BatchStoryRunner:
+    """Runs many story prompts concurrently with a bounded number of crews"""
+
+    def __init__(self, concurrency=BATCH_CONCURRENCY, job_timeout=BATCH_JOB_TIMEOUT, crew_factory=None,
+                 artifact_store=None):
+        """
+        Initialize the batch runner
+
+        Args:
+            concurrency: Maximum number of crews running at the same time
+            job_timeout: Seconds a single job may run; the default crews get it as their run
+                deadline, so their LLM calls stop once it is used up
+            crew_factory: Callable taking a prompt and returning an object with write_story();
+                a custom crew has to enforce job_timeout itself (e.g. through slo_seconds)
+            artifact_store: artifacts.RunArtifactStore the default crews write each job's files
+                to; defaults to ARTIFACT_DIR, or else BATCH_ARTIFACT_DIR, so concurrent jobs never
+                share the fixed output file names
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+
+        self.concurrency = concurrency
+        self.job_timeout = job_timeout
+        if crew_factory is None:
+            if artifact_store is None:
+                artifact_store = get_default_artifact_store() or RunArtifactStore(BATCH_ARTIFACT_DIR)
+            crew_factory = partial(_default_crew_factory, job_timeout=job_timeout, artifact_store=artifact_store)
+        self.crew_factory = crew_factory
+
+    def _run_job(self, job, record):
+        """Run a single job on a worker thread, noting where its artifacts went in its record"""
+        crew = self.crew_factory(job["prompt"])
+        try:
+            return str(crew.write_story())
+        finally:
+            artifacts = (getattr(crew, "report", None) or {}).get("artifacts")
+            if artifacts:
+                record["artifacts"] = artifacts
+
+    async def _run_one(self, job, slots, executor, loop):
+        """Run one job inside a worker slot and return its result record"""
+        record = {"id": job["id"], "prompt": job["prompt"]}
+        async with slots:
+            started = time.perf_counter()
+            try:
+                # A worker thread can't be interrupted; the crew's run deadline ends the
+                # job, and the slot is only handed back once the thread has returned.
+                record["result"] = await loop.run_in_executor(executor, self._run_job, job, record)
+                record["status"] = "ok"
+            except Exception as e:
+                elapsed = time.perf_counter() - started
+                if self.job_timeout and elapsed >= self.job_timeout:
+                    record["status"] = "timeout"
+                    record["error"] = f"Job exceeded {self.job_timeout}s: {e}"
+                else:
+                    record["status"] = "error"
+                    record["error"] = str(e)
+            finally:
+                record["elapsed_s"] = round(time.perf_counter() - started, 3)
+
+        return record
+
+    async def _run_all(self, jobs, output_path):
+        """Schedule every job and append each record to the output file as it finishes"""
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.concurrency)
+        summary = {"total": len(jobs), "ok": 0, "error": 0, "timeout": 0}
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="story-batch") as executor:
+            pending = [asyncio.ensure_future(self._run_one(job, slots, executor, loop)) for job in jobs]
+            with open(output_path, 'a', encoding='utf-8') as out:
+                for finished in asyncio.as_completed(pending):
+                    record = await finished
+                    summary[record["status"]] += 1
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                    print(f"[{summary['ok'] + summary['error'] + summary['timeout']}/{summary['total']}] "
+                          f"job {record['id']}: {record['status']} ({record['elapsed_s']}s)")
+
+        return summary
+
+    def run(self, jobs, output_path):
+        """
+        Run all jobs and stream their results to a JSONL file
+
+        Args:
+            jobs: List of {"id": ..., "prompt": ...} dicts
+            output_path: JSONL file that result records are appended to
+
+        Returns:
+            A summary dict with total/ok/error/timeout counts
+        """
+        return asyncio.run(self._run_all(jobs, output_path))
+
+
+def main():
+    """Command-line entry point for batch runs"""
+    parser = argparse.ArgumentParser(description="Generate stories for many prompts concurrently")
+    parser.add_argument("prompts", help="JSONL or CSV file with story prompts")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl", help="JSONL file to append results to")
+    parser.add_argument("-c", "--concurrency", type=int, default=BATCH_CONCURRENCY, help="Crews to run at once")
+    parser.add_argument("-t", "--timeout", type=float, default=BATCH_JOB_TIMEOUT, help="Per-job timeout in seconds")
+    args = parser.parse_args()
+
+    jobs = load_prompts(args.prompts)
+    print(f"Running {len(jobs)} jobs with concurrency {args.concurrency} (timeout {args.timeout}s)")
+    print("=" * 60)
+
+    # Pin every model for the whole batch and report the cold-load cost up front
+    if OLLAMA_WARMUP:
+        print("Preloading models...")
+        print_warmup_report(preload_models())
+
+    runner = BatchStoryRunner(concurrency=args.concurrency, job_timeout=args.timeout)
+    try:
+        summary = runner.run(jobs, args.output)
+    finally:
+        if OLLAMA_WARMUP:
+            release_models()
+
+    print("=" * 60)
+    print(f"Done: {summary['ok']} ok, {summary['error']} failed, {summary['timeout']} timed out")
+
+    pool = get_default_pool()
+    if pool is not None:
+        for endpoint in pool.stats():
+            print(f"  {endpoint['url']}: {endpoint['requests']} requests, {endpoint['failures']} failures")
+    limiter = get_default_concurrency_limiter()
+    if limiter is not None:
+        state = limiter.snapshot()
+        print(f"  LLM concurrency limit settled at {state['limit']} "
+              f"({state['increases']} increases, {state['decreases']} decreases)")
+    print(f"Results written to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
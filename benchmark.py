@@ -0,0 +1,243 @@
+"""
+Crew Benchmark
+
+This module drives StoryWritingCrew end to end against the fake Ollama server
+and reports per-stage latency, the time spent outside the model
+(crewai/langchain overhead), peak memory and throughput at several
+concurrency levels, plus the startup time of the CLI in fresh processes.
+Results are written to a JSON file so runs can be compared over time.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_ollama import FakeOllamaServer
+
+
+def _timed_run(story_prompt):
+    """Run one crew and return its wall time and per-stage latencies"""
+    from crew import StoryWritingCrew
+
+    crew = StoryWritingCrew(story_prompt=story_prompt, checkpoint_dir="")
+    completions = {}
+
+    for stage, task in crew.tasks.get_stage_tasks():
+        previous_callback = task.callback
+
+        def _record(output, stage=stage, previous_callback=previous_callback):
+            completions[stage] = time.perf_counter()
+            if previous_callback:
+                previous_callback(output)
+
+        task.callback = _record
+
+    started = time.perf_counter()
+    crew.write_story()
+    finished = time.perf_counter()
+
+    stages = {}
+    previous = started
+    for stage, _ in crew.tasks.get_stage_tasks():
+        if stage in completions:
+            stages[stage] = round(completions[stage] - previous, 4)
+            previous = completions[stage]
+
+    return {"wall_s": finished - started, "stages": stages}
+
+
+def run_level(server, concurrency, runs, story_prompt):
+    """Run a number of crews at one concurrency level and summarise them"""
+    requests_before = server.stats()
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(_timed_run, [story_prompt] * runs))
+
+    elapsed = time.perf_counter() - started
+    requests_after = server.stats()
+    model_seconds = requests_after["busy_seconds"] - requests_before["busy_seconds"]
+    walls = sorted(result["wall_s"] for result in results)
+
+    stage_names = results[0]["stages"].keys() if results else []
+    return {
+        "concurrency": concurrency,
+        "runs": runs,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_runs_per_min": round(runs / elapsed * 60, 2),
+        "run_wall_s": {
+            "mean": round(statistics.mean(walls), 3),
+            "p50": round(walls[len(walls) // 2], 3),
+            "max": round(walls[-1], 3)
+        },
+        "stage_latency_s": {
+            stage: round(statistics.mean(result["stages"][stage] for result in results), 4)
+            for stage in stage_names
+        },
+        "llm_requests": requests_after["requests"] - requests_before["requests"],
+        "model_time_s": round(model_seconds, 3),
+        # Time spent in crewai/langchain rather than waiting on the (fake) model
+        "overhead_s_per_run": round((sum(walls) - model_seconds) / runs, 3),
+        "peak_server_in_flight": requests_after["peak_in_flight"]
+    }
+
+
+# Commands timed by the startup benchmark, run from the project directory
+STARTUP_COMMANDS = {
+    "main_help": ["main.py", "--help"],
+    "main_dry_run": ["main.py", "--dry-run"],
+    "import_crew": ["-c", "import crew"]
+}
+
+
+def benchmark_startup(repeats=5):
+    """
+    Time fresh interpreter startups of the CLI and of importing the crew
+
+    Each command runs in a new Python process against the fake server, so the
+    numbers include interpreter start and every import, just like a cron job or
+    container health check.
+
+    Returns:
+        A dict of command name to its min/median/max wall time in seconds
+    """
+    project_dir = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for name, command in STARTUP_COMMANDS.items():
+        times = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            subprocess.run([sys.executable] + command, cwd=project_dir, env=os.environ.copy(),
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            times.append(time.perf_counter() - started)
+        results[name] = {
+            "min": round(min(times), 3),
+            "median": round(statistics.median(times), 3),
+            "max": round(max(times), 3)
+        }
+    return results
+
+
+def measure_import_heap():
+    """
+    Measure the Python heap that importing the crew allocates, in a fresh traced process
+
+    Returns:
+        Peak traced bytes while importing crew
+    """
+    project_dir = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.run(
+        [sys.executable, "-X", "tracemalloc", "-c",
+         "import crew, tracemalloc, sys; sys.__stdout__.write(str(tracemalloc.get_traced_memory()[1]))"],
+        cwd=project_dir, env=os.environ.copy(), capture_output=True, text=True, check=True
+    ).stdout
+    return int(output.strip().splitlines()[-1])
+
+
+@contextlib.contextmanager
+def _quiet(verbose):
+    """Send the crews' verbose output to os.devnull unless asked to show it"""
+    if verbose:
+        yield
+        return
+    # A null stream rather than a buffer, which would grow with the output and skew the heap figures
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        yield
+
+
+def main():
+    """Command-line entry point for the benchmark"""
+    parser = argparse.ArgumentParser(description="Benchmark StoryWritingCrew against a fake Ollama server")
+    parser.add_argument("--concurrency", default="1,2,4", help="Comma-separated concurrency levels")
+    parser.add_argument("--runs", type=int, default=0, help="Crew runs per level (default: the concurrency level)")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake time to first token in seconds")
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0, help="Fake decode speed")
+    parser.add_argument("--output-tokens", type=int, default=300, help="Fake tokens per response")
+    parser.add_argument("--prompt", default="A short sci-fi story about a rogue AI discovering emotions")
+    parser.add_argument("-o", "--output", default="benchmark_results.json", help="JSON file for the results")
+    parser.add_argument("--verbose", action="store_true", help="Show crew output while benchmarking")
+    parser.add_argument("--startup-repeats", type=int, default=5,
+                        help="Fresh processes per CLI startup measurement (0 skips it)")
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output)
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    server = FakeOllamaServer(latency=args.latency, tokens_per_sec=args.tokens_per_sec,
+                              output_tokens=args.output_tokens).start()
+    os.environ["OLLAMA_URL"] = server.url
+    os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+    if not args.verbose:
+        # Read when crew is imported; CrewAI prints some panels after a run returns, past any redirect
+        os.environ["CREW_VERBOSE"] = "false"
+
+    # Stage output files are written to the working directory; keep them out of the way
+    os.chdir(tempfile.mkdtemp(prefix="crew-bench-"))
+
+    print(f"Benchmarking against fake Ollama at {server.url}")
+    startup = {}
+    if args.startup_repeats:
+        print("  CLI startup...", flush=True)
+        startup = benchmark_startup(args.startup_repeats)
+        for name, times in startup.items():
+            print(f"    {name}: {times['median']}s median")
+
+    # Timed without tracemalloc, which slows every allocation down; memory is measured in its own pass below
+    import_started = time.perf_counter()
+    import crew  # noqa: F401  (measure import cost once, up front)
+    import_s = time.perf_counter() - import_started
+
+    levels_report = []
+    try:
+        for level in levels:
+            runs = args.runs or level
+            print(f"  concurrency {level}: {runs} runs...", flush=True)
+            with _quiet(args.verbose):
+                report = run_level(server, level, runs, args.prompt)
+            levels_report.append(report)
+            print(f"    {report['throughput_runs_per_min']} runs/min, "
+                  f"{report['overhead_s_per_run']}s overhead per run")
+
+        print("  memory...", flush=True)
+        import_heap = measure_import_heap()
+        tracemalloc.start()
+        with _quiet(args.verbose):
+            _timed_run(args.prompt)
+        _, peak_traced = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        server.stop()
+
+    results = {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "fake_server": {
+            "latency_s": args.latency,
+            "tokens_per_sec": args.tokens_per_sec,
+            "output_tokens": args.output_tokens
+        },
+        "import_s": round(import_s, 3),
+        "startup_s": startup,
+        "import_python_heap_mb": round(import_heap / 2 ** 20, 2),
+        "peak_python_heap_mb": round(peak_traced / 2 ** 20, 2),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2),
+        "levels": levels_report
+    }
+
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
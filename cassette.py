@@ -0,0 +1,249 @@
+"""
+Record/Replay of Ollama Calls
+
+This module captures the HTTP traffic between ChatOllama and Ollama in a
+cassette file and plays it back later without a server. RecordingTransport
+sits in front of the real transport and stores every request's key and every
+chunk of its streamed response, with the time it arrived; ReplayTransport
+answers the same requests from the cassette, optionally with the original
+timing. A replayed crew run exercises all of crewai and langchain, which makes
+it useful for profiling orchestration overhead, testing schedulers and
+reproducing slow runs on machines without a GPU.
+
+Cassettes are gzip-compressed JSON lines, one interaction per line.
+"""
+
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import httpx
+
+from config import OLLAMA_CASSETTE, OLLAMA_CASSETTE_MODE, OLLAMA_CASSETTE_TIMING, OLLAMA_CASSETTE_STRICT
+
+
+class CassetteMiss(LookupError):
+    """Raised when a replayed request has no recorded response"""
+
+
+def request_key(request):
+    """Identify a request by its method, path and (canonicalised JSON) body"""
+    body = request.content or b""
+    try:
+        payload = json.loads(body)
+        # CrewAI merges stop words through a set, so their order changes from process to process
+        options = payload.get("options") if isinstance(payload, dict) else None
+        if isinstance(options, dict) and isinstance(options.get("stop"), list):
+            options["stop"] = sorted(options["stop"])
+        body = json.dumps(payload, sort_keys=True).encode("utf-8")
+    except ValueError:
+        pass
+    digest = hashlib.sha256(request.method.encode("ascii") + b" " + request.url.path.encode("utf-8") + b"\n" + body)
+    return digest.hexdigest()
+
+
+class Cassette:
+    """Recorded interactions in request order"""
+
+    def __init__(self, path, interactions=None):
+        """
+        Args:
+            path: Cassette file (.jsonl.gz)
+            interactions: Interactions already recorded
+        """
+        self.path = path
+        self.interactions = interactions if interactions is not None else []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """Read a cassette file"""
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return cls(path, [json.loads(line) for line in f if line.strip()])
+
+    def add(self, interaction):
+        """Append an interaction; its chunks may still be filled in while it streams"""
+        with self._lock:
+            self.interactions.append(interaction)
+
+    def save(self):
+        """Atomically write the cassette"""
+        with self._lock:
+            lines = [json.dumps(interaction, ensure_ascii=False) + "\n" for interaction in self.interactions]
+        tmp_path = f"{self.path}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            f.writelines(lines)
+        os.replace(tmp_path, self.path)
+
+
+class _RecordingStream(httpx.SyncByteStream):
+    """Response body that records each chunk and when it arrived"""
+
+    def __init__(self, stream, interaction, started):
+        self._stream = stream
+        self._interaction = interaction
+        self._started = started
+
+    def __iter__(self):
+        for chunk in self._stream:
+            # latin-1 maps bytes to text one to one, so chunks split inside a UTF-8 character survive
+            offset = round(time.perf_counter() - self._started, 4)
+            self._interaction["chunks"].append([offset, chunk.decode("latin-1")])
+            yield chunk
+
+    def close(self):
+        self._stream.close()
+
+
+class RecordingTransport(httpx.BaseTransport):
+    """httpx transport that records every interaction with the transport behind it"""
+
+    def __init__(self, cassette, transport=None):
+        """
+        Args:
+            cassette: Cassette the interactions are added to
+            transport: Transport that reaches Ollama; defaults to a plain httpx.HTTPTransport
+        """
+        self.cassette = cassette
+        self._transport = transport if transport is not None else httpx.HTTPTransport()
+
+    def handle_request(self, request):
+        started = time.perf_counter()
+        response = self._transport.handle_request(request)
+        interaction = {
+            "key": request_key(request),
+            "method": request.method,
+            "path": request.url.path,
+            "status": response.status_code,
+            "content_type": response.headers.get("content-type", "application/json"),
+            "chunks": []
+        }
+        self.cassette.add(interaction)
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_RecordingStream(response.stream, interaction, started),
+            extensions=response.extensions
+        )
+
+    def close(self):
+        self._transport.close()
+
+
+class _ReplayStream(httpx.SyncByteStream):
+    """Response body played back from recorded chunks"""
+
+    def __init__(self, chunks, timing):
+        self._chunks = chunks
+        self._timing = timing
+
+    def __iter__(self):
+        started = time.perf_counter()
+        for offset, text in self._chunks:
+            if self._timing:
+                delay = offset - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            yield text.encode("latin-1")
+
+
+class ReplayTransport(httpx.BaseTransport):
+    """httpx transport that answers requests from a cassette instead of a server"""
+
+    def __init__(self, cassette, timing=OLLAMA_CASSETTE_TIMING, strict=OLLAMA_CASSETTE_STRICT):
+        """
+        Args:
+            cassette: Cassette to play back
+            timing: Deliver chunks with the delays they were recorded with
+            strict: Only answer requests identical to recorded ones; otherwise a request
+                without an exact match gets the next unused interaction for the same path
+        """
+        self.timing = timing
+        self.strict = strict
+        self._by_key = {}
+        self._by_path = {}
+        self._used = set()
+        self._lock = threading.Lock()
+        for interaction in cassette.interactions:
+            self._by_key.setdefault(interaction["key"], deque()).append(interaction)
+            self._by_path.setdefault(interaction["path"], deque()).append(interaction)
+
+    def _next(self, recorded):
+        while recorded:
+            interaction = recorded.popleft()
+            if id(interaction) not in self._used:
+                self._used.add(id(interaction))
+                return interaction
+        return None
+
+    def handle_request(self, request):
+        with self._lock:
+            interaction = self._next(self._by_key.get(request_key(request), deque()))
+            if interaction is None and not self.strict:
+                interaction = self._next(self._by_path.get(request.url.path, deque()))
+        if interaction is None:
+            raise CassetteMiss(f"No recorded response for {request.method} {request.url.path}")
+
+        return httpx.Response(
+            status_code=interaction["status"],
+            headers={"content-type": interaction["content_type"]},
+            stream=_ReplayStream(interaction["chunks"], self.timing)
+        )
+
+
+_default_cassette = None
+_default_replay = None
+_default_cassette_lock = threading.Lock()
+
+
+def get_default_cassette():
+    """
+    Return the process-wide cassette configured by OLLAMA_CASSETTE and OLLAMA_CASSETTE_MODE
+
+    A recorded cassette is saved when the process exits.
+
+    Returns:
+        A shared Cassette, or None when neither recording nor replaying
+    """
+    global _default_cassette
+
+    if not OLLAMA_CASSETTE or OLLAMA_CASSETTE_MODE not in ("record", "replay"):
+        return None
+
+    with _default_cassette_lock:
+        if _default_cassette is None:
+            if OLLAMA_CASSETTE_MODE == "replay":
+                _default_cassette = Cassette.load(OLLAMA_CASSETTE)
+            else:
+                _default_cassette = Cassette(OLLAMA_CASSETTE)
+                atexit.register(_default_cassette.save)
+        return _default_cassette
+
+
+def cassette_transport(transport=None):
+    """
+    Wrap a transport for recording or replace it for replay, as configured
+
+    Args:
+        transport: The transport that would reach Ollama, or None for httpx's default
+
+    Returns:
+        A RecordingTransport or ReplayTransport, or transport unchanged when no cassette is configured
+    """
+    global _default_replay
+
+    cassette = get_default_cassette()
+    if cassette is None:
+        return transport
+    if OLLAMA_CASSETTE_MODE == "replay":
+        # One replay for the whole process, so every recorded interaction is played back once
+        with _default_cassette_lock:
+            if _default_replay is None:
+                _default_replay = ReplayTransport(cassette)
+            return _default_replay
+    return RecordingTransport(cassette, transport)
@@ -0,0 +1,121 @@
+"""
+Stage Checkpoints
+
+This module persists the output of each completed pipeline stage together with
+a hash of everything that stage consumed: its task description, expected
+output, agent role and model, and the outputs of its upstream (context) tasks.
+A resumed run restores every stage whose inputs are unchanged and only
+re-executes the failed and downstream stages.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+from config import CHECKPOINT_DIR
+from tasks import set_task_output, get_context_tasks
+
+
+class StageCheckpointStore:
+    """Directory of stage outputs keyed by stage name and input hash"""
+
+    def __init__(self, directory=CHECKPOINT_DIR or ".checkpoints"):
+        """
+        Initialize the checkpoint store
+
+        Args:
+            directory: Directory that checkpoint files are written to
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def input_hash(task):
+        """
+        Hash the inputs of a task
+
+        Context tasks must already have an output (either restored or freshly
+        produced) when this is called.
+        """
+        agent = task.agent
+        payload = {
+            "description": task.description,
+            "expected_output": task.expected_output,
+            "agent": agent.role if agent else "",
+            "model": getattr(getattr(agent, "llm", None), "model", ""),
+            "context": [str(upstream.output.raw) for upstream in get_context_tasks(task)]
+        }
+        encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _path(self, stage, input_hash):
+        """Checkpoint file for a stage and input hash"""
+        return os.path.join(self.directory, f"{stage}-{input_hash[:32]}.json")
+
+    def load(self, stage, input_hash):
+        """Return the stored output for a stage, or None when there is no matching checkpoint"""
+        try:
+            with open(self._path(stage, input_hash), 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if record.get("input_hash") != input_hash:
+            return None
+        return record.get("output")
+
+    def save(self, stage, input_hash, output):
+        """Atomically persist the output of a completed stage"""
+        path = self._path(stage, input_hash)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "stage": stage,
+                "input_hash": input_hash,
+                "saved_at": time.time(),
+                "output": output
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def restore(self, stage_tasks):
+        """
+        Restore every stage whose inputs are unchanged since it last completed
+
+        A stage is only restored when all of its context tasks were restored too,
+        so anything downstream of a re-executed stage is re-executed as well.
+
+        Args:
+            stage_tasks: (stage name, task) pairs in pipeline order
+
+        Returns:
+            A (restored stage names, (stage name, task) pairs still to run) tuple
+        """
+        restored = []
+        pending = []
+        restored_tasks = set()
+
+        for stage, task in stage_tasks:
+            upstream_ready = all(id(upstream) in restored_tasks for upstream in get_context_tasks(task))
+            output = self.load(stage, self.input_hash(task)) if upstream_ready else None
+
+            if output is None:
+                pending.append((stage, task))
+                continue
+
+            set_task_output(task, output)
+            restored_tasks.add(id(task))
+            restored.append(stage)
+
+        return restored, pending
+
+    def attach(self, stage, task):
+        """Save the task's output as a checkpoint as soon as the task completes"""
+        previous_callback = task.callback
+
+        def _checkpoint(output):
+            self.save(stage, self.input_hash(task), str(output.raw))
+            if previous_callback:
+                previous_callback(output)
+
+        task.callback = _checkpoint
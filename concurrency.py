@@ -0,0 +1,210 @@
+"""
+Adaptive Concurrency
+
+This module limits how many Ollama calls are in flight at once, process-wide,
+and finds that limit on its own instead of relying on a guessed parallelism.
+AdaptiveConcurrencyLimiter follows AIMD: every window of successful calls that
+kept the limit busy raises it by one, while an error, a timeout or a time to
+first token well above the best recently seen cuts it by a factor. Calls over
+the limit wait in line, so a busy server shows up as queue depth on the client
+instead of as requests queueing (and timing out) inside Ollama.
+
+Times to first token grow with the prompt, so the baseline they are compared
+against is kept per model and prompt-size class.
+"""
+
+import threading
+import time
+from collections import deque
+
+from config import (ADAPTIVE_CONCURRENCY, ADAPTIVE_CONCURRENCY_INITIAL, ADAPTIVE_CONCURRENCY_MIN,
+                    ADAPTIVE_CONCURRENCY_MAX, ADAPTIVE_CONCURRENCY_BACKOFF, ADAPTIVE_CONCURRENCY_TOLERANCE)
+from deadlines import CallDeadlineExceeded
+
+
+def latency_class(model, prompt_chars):
+    """Key of the time-to-first-token baseline for a call: the model and the prompt's power-of-two size"""
+    return model, int(prompt_chars).bit_length()
+
+
+class _Slot:
+    """One admitted call; reports its outcome to the limiter when it ends"""
+
+    def __init__(self, limiter, key):
+        self._limiter = limiter
+        self._key = key
+        self._started = time.monotonic()
+        self.ttft = None
+
+    def first_token(self):
+        """Mark the arrival of the call's first streamed part"""
+        if self.ttft is None:
+            self.ttft = time.monotonic() - self._started
+
+    def abandon(self):
+        """Give the slot back unused, without it counting as a call outcome"""
+        self._limiter.abandon()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # A stream closed early (e.g. by a generation limit) ends with GeneratorExit; that is a success
+        ok = exc_type is None or issubclass(exc_type, GeneratorExit)
+        self._limiter.release(self._key, self.ttft, ok)
+        return False
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD limit on concurrent LLM calls driven by time to first token and errors"""
+
+    def __init__(self, initial=ADAPTIVE_CONCURRENCY_INITIAL, min_limit=ADAPTIVE_CONCURRENCY_MIN,
+                 max_limit=ADAPTIVE_CONCURRENCY_MAX, backoff=ADAPTIVE_CONCURRENCY_BACKOFF,
+                 tolerance=ADAPTIVE_CONCURRENCY_TOLERANCE, ttft_slack=0.25, window=50):
+        """
+        Args:
+            initial: Limit to start from
+            min_limit: The limit never drops below this
+            max_limit: The limit never grows above this
+            backoff: Factor the limit is multiplied by on congestion
+            tolerance: A time to first token above tolerance times the baseline counts as congestion
+            ttft_slack: Seconds a time to first token may exceed the baseline in any case, so
+                jitter on fast calls is not mistaken for congestion
+            window: Recent times to first token per latency class the baseline is the minimum of
+        """
+        if min_limit < 1 or max_limit < min_limit:
+            raise ValueError("limits must satisfy 1 <= min_limit <= max_limit")
+
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.ttft_slack = ttft_slack
+        self.window = window
+        self.limit = float(min(max(initial, min_limit), max_limit))
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.increases = 0
+        self.decreases = 0
+        self.queue_timeouts = 0
+        self._baselines = {}
+        # Calls started before the last decrease; their signals describe the old limit
+        self._draining = 0
+        self._condition = threading.Condition()
+        # Seconds between looks at a cancellable wait's event
+        self.cancel_poll = 0.05
+
+    def acquire(self, key=None, timeout=None, cancelled=None):
+        """
+        Wait for a free slot
+
+        Args:
+            key: Latency class of the call (see latency_class), or None
+            timeout: Seconds to wait at most, or None to wait indefinitely
+            cancelled: Optional threading.Event that gives up the wait once set
+
+        Returns:
+            A slot to use as a context manager around the call, or None when
+            cancelled was set before a slot freed up
+
+        Raises:
+            CallDeadlineExceeded: When no slot frees up within the timeout
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._condition:
+            self.waiting += 1
+            try:
+                while self.in_flight >= int(self.limit):
+                    if cancelled is not None and cancelled.is_set():
+                        return None
+                    remaining = deadline - time.monotonic() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        self.queue_timeouts += 1
+                        raise CallDeadlineExceeded(f"No LLM call slot freed up within {timeout:.1f}s")
+                    if cancelled is not None:
+                        # An Event cannot notify the condition, so look at it every so often
+                        remaining = min(remaining, self.cancel_poll) if remaining is not None else self.cancel_poll
+                    self._condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+            if cancelled is not None and cancelled.is_set():
+                return None
+            self.in_flight += 1
+        return _Slot(self, key)
+
+    def abandon(self):
+        """Free a slot whose call was never sent, leaving the limit as it is"""
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def release(self, key, ttft, ok):
+        """
+        Free a slot and adapt the limit to the call's outcome
+
+        Args:
+            key: Latency class the slot was acquired with
+            ttft: Seconds to the call's first token, or None when it produced none
+            ok: Whether the call succeeded
+        """
+        with self._condition:
+            saturated = self.in_flight + self.waiting >= int(self.limit)
+            self.in_flight -= 1
+            congested = not ok or (ttft is not None and self._slow(key, ttft))
+
+            if self._draining > 0:
+                self._draining -= 1
+            elif congested:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self.decreases += 1
+                self._draining = self.in_flight
+            elif saturated and self.limit < self.max_limit:
+                # Additive increase: one more slot per limit-many successful calls
+                before = int(self.limit)
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                self.increases += int(self.limit) > before
+            self._condition.notify_all()
+
+    def _slow(self, key, ttft):
+        """Record a time to first token and tell whether it is well above its class's baseline"""
+        samples = self._baselines.setdefault(key, deque(maxlen=self.window))
+        baseline = min(samples) if samples else None
+        samples.append(ttft)
+        if baseline is None:
+            return False
+        return ttft > max(baseline * self.tolerance, baseline + self.ttft_slack)
+
+    def snapshot(self):
+        """Return the current limit, in-flight calls, queue depth and adjustment counters"""
+        with self._condition:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "queue_depth": self.waiting,
+                "increases": self.increases,
+                "decreases": self.decreases,
+                "queue_timeouts": self.queue_timeouts
+            }
+
+
+_default_limiter = None
+_default_limiter_lock = threading.Lock()
+
+
+def get_default_concurrency_limiter():
+    """
+    Return the process-wide concurrency limiter configured by ADAPTIVE_CONCURRENCY
+
+    Returns:
+        A shared AdaptiveConcurrencyLimiter, or None when adaptive concurrency is off
+    """
+    global _default_limiter
+
+    if not ADAPTIVE_CONCURRENCY:
+        return None
+
+    with _default_limiter_lock:
+        if _default_limiter is None:
+            _default_limiter = AdaptiveConcurrencyLimiter()
+        return _default_limiter
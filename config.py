@@ -1,3 +1,4 @@
+import json
 import os
 
 
@@ -5,3 +6,193 @@ import os
 OLLAMA_URL= os.getenv('OLLAMA_URL','http://localhost:11434')
 LLM_MODEL = os.getenv('LLM_MODEL','ollama/llama3.2')
 EMBED_MODEL = os.getenv('EMBED_MODEL','mxbai-embed-large:latest')
+LLM_TEMPERATURE = float(os.getenv('LLM_TEMPERATURE','0.7'))
+LLM_NUM_CTX = os.getenv('LLM_NUM_CTX','')
+LLM_NUM_PREDICT = os.getenv('LLM_NUM_PREDICT','')
+
+#per-stage model settings. Precedence: the defaults above < MODEL_CONFIG_FILE (JSON such as
+#{"plot": {"model": "llama3.2:1b", "num_ctx": 4096}}) < env vars such as PLOT_LLM_MODEL,
+#SCENES_TEMPERATURE, EDITING_NUM_CTX or CHARACTERS_NUM_PREDICT
+MODEL_CONFIG_FILE = os.getenv('MODEL_CONFIG_FILE','')
+LLM_STAGES = ['plot','characters','scenes','editing']
+
+#per-stage generation limits, overridable the same way (PLOT_MAX_WORDS, SCENES_STOP, CHARACTERS_MAX_CHARACTERS, ...).
+#max_words ends the final answer at the next paragraph break past the limit, max_characters ends a character
+#sheet before the next profile, stop lists stop sequences ("|"-separated in env vars). num_predict applies
+#unless LLM_NUM_PREDICT is set.
+STAGE_LIMIT_DEFAULTS = {
+    'plot': {},
+    'characters': {},
+    'scenes': {'num_predict': 4096, 'max_words': 2200, 'stop': ['\nWord count:', '\n**Word count']},
+    'editing': {'num_predict': 6144, 'max_words': 3000},
+}
+
+
+def _stage_llm_settings():
+    """Resolve model, sampling settings and generation limits for every stage"""
+    file_settings = {}
+    if MODEL_CONFIG_FILE:
+        with open(MODEL_CONFIG_FILE, 'r', encoding='utf-8') as f:
+            file_settings = json.load(f)
+
+    settings = {}
+    for stage in LLM_STAGES:
+        stage_settings = {
+            'model': LLM_MODEL,
+            'temperature': LLM_TEMPERATURE,
+            'num_ctx': int(LLM_NUM_CTX) if LLM_NUM_CTX else None,
+            'num_predict': int(LLM_NUM_PREDICT) if LLM_NUM_PREDICT else None,
+            'max_words': None,
+            'max_characters': None,
+            'stop': [],
+        }
+        for key, value in STAGE_LIMIT_DEFAULTS.get(stage, {}).items():
+            if key != 'num_predict' or not LLM_NUM_PREDICT:
+                stage_settings[key] = value
+        stage_settings.update(file_settings.get(stage, {}))
+
+        prefix = stage.upper()
+        overrides = {
+            'model': os.getenv(f'{prefix}_LLM_MODEL'),
+            'temperature': os.getenv(f'{prefix}_TEMPERATURE'),
+            'num_ctx': os.getenv(f'{prefix}_NUM_CTX'),
+            'num_predict': os.getenv(f'{prefix}_NUM_PREDICT'),
+            'max_words': os.getenv(f'{prefix}_MAX_WORDS'),
+            'max_characters': os.getenv(f'{prefix}_MAX_CHARACTERS'),
+            'stop': os.getenv(f'{prefix}_STOP'),
+        }
+        for key, value in overrides.items():
+            if value:
+                stage_settings[key] = value
+
+        if isinstance(stage_settings['stop'], str):
+            stage_settings['stop'] = [stop.replace('\\n', '\n') for stop in stage_settings['stop'].split('|') if stop]
+        stage_settings['temperature'] = float(stage_settings['temperature'])
+        for key in ('num_ctx', 'num_predict', 'max_words', 'max_characters'):
+            if stage_settings[key] is not None:
+                stage_settings[key] = int(stage_settings[key])
+        settings[stage] = stage_settings
+    return settings
+
+
+STAGE_LLM_SETTINGS = _stage_llm_settings()
+
+
+def ollama_model_name(model):
+    """Strip a LiteLLM-style provider prefix ("ollama/llama3.2") to the name Ollama knows"""
+    for prefix in ('ollama/', 'ollama_chat/'):
+        if model.startswith(prefix):
+            return model[len(prefix):]
+    return model
+
+def ollama_model_tag(model):
+    """Return a model name with its tag, as /api/ps reports it ("llama3.2" -> "llama3.2:latest")"""
+    name = ollama_model_name(model)
+    return name if ':' in name.rsplit('/', 1)[-1] else f"{name}:latest"
+
+#batch
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY','4'))
+BATCH_JOB_TIMEOUT = float(os.getenv('BATCH_JOB_TIMEOUT','1800'))
+#without ARTIFACT_DIR, each batch job still writes its stage outputs to its own <BATCH_ARTIFACT_DIR>/<run id>/
+BATCH_ARTIFACT_DIR = os.getenv('BATCH_ARTIFACT_DIR','batch_runs')
+
+#llm response cache (empty path disables it)
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH','')
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES','1000'))
+LLM_CACHE_TTL = float(os.getenv('LLM_CACHE_TTL','604800'))
+
+#semantic cache: reuse stage outputs of near-duplicate prompts (empty path disables it)
+SEMANTIC_CACHE_PATH = os.getenv('SEMANTIC_CACHE_PATH','')
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD','0.92'))
+SEMANTIC_CACHE_STAGES = [stage.strip() for stage in os.getenv('SEMANTIC_CACHE_STAGES','plot,characters').split(',') if stage.strip()]
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES','10000'))
+
+#deadlines: RUN_SLO_SECONDS is the wall-time budget of a run (0 disables it); every LLM call must finish within
+#LLM_CALL_TIMEOUT seconds (0 disables it) and within what is left of the run's budget
+RUN_SLO_SECONDS = float(os.getenv('RUN_SLO_SECONDS','0'))
+LLM_CALL_TIMEOUT = float(os.getenv('LLM_CALL_TIMEOUT','600'))
+
+#hedged requests: resend a call whose first token is later than the model's observed HEDGE_PERCENTILE time to first
+#token (once HEDGE_MIN_SAMPLES calls were seen, never sooner than HEDGE_MIN_DELAY seconds) and keep the faster one
+HEDGE_REQUESTS = os.getenv('HEDGE_REQUESTS','false').lower() in ('1','true','yes')
+HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE','0.95'))
+HEDGE_MIN_SAMPLES = int(os.getenv('HEDGE_MIN_SAMPLES','20'))
+HEDGE_MIN_DELAY = float(os.getenv('HEDGE_MIN_DELAY','0.5'))
+
+#adaptive concurrency: cap the Ollama calls in flight across the process, starting at ADAPTIVE_CONCURRENCY_INITIAL and
+#moving between _MIN and _MAX: +1 per window of successful calls, times ADAPTIVE_CONCURRENCY_BACKOFF on an error,
+#a timeout or a time to first token above ADAPTIVE_CONCURRENCY_TOLERANCE times the best recently seen
+ADAPTIVE_CONCURRENCY = os.getenv('ADAPTIVE_CONCURRENCY','false').lower() in ('1','true','yes')
+ADAPTIVE_CONCURRENCY_INITIAL = int(os.getenv('ADAPTIVE_CONCURRENCY_INITIAL','4'))
+ADAPTIVE_CONCURRENCY_MIN = int(os.getenv('ADAPTIVE_CONCURRENCY_MIN','1'))
+ADAPTIVE_CONCURRENCY_MAX = int(os.getenv('ADAPTIVE_CONCURRENCY_MAX','32'))
+ADAPTIVE_CONCURRENCY_BACKOFF = float(os.getenv('ADAPTIVE_CONCURRENCY_BACKOFF','0.7'))
+ADAPTIVE_CONCURRENCY_TOLERANCE = float(os.getenv('ADAPTIVE_CONCURRENCY_TOLERANCE','2.0'))
+
+#run artifacts: write each run's stage outputs and report to <ARTIFACT_DIR>/<run id>/ (empty keeps the fixed file
+#names in the working directory); ARTIFACT_ARCHIVE packs finished runs into <run id>.tar.gz
+ARTIFACT_DIR = os.getenv('ARTIFACT_DIR','')
+ARTIFACT_ARCHIVE = os.getenv('ARTIFACT_ARCHIVE','false').lower() in ('1','true','yes')
+
+#checkpoint/resume (empty dir disables it)
+CHECKPOINT_DIR = os.getenv('CHECKPOINT_DIR','')
+
+#draft acts concurrently instead of in one scene-writing call
+PARALLEL_SCENES = os.getenv('PARALLEL_SCENES','false').lower() in ('1','true','yes')
+
+#edit drafts longer than EDIT_CHUNK_WORDS in parallel chunks split on scene boundaries, each with a style and
+#continuity brief of about EDIT_BRIEF_TOKENS tokens, then write the editorial report in a short final pass
+CHUNKED_EDITING = os.getenv('CHUNKED_EDITING','false').lower() in ('1','true','yes')
+EDIT_CHUNK_WORDS = int(os.getenv('EDIT_CHUNK_WORDS','800'))
+EDIT_BRIEF_TOKENS = int(os.getenv('EDIT_BRIEF_TOKENS','500'))
+
+#number of candidate stories written from one shared plot and cast (1 disables variants mode)
+STORY_VARIANTS = int(os.getenv('STORY_VARIANTS','1'))
+
+#stream tokens to the console and stage output files as they are generated
+STREAM_OUTPUT = os.getenv('STREAM_OUTPUT','false').lower() in ('1','true','yes')
+
+#print CrewAI's agent and crew progress panels (the benchmark turns them off)
+CREW_VERBOSE = os.getenv('CREW_VERBOSE','true').lower() in ('1','true','yes')
+
+#run report exports (empty path disables the export)
+METRICS_JSONL = os.getenv('METRICS_JSONL','')
+METRICS_PROMETHEUS = os.getenv('METRICS_PROMETHEUS','')
+
+#context token budgets per stage, e.g. "scenes=3000,editing=3500" (empty disables). The characters stage's only
+#context is the plot, its direct input, which is never reduced, so a budget for it has no effect
+CONTEXT_BUDGETS = os.getenv('CONTEXT_BUDGETS','')
+
+#prompt-prefix reuse: send the story materials (plot, characters, draft) ahead of each agent's role so consecutive
+#stages share a byte-identical prompt prefix that Ollama can keep in its KV cache, give stages on one model the
+#same num_ctx so it is not reloaded, and keep a run's calls on one endpoint of the pool
+PROMPT_PREFIX_REUSE = os.getenv('PROMPT_PREFIX_REUSE','false').lower() in ('1','true','yes')
+
+#model warm-up: preload every configured model at startup and keep it loaded for the run
+OLLAMA_WARMUP = os.getenv('OLLAMA_WARMUP','true').lower() in ('1','true','yes')
+OLLAMA_KEEP_ALIVE = os.getenv('OLLAMA_KEEP_ALIVE','30m')
+OLLAMA_RELEASE_KEEP_ALIVE = os.getenv('OLLAMA_RELEASE_KEEP_ALIVE','5m')
+
+#ollama endpoint pool: comma-separated servers, e.g. "http://gpu1:11434,http://gpu2:11434"
+OLLAMA_URLS = [url.strip() for url in os.getenv('OLLAMA_URLS', OLLAMA_URL).split(',') if url.strip()]
+OLLAMA_PROBE_INTERVAL = float(os.getenv('OLLAMA_PROBE_INTERVAL','15'))
+OLLAMA_EJECT_AFTER_FAILURES = int(os.getenv('OLLAMA_EJECT_AFTER_FAILURES','2'))
+OLLAMA_EJECT_SECONDS = float(os.getenv('OLLAMA_EJECT_SECONDS','30'))
+
+#record/replay: OLLAMA_CASSETTE_MODE=record captures every Ollama call into the OLLAMA_CASSETTE file, =replay answers
+#them from it without a server. OLLAMA_CASSETTE_TIMING replays with the recorded delays; with OLLAMA_CASSETTE_STRICT
+#off, requests that differ from the recorded ones get the next recorded response for the same endpoint
+OLLAMA_CASSETTE = os.getenv('OLLAMA_CASSETTE','')
+OLLAMA_CASSETTE_MODE = os.getenv('OLLAMA_CASSETTE_MODE','').lower()
+OLLAMA_CASSETTE_TIMING = os.getenv('OLLAMA_CASSETTE_TIMING','false').lower() in ('1','true','yes')
+OLLAMA_CASSETTE_STRICT = os.getenv('OLLAMA_CASSETTE_STRICT','true').lower() in ('1','true','yes')
+
+#http story service
+SERVICE_HOST = os.getenv('SERVICE_HOST','127.0.0.1')
+SERVICE_PORT = int(os.getenv('SERVICE_PORT','8080'))
+SERVICE_WORKERS = int(os.getenv('SERVICE_WORKERS','2'))
+SERVICE_QUEUE_SIZE = int(os.getenv('SERVICE_QUEUE_SIZE','16'))
+SERVICE_MAX_FINISHED_JOBS = int(os.getenv('SERVICE_MAX_FINISHED_JOBS','200'))
+SERVICE_DEFAULT_RETRY_AFTER = int(os.getenv('SERVICE_DEFAULT_RETRY_AFTER','60'))
+#without ARTIFACT_DIR, each service job still writes its stage outputs to its own <SERVICE_ARTIFACT_DIR>/<run id>/
+SERVICE_ARTIFACT_DIR = os.getenv('SERVICE_ARTIFACT_DIR','service_runs')
@@ -0,0 +1,174 @@
+"""
+Context Budgets
+
+This module keeps the prompts of later stages small. Each stage can be given a
+token budget for the upstream outputs it receives as context; when the
+outputs don't fit, the older ones are reduced to their key sections, then
+truncated, then dropped, while the most recent upstream output (the one the
+stage works on directly) is always passed through unchanged. A stage whose
+only context is its direct input, such as the character stage with the plot,
+therefore cannot be budgeted. The tokens saved per stage are reported.
+"""
+
+import re
+import threading
+
+from crewai import Task
+
+from tasks import set_task_output, get_context_tasks
+
+CHARS_PER_TOKEN = 4
+
+# Outline lines worth keeping: headings, act markers, labelled fields and list items
+KEY_LINE = re.compile(r"^\s*(#|\*\*|act\s|[-*•]\s|\d+[.)]\s|[A-Z][\w /'-]{0,40}:)", re.IGNORECASE)
+
+
+def estimate_tokens(text):
+    """Rough token count for budgeting"""
+    return len(text) // CHARS_PER_TOKEN
+
+
+def parse_budgets(spec):
+    """
+    Parse a budget spec such as "scenes=3000,editing=3500"
+
+    Returns:
+        A dict of stage name to token budget
+    """
+    budgets = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        stage, _, tokens = item.partition("=")
+        budgets[stage.strip()] = int(tokens)
+    return budgets
+
+
+def extract_key_sections(text):
+    """
+    Reduce an outline or profile to its key lines
+
+    Keeps headings, act markers, labelled fields and list items, each cut to its
+    first sentence, and drops free-running prose.
+    """
+    kept = []
+    for line in text.splitlines():
+        if KEY_LINE.match(line):
+            sentence_end = re.search(r"[.!?](\s|$)", line)
+            kept.append(line[:sentence_end.end()].rstrip() if sentence_end else line.rstrip())
+    return "\n".join(kept)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text to roughly max_tokens, preferring a paragraph or line boundary"""
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text.rfind("\n", 0, limit)
+    if cut < limit // 2:
+        cut = limit
+    return text[:cut].rstrip() + "\n[...]"
+
+
+class ContextBudget:
+    """Fits the upstream context of each stage into its token budget"""
+
+    def __init__(self, budgets):
+        """
+        Initialize the budget manager
+
+        Args:
+            budgets: Dict of stage name to context token budget; stages without
+                an entry get their full context
+        """
+        self.budgets = budgets
+        self._originals = {}
+        self._reports = {}
+        self._lock = threading.Lock()
+
+    def apply(self, stage, task):
+        """
+        Replace the task's context with budgeted copies of its upstream outputs
+
+        Must be called once every upstream task has an output and before the
+        task runs. restore() puts the original context back.
+        """
+        budget = self.budgets.get(stage)
+        if not budget or not get_context_tasks(task):
+            return
+
+        with self._lock:
+            originals = self._originals.setdefault(id(task), list(get_context_tasks(task)))
+
+        texts = [str(upstream.output.raw) for upstream in originals]
+        original_tokens = sum(estimate_tokens(text) for text in texts)
+        actions = ["kept"] * len(texts)
+
+        # The last upstream output is the stage's direct input and is never reduced
+        remaining = budget - sum(estimate_tokens(text) for text in texts)
+        for index in range(len(texts) - 1):
+            if remaining >= 0:
+                break
+            before = estimate_tokens(texts[index])
+            reduced = extract_key_sections(texts[index])
+            actions[index] = "extracted"
+            if before + remaining < estimate_tokens(reduced):
+                allowance = before + remaining
+                if allowance < 50:
+                    reduced, actions[index] = "", "dropped"
+                else:
+                    reduced, actions[index] = truncate_to_tokens(reduced, allowance), "truncated"
+            texts[index] = reduced
+            remaining += before - estimate_tokens(reduced)
+
+        context = []
+        for upstream, text, action in zip(originals, texts, actions):
+            if action == "kept":
+                context.append(upstream)
+            elif action != "dropped":
+                proxy = Task(description=upstream.description, expected_output=upstream.expected_output,
+                             agent=upstream.agent)
+                set_task_output(proxy, text)
+                context.append(proxy)
+        task.context = context
+
+        budgeted_tokens = sum(estimate_tokens(text) for text in texts)
+        with self._lock:
+            self._reports[stage] = {
+                "budget_tokens": budget,
+                "original_tokens": original_tokens,
+                "budgeted_tokens": budgeted_tokens,
+                "saved_tokens": original_tokens - budgeted_tokens,
+                "actions": actions
+            }
+
+    def restore(self, task):
+        """Put back the task's original context"""
+        with self._lock:
+            originals = self._originals.pop(id(task), None)
+        if originals is not None:
+            task.context = originals
+
+    def restore_all(self, tasks):
+        """Put back the original context of every given task, e.g. after a stage failed"""
+        for task in tasks:
+            self.restore(task)
+
+    def attach(self, task):
+        """Restore the task's original context as soon as it completes"""
+        previous_callback = task.callback
+
+        def _restore(output):
+            self.restore(task)
+            if previous_callback:
+                previous_callback(output)
+
+        task.callback = _restore
+
+    def reset(self):
+        """Clear the per-run report"""
+        with self._lock:
+            self._reports.clear()
+
+    def report(self):
+        """Return the tokens saved per stage in the current run"""
+        with self._lock:
+            return dict(self._reports)
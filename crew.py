@@ -5,44 +5,243 @@ This module creates and manages the story-writing crew that coordinates
 all agents and tasks for collaborative story creation.
 """
 
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from crewai import Crew, Process
 from agents import StoryWritingAgents
-from tasks import StoryWritingTasks
+from tasks import (StoryWritingTasks, STAGES, split_acts, stitch_acts, split_scenes, chunk_scenes, split_editor_notes,
+                   stitch_edited_chunks, set_task_output, get_context_tasks)
+from checkpoint import StageCheckpointStore
+from streaming import StageStreamHandler, TokenStream
+from metrics import RunMetrics, export_jsonl, export_prometheus
+from context_budget import ContextBudget, parse_budgets, extract_key_sections, truncate_to_tokens
+from semantic_cache import get_default_semantic_cache
+from deadlines import RunDeadline
+from prompt_prefix import PrefixReuseTracker
+from artifacts import get_default_artifact_store
+from config import (CHECKPOINT_DIR, PARALLEL_SCENES, STREAM_OUTPUT, METRICS_JSONL, METRICS_PROMETHEUS,
+                    CONTEXT_BUDGETS, STORY_VARIANTS, RUN_SLO_SECONDS, CHUNKED_EDITING, EDIT_CHUNK_WORDS,
+                    EDIT_BRIEF_TOKENS, CREW_VERBOSE)
 
 
 class StoryWritingCrew:
     """Main crew class that orchestrates the story-writing process"""
     
-    def __init__(self, story_prompt="A short sci-fi story about a rogue AI discovering emotions"):
+    def __init__(self, story_prompt="A short sci-fi story about a rogue AI discovering emotions", llm_cache=None,
+                 checkpoint_dir=CHECKPOINT_DIR, parallel_scenes=PARALLEL_SCENES, stream=STREAM_OUTPUT,
+                 on_token=None, context_budgets=None, transport=None, semantic_cache=None,
+                 slo_seconds=RUN_SLO_SECONDS, artifact_store=None, chunked_editing=CHUNKED_EDITING):
         """
         Initialize the story-writing crew
         
         Args:
             story_prompt: The initial story concept or prompt
+            llm_cache: Optional LLM response cache shared by all agents
+            checkpoint_dir: Directory for stage checkpoints; when set, runs resume from
+                the last stage whose inputs are unchanged
+            parallel_scenes: Draft each act of the plot concurrently and stitch them
+                together instead of writing the whole story in one call
+            stream: Stream each agent's tokens into its task's output file as they are generated
+            on_token: Optional callable invoked with (stage, token) for every streamed token
+            context_budgets: Dict of stage name to the token budget for its upstream context;
+                defaults to CONTEXT_BUDGETS
+            transport: Optional httpx transport shared by the agents' HTTP clients
+            semantic_cache: Optional semantic_cache.SemanticStageCache that reuses stage outputs
+                of similar earlier prompts; defaults to the shared cache configured by
+                SEMANTIC_CACHE_PATH
+            slo_seconds: Wall-time budget of a run; every LLM call gets a deadline within
+                what is left of it (0 disables the run deadline)
+            artifact_store: Optional artifacts.RunArtifactStore that gives every run its own
+                output directory; defaults to the shared store configured by ARTIFACT_DIR.
+                Without one, stage outputs go to fixed file names in the working directory
+            chunked_editing: Edit long drafts in parallel chunks split on scene boundaries
+                instead of in one editing call
         """
         self.story_prompt = story_prompt
+        self.parallel_scenes = parallel_scenes
+        self.chunked_editing = chunked_editing
+        self.stream = stream
+        self.stream_handlers = {}
+        # Stream handlers of the variants, acts and edit chunks of the current run
+        self.branch_stream_handlers = []
+        self._token_listeners = [on_token] if on_token else []
+        self.result = None
+        self.variants = None
+        self.metrics = RunMetrics()
+        self.report = None
+        if context_budgets is None:
+            context_budgets = parse_budgets(CONTEXT_BUDGETS)
+        self.context_budget = ContextBudget(context_budgets) if context_budgets else None
+        self.semantic_cache = semantic_cache if semantic_cache is not None else get_default_semantic_cache()
+        self.semantic_match = None
+        self._prompt_vector = None
+        self.deadline = RunDeadline(slo_seconds)
+        self.prefix_tracker = PrefixReuseTracker()
+        self.artifacts = artifact_store if artifact_store is not None else get_default_artifact_store()
+        self.run_artifacts = None
+        self._artifact_names = {}
         
-        # Initialize agents and tasks
-        self.agents = StoryWritingAgents()
+        # Initialize tasks and agents
         self.tasks = StoryWritingTasks(story_prompt=story_prompt)
+        self.agents = StoryWritingAgents(cache=llm_cache, callback_factory=self._stage_callbacks, transport=transport,
+                                         deadline=self.deadline, prefix_tracker=self.prefix_tracker)
         
         # Create the crew
         self.crew = self._create_crew()
+        
+        # Record when each stage finishes for the run report
+        for stage, task in self.tasks.get_stage_tasks():
+            self.metrics.attach(stage, task)
+        
+        # Persist each stage as it completes so a failed run can resume
+        self.checkpoints = StageCheckpointStore(checkpoint_dir) if checkpoint_dir else None
+        if self.checkpoints is not None:
+            for stage, task in self.tasks.get_stage_tasks():
+                self.checkpoints.attach(stage, task)
+        
+        # Write stage outputs to the run's artifact directory instead of the working directory
+        if self.artifacts is not None:
+            for stage, task in self.tasks.get_stage_tasks():
+                self._artifact_names[stage] = task.output_file
+                self._redirect_output_file(task)
+        
+        # Budget the context of each stage once its upstream outputs exist. Attached
+        # last so the original context is back in place before checkpoints are saved.
+        if self.context_budget is not None:
+            for _, task in self.tasks.get_stage_tasks():
+                self.context_budget.attach(task)
+                self._attach_budget_hook(task)
+    
+    def bind_prompt(self, story_prompt):
+        """
+        Reuse this crew, with its agents and LLM clients, for another story prompt
+        
+        Must not be called while the crew is writing a story.
+        
+        Args:
+            story_prompt: The new story concept or prompt
+        """
+        self.story_prompt = story_prompt
+        self.tasks.bind_prompt(story_prompt)
+        self.result = None
+        self.variants = None
+        self.report = None
+    
+    def _redirect_output_file(self, task):
+        """Save a task's output through the run's artifacts rather than letting CrewAI write its output_file"""
+        name = task.output_file
+        task.output_file = None
+        previous_callback = task.callback
+        
+        def _save_artifact(output):
+            if previous_callback:
+                previous_callback(output)
+            if self.run_artifacts is not None:
+                self.run_artifacts.write(name, str(output.raw))
+        
+        task.callback = _save_artifact
+    
+    def _start_artifacts(self):
+        """Create this run's artifact directory and stream stage tokens into it"""
+        self.run_artifacts = None
+        if self.artifacts is None:
+            return
+        self.run_artifacts = self.artifacts.start_run(self.story_prompt, self.metrics.run_id)
+        for stage, handler in self.stream_handlers.items():
+            handler.output_file = self.run_artifacts.path(self._artifact_names[stage])
+    
+    def _finish_artifacts(self, status):
+        """Write the restored stage outputs and the report, then index the run as finished"""
+        for stage, task in self.tasks.get_stage_tasks():
+            name = self._artifact_names[stage]
+            if task.output is not None and name not in self.run_artifacts.files:
+                self.run_artifacts.write(name, str(task.output.raw))
+        self.report["artifacts"] = self.artifacts.finished_path(self.run_artifacts)
+        self.run_artifacts.write_json("report.json", self.report)
+        self.artifacts.finish_run(self.run_artifacts, status)
+    
+    def _attach_budget_hook(self, task):
+        """Apply context budgets to downstream stages when a task completes"""
+        previous_callback = task.callback
+        
+        def _budget_downstream(output):
+            if previous_callback:
+                previous_callback(output)
+            self._apply_context_budgets()
+        
+        task.callback = _budget_downstream
+    
+    def _apply_context_budgets(self):
+        """Budget the context of every stage that is ready to run"""
+        if self.context_budget is None:
+            return
+        for stage, task in self.tasks.get_stage_tasks():
+            if task.output is None and all(upstream.output is not None for upstream in get_context_tasks(task)):
+                self.context_budget.apply(stage, task)
+    
+    def _stage_callbacks(self, stage, branch=None):
+        """
+        Return the LLM callback handlers for a stage, shared by every agent of that stage
+        
+        The agent of a branch (a variant, act or edit chunk running alongside others of
+        its stage) gets a stream handler of its own writing <stage file>_<branch>.txt, so
+        concurrent branches never interleave in the stage's output file.
+        """
+        callbacks = [self.metrics.handler(stage)]
+        if self.stream and branch:
+            handler = StageStreamHandler(
+                f"{stage} {branch}",
+                output_file=self._branch_stream_file(stage, branch),
+                listeners=self._token_listeners
+            )
+            self.branch_stream_handlers.append(handler)
+            callbacks.append(handler)
+        elif self.stream:
+            if stage not in self.stream_handlers:
+                self.stream_handlers[stage] = StageStreamHandler(
+                    stage,
+                    output_file=dict(self.tasks.get_stage_tasks())[stage].output_file,
+                    listeners=self._token_listeners
+                )
+            callbacks.append(self.stream_handlers[stage])
+        return callbacks
     
-    def _create_crew(self):
+    def _branch_stream_file(self, stage, branch):
+        """Return the file a branch of a stage streams to, e.g. story_draft_v2.txt"""
+        name = self._artifact_names.get(stage) or dict(self.tasks.get_stage_tasks())[stage].output_file
+        root, extension = os.path.splitext(name)
+        name = f"{root}_{branch}{extension}"
+        return self.run_artifacts.path(name) if self.run_artifacts is not None else name
+    
+    def _close_stream_handlers(self):
+        """Close the output files of every stream handler once a run ends"""
+        for handler in self.stream_handlers.values():
+            handler.close()
+        for handler in self.branch_stream_handlers:
+            handler.close()
+        self.branch_stream_handlers = []
+    
+    def _create_crew(self, tasks_list=None):
         """Create the crew with agents and tasks"""
         # Get all agents
         agents_list = self.agents.get_all_agents()
         
         # Get tasks with assigned agents
-        tasks_list = self.tasks.get_tasks_with_agents(agents_list)
+        all_tasks = self.tasks.get_tasks_with_agents(agents_list)
+        if tasks_list is None:
+            tasks_list = all_tasks
+        
+        self._apply_context_budgets()
         
         # Create the crew
         crew = Crew(
             agents=agents_list,
             tasks=tasks_list,
             process=Process.sequential,  # Sequential processing for story writing
-            verbose=True
+            verbose=CREW_VERBOSE
         )
         
         return crew
@@ -57,14 +256,376 @@ class StoryWritingCrew:
         print(f"Starting story-writing process for: '{self.story_prompt}'")
         print("=" * 60)
         
+        self.metrics.start()
+        self.deadline.start()
+        self.prefix_tracker.reset()
+        self._start_artifacts()
+        for handler in self.stream_handlers.values():
+            handler.reset()
+        if self.context_budget is not None:
+            self.context_budget.reset()
+        status, error = "ok", None
+        self.variants = None
         try:
-            result = self.crew.kickoff()
+            # Start from a clean slate; restored stages get their outputs back below
+            for task in self.tasks.tasks:
+                task.output = None
+            
+            pending = self._restore_stages(self.tasks.get_stage_tasks())
+            if not pending:
+                print("All stages restored, nothing to run.")
+                return self.tasks.tasks[-1].output
+            
+            if self.chunked_editing and "editing" in dict(pending):
+                result = self._run_with_chunked_editing(pending)
+            elif self.parallel_scenes and "scenes" in dict(pending):
+                result = self._run_with_parallel_scenes(pending)
+            else:
+                result = self._create_crew([task for _, task in pending]).kickoff()
+            self._store_semantic()
             print("=" * 60)
             print("Story-writing process completed successfully!")
+            if self.agents.cache is not None:
+                stats = self.agents.cache.stats()
+                print(f"LLM cache: {stats['hits']} hits, {stats['misses']} misses ({stats['entries']} entries)")
             return result
         except Exception as e:
+            status, error = "error", str(e)
+            print(f"Error during story writing: {str(e)}")
+            raise
+        finally:
+            self._close_stream_handlers()
+            # A failed stage never fires the callback that restores its context
+            if self.context_budget is not None:
+                self.context_budget.restore_all(self.tasks.tasks)
+            self._finish_report(status, error)
+    
+    def _restore_stages(self, stage_tasks):
+        """
+        Restore stages from checkpoints and then from the semantic cache
+        
+        Args:
+            stage_tasks: (stage name, task) pairs in pipeline order
+        
+        Returns:
+            The (stage name, task) pairs that still have to run
+        """
+        pending = stage_tasks
+        if self.checkpoints is not None:
+            restored, pending = self.checkpoints.restore(pending)
+            for stage in restored:
+                self.metrics.mark_restored(stage)
+            if restored:
+                print(f"Resuming from checkpoints, skipping: {', '.join(restored)}")
+        
+        self._prompt_vector = None
+        self.semantic_match = None
+        if self.semantic_cache is not None:
+            self._prompt_vector = self.semantic_cache.embed(self.story_prompt)
+            entry, similarity = self.semantic_cache.lookup(self._prompt_vector)
+            if entry is not None:
+                restored, pending = self.semantic_cache.restore(entry, pending)
+                for stage in restored:
+                    self.metrics.mark_restored(stage)
+                # Only a match that restored something stands in for this run in the index
+                if restored:
+                    self.semantic_match = {
+                        "prompt": entry["prompt"],
+                        "similarity": round(similarity, 4),
+                        "stages": restored
+                    }
+                    print(f"Reusing {', '.join(restored)} from a similar prompt "
+                          f"(similarity {similarity:.3f}): '{entry['prompt']}'")
+        return pending
+    
+    def _store_semantic(self):
+        """Add this run's prompt and cacheable stage outputs to the semantic cache"""
+        # A matched prompt is already represented in the index
+        if self.semantic_cache is not None and self.semantic_match is None:
+            self.semantic_cache.store(self.story_prompt, self._prompt_vector, self.tasks.get_stage_tasks())
+    
+    def _finish_report(self, status, error):
+        """Build the run report and export it where configured"""
+        self.report = self.metrics.report(self.story_prompt, self.tasks.get_stage_tasks(), status, error)
+        if self.context_budget is not None:
+            budgets = self.context_budget.report()
+            for stage, entry in budgets.items():
+                self.report["stages"][stage]["context_budget"] = entry
+            self.report["totals"]["context_tokens_saved"] = sum(entry["saved_tokens"] for entry in budgets.values())
+        prefixes = self.prefix_tracker.report()
+        for stage, entry in prefixes.items():
+            if stage in self.report["stages"]:
+                self.report["stages"][stage]["prefix_cache"] = entry
+        self.report["totals"]["prefill_tokens_saved"] = sum(entry["saved_tokens"] for entry in prefixes.values())
+        self.report["deadline"] = self.deadline.report(self.report["wall_s"])
+        self.report["latency"] = self.agents.latency.snapshot()
+        if self.agents.limiter is not None:
+            self.report["concurrency"] = self.agents.limiter.snapshot()
+        if self.semantic_match:
+            self.report["semantic_cache"] = self.semantic_match
+        if self.variants:
+            self.report["variants"] = [
+                {key: value for key, value in variant.items() if key not in ("draft", "story")}
+                for variant in self.variants
+            ]
+        if self.run_artifacts is not None:
+            self._finish_artifacts(status)
+        if METRICS_JSONL:
+            export_jsonl(self.report, METRICS_JSONL)
+        if METRICS_PROMETHEUS:
+            export_prometheus(self.report, METRICS_PROMETHEUS)
+    
+    def write_story_with_report(self):
+        """
+        Execute the story-writing process and return its performance report
+        
+        Returns:
+            A (result, report) tuple; see metrics.RunMetrics.report for the report layout
+        """
+        result = self.write_story()
+        return result, self.report
+    
+    def stream_story(self):
+        """
+        Execute the story-writing process in the background and stream its tokens
+        
+        Requires a crew created with stream=True. The final result is available
+        as self.result once the iterator is exhausted.
+        
+        Yields:
+            (stage, token) tuples as the agents generate them
+        """
+        if not self.stream:
+            raise ValueError("stream_story() requires a crew created with stream=True")
+        
+        tokens = TokenStream()
+        self._token_listeners.append(tokens)
+        
+        def _run():
+            error = None
+            try:
+                self.result = self.write_story()
+            except Exception as e:
+                error = e
+            finally:
+                tokens.close(error)
+        
+        threading.Thread(target=_run, name="story-stream", daemon=True).start()
+        try:
+            yield from tokens
+        finally:
+            self._token_listeners.remove(tokens)
+    
+    def write_variants(self, count=STORY_VARIANTS):
+        """
+        Write several candidate stories that share one plot and one cast
+        
+        The plot and character stages run once (or are restored from checkpoints);
+        then every variant drafts and edits its own story concurrently, using the
+        shared outputs as context. Drafts and final stories are saved to
+        story_draft_v<n>.txt and final_story_v<n>.txt (in the run's artifact directory
+        when there is an artifact store).
+        
+        Args:
+            count: Number of variants to write
+        
+        Returns:
+            A list with one dict per variant: its number, draft, final story and the
+            seconds spent on its scene and editing stages
+        """
+        if count < 1:
+            raise ValueError("count must be at least 1")
+        
+        print(f"Starting {count}-variant story-writing process for: '{self.story_prompt}'")
+        print("=" * 60)
+        
+        self.metrics.start()
+        self.deadline.start()
+        self.prefix_tracker.reset()
+        self._start_artifacts()
+        for handler in self.stream_handlers.values():
+            handler.reset()
+        if self.context_budget is not None:
+            self.context_budget.reset()
+        status, error = "ok", None
+        self.variants = None
+        try:
+            for task in self.tasks.tasks:
+                task.output = None
+            
+            pending = self._restore_stages(self.tasks.get_stage_tasks()[:STAGES.index("scenes")])
+            if pending:
+                self._create_crew([task for _, task in pending]).kickoff()
+            self._store_semantic()
+            
+            print(f"Writing {count} variants in parallel...")
+            with ThreadPoolExecutor(max_workers=count, thread_name_prefix="story-variant") as pool:
+                self.variants = list(pool.map(self._write_variant, range(1, count + 1), [count] * count))
+            
+            print("=" * 60)
+            print(f"Wrote {count} story variants successfully!")
+            return self.variants
+        except Exception as e:
+            status, error = "error", str(e)
             print(f"Error during story writing: {str(e)}")
             raise
+        finally:
+            self._close_stream_handlers()
+            # A failed stage never fires the callback that restores its context
+            if self.context_budget is not None:
+                self.context_budget.restore_all(self.tasks.tasks)
+            self._finish_report(status, error)
+    
+    def _write_variant(self, number, total):
+        """Draft and edit one variant with its own Scene Weaver and Narrative Editor"""
+        scene_task, editing_task = self.tasks.create_variant_tasks(number, total)
+        scene_task.agent = self.agents._create_scene_weaver(branch=f"v{number}")
+        editing_task.agent = self.agents._create_narrative_editor(branch=f"v{number}")
+        
+        drafted_at = []
+        scene_task.callback = lambda _: drafted_at.append(time.perf_counter())
+        # Variants share the scenes and editing entries of the run report
+        self.metrics.attach("scenes", scene_task)
+        self.metrics.attach("editing", editing_task)
+        if self.artifacts is not None:
+            self._redirect_output_file(scene_task)
+            self._redirect_output_file(editing_task)
+        
+        started = time.perf_counter()
+        Crew(
+            agents=[scene_task.agent, editing_task.agent],
+            tasks=[scene_task, editing_task],
+            process=Process.sequential,
+            verbose=CREW_VERBOSE
+        ).kickoff()
+        finished = time.perf_counter()
+        
+        drafted = drafted_at[0] if drafted_at else finished
+        return {
+            "variant": number,
+            "draft": str(scene_task.output.raw),
+            "story": str(editing_task.output.raw),
+            "scenes_s": round(drafted - started, 4),
+            "editing_s": round(finished - drafted, 4),
+            "total_s": round(finished - started, 4)
+        }
+    
+    def _run_with_parallel_scenes(self, pending):
+        """Run the pending stages, drafting the scene stage act by act in parallel"""
+        scenes_index = STAGES.index("scenes")
+        before = [task for stage, task in pending if STAGES.index(stage) < scenes_index]
+        after = [task for stage, task in pending if STAGES.index(stage) > scenes_index]
+        
+        result = None
+        if before:
+            result = self._create_crew(before).kickoff()
+        
+        self._write_scenes_in_parallel()
+        
+        if after:
+            result = self._create_crew(after).kickoff()
+        return result if result is not None else self.tasks.tasks[scenes_index].output
+    
+    def _write_scenes_in_parallel(self):
+        """Split the plot into acts, draft them concurrently and stitch the draft together"""
+        plot_task, _, scene_task, _ = self.tasks.tasks
+        premise, acts = split_acts(str(plot_task.output.raw))
+        
+        if len(acts) < 2:
+            print("Could not find separate acts in the plot outline; writing scenes in a single pass")
+            self._create_crew([scene_task]).kickoff()
+            return
+        
+        print(f"Drafting {len(acts)} acts in parallel...")
+        act_tasks = self.tasks.create_act_tasks(premise, acts)
+        with ThreadPoolExecutor(max_workers=len(act_tasks), thread_name_prefix="story-act") as pool:
+            drafts = list(pool.map(self._write_act, act_tasks, range(1, len(act_tasks) + 1)))
+        
+        draft = stitch_acts(drafts)
+        set_task_output(scene_task, draft)
+        if scene_task.output_file:
+            with open(scene_task.output_file, 'w', encoding='utf-8') as f:
+                f.write(draft)
+        
+        # The scene task was never kicked off, so run its completion hooks here
+        if scene_task.callback:
+            scene_task.callback(scene_task.output)
+    
+    def _write_act(self, act_task, number):
+        """Draft a single act with its own Scene Weaver so acts can run concurrently"""
+        act_task.agent = self.agents._create_scene_weaver(branch=f"act{number}")
+        crew = Crew(
+            agents=[act_task.agent],
+            tasks=[act_task],
+            process=Process.sequential,
+            verbose=CREW_VERBOSE
+        )
+        crew.kickoff()
+        return str(act_task.output.raw)
+    
+    def _run_with_chunked_editing(self, pending):
+        """Run the pending stages, editing the draft in parallel chunks"""
+        before = [(stage, task) for stage, task in pending if stage != "editing"]
+        if self.parallel_scenes and "scenes" in dict(before):
+            self._run_with_parallel_scenes(before)
+        elif before:
+            self._create_crew([task for _, task in before]).kickoff()
+        
+        return self._edit_in_chunks()
+    
+    def _edit_in_chunks(self):
+        """Split the draft on scene boundaries, edit the chunks concurrently and merge them with a report"""
+        _, _, scene_task, editing_task = self.tasks.tasks
+        chunks = chunk_scenes(split_scenes(str(scene_task.output.raw)), EDIT_CHUNK_WORDS)
+        
+        if len(chunks) < 2:
+            print("The draft fits in one chunk; editing it in a single pass")
+            self._create_crew([editing_task]).kickoff()
+            return editing_task.output
+        
+        print(f"Editing {len(chunks)} chunks of the draft in parallel...")
+        chunk_tasks = self.tasks.create_edit_chunk_tasks(chunks, self._editing_brief())
+        with ThreadPoolExecutor(max_workers=len(chunk_tasks), thread_name_prefix="story-edit") as pool:
+            edited = list(pool.map(self._edit_chunk, chunk_tasks,
+                                   [f"part{number}" for number in range(1, len(chunk_tasks) + 1)]))
+        passages, notes = zip(*(split_editor_notes(chunk) for chunk in edited))
+        
+        # The final pass only reads the chunks' notes, so its size doesn't grow with the story
+        report_task = self.tasks.create_edit_report_task(notes)
+        report = self._edit_chunk(report_task, "report")
+        
+        final = stitch_edited_chunks(passages, report)
+        set_task_output(editing_task, final)
+        if editing_task.output_file:
+            with open(editing_task.output_file, 'w', encoding='utf-8') as f:
+                f.write(final)
+        
+        # The editing task was never kicked off, so run its completion hooks here
+        if editing_task.callback:
+            editing_task.callback(editing_task.output)
+        return editing_task.output
+    
+    def _editing_brief(self):
+        """Condense the plot and character outputs into a style-and-continuity brief for chunk editors"""
+        plot_task, character_task, _, _ = self.tasks.tasks
+        sections = [
+            f"Characters:\n{extract_key_sections(str(character_task.output.raw))}",
+            f"Plot:\n{extract_key_sections(str(plot_task.output.raw))}"
+        ]
+        # Characters come first: voices and names are what chunk editors most need to keep consistent
+        return truncate_to_tokens("\n\n".join(sections), EDIT_BRIEF_TOKENS)
+    
+    def _edit_chunk(self, chunk_task, branch):
+        """Run one chunk editing (or report) task with its own Narrative Editor so chunks can run concurrently"""
+        chunk_task.agent = self.agents._create_narrative_editor(branch=branch)
+        crew = Crew(
+            agents=[chunk_task.agent],
+            tasks=[chunk_task],
+            process=Process.sequential,
+            verbose=CREW_VERBOSE
+        )
+        crew.kickoff()
+        return str(chunk_task.output.raw)
     
     def get_crew_info(self):
         """Get information about the crew setup"""
@@ -82,5 +643,5 @@ class StoryWritingCrew:
                     "expected_output": task.expected_output
                 } for task in self.tasks.tasks
             ],
-            "process": "Sequential"
+            "process": "Sequential (parallel acts)" if self.parallel_scenes else "Sequential"
         }
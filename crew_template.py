@@ -0,0 +1,117 @@
+"""
+Crew Templates
+
+This module reuses story-writing crews across prompts. A StoryCrewTemplate
+builds up to a fixed number of StoryWritingCrew instances - agents, LLM
+clients and tasks - on first use and keeps them for later requests, binding
+only the prompt-specific task descriptions per story. All crews share one
+HTTP transport, so connections to Ollama are pooled across them. A crew is
+checked out by one caller at a time, which makes the template safe to use
+from concurrent workers.
+"""
+
+import queue
+import threading
+from contextlib import contextmanager
+
+import httpx
+
+from crew import StoryWritingCrew
+from ollama_pool import get_default_pool
+
+
+class StoryCrewTemplate:
+    """Pool of reusable story-writing crews"""
+
+    def __init__(self, size=1, endpoint_pool=None, **crew_kwargs):
+        """
+        Initialize the template
+
+        Args:
+            size: Maximum number of crews, i.e. stories that can be written at the same time
+            endpoint_pool: Optional ollama_pool.OllamaEndpointPool; defaults to the shared pool
+                configured by OLLAMA_URLS
+            **crew_kwargs: Keyword arguments passed to every StoryWritingCrew (llm_cache,
+                parallel_scenes, context_budgets, ...)
+        """
+        if size < 1:
+            raise ValueError("size must be at least 1")
+
+        self.size = size
+        self.crew_kwargs = crew_kwargs
+
+        pool = endpoint_pool if endpoint_pool is not None else get_default_pool()
+        if pool is not None:
+            self.transport = pool.transport()
+        else:
+            # Enough keep-alive connections for every agent of every crew, plus parallel acts
+            self.transport = httpx.HTTPTransport(limits=httpx.Limits(max_keepalive_connections=size * 8))
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._built = 0
+        self._runs = 0
+
+    def _acquire(self):
+        """Take an idle crew, building a new one while fewer than size exist"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            build = self._built < self.size
+            if build:
+                self._built += 1
+
+        if not build:
+            return self._idle.get()
+
+        try:
+            return StoryWritingCrew(transport=self.transport, **self.crew_kwargs)
+        except Exception:
+            with self._lock:
+                self._built -= 1
+            raise
+
+    @contextmanager
+    def checkout(self, story_prompt):
+        """
+        Borrow a crew bound to a story prompt
+
+        Blocks while all crews are busy. The crew goes back to the template when
+        the block exits, so it must not be used afterwards.
+
+        Args:
+            story_prompt: The story concept or prompt to bind
+
+        Yields:
+            A StoryWritingCrew ready for write_story()
+        """
+        crew = self._acquire()
+        try:
+            crew.bind_prompt(story_prompt)
+            with self._lock:
+                self._runs += 1
+            yield crew
+        finally:
+            self._idle.put(crew)
+
+    def write_story(self, story_prompt):
+        """
+        Write a story on a pooled crew
+
+        Returns:
+            A (result, report) tuple; see metrics.RunMetrics.report for the report layout
+        """
+        with self.checkout(story_prompt) as crew:
+            return crew.write_story_with_report()
+
+    def stats(self):
+        """Return how many crews exist, how many are idle and how many runs were served"""
+        with self._lock:
+            return {"size": self.size, "built": self._built, "idle": self._idle.qsize(), "runs": self._runs}
+
+    def close(self):
+        """Close the shared HTTP transport"""
+        self.transport.close()
@@ -0,0 +1,314 @@
+"""
+Deadlines and Hedged Calls
+
+This module keeps a stalled Ollama server from hanging a run. RunDeadline
+turns a run-level SLO into a deadline for every LLM call: a call may take at
+most LLM_CALL_TIMEOUT and never longer than what is left of the run's budget.
+guarded_stream enforces that deadline on a streaming call and, when hedging is
+on, sends a duplicate request once the first token is later than the observed
+p95 time to first token, keeping whichever response starts first.
+
+LatencyTracker keeps process-wide time-to-first-token and call duration
+histograms per model; they drive the hedge delay and are added to the run
+report to tune the SLO and timeouts.
+"""
+
+import bisect
+import queue
+import threading
+import time
+from collections import deque
+from functools import partial
+
+from config import (RUN_SLO_SECONDS, LLM_CALL_TIMEOUT, HEDGE_REQUESTS, HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES,
+                    HEDGE_MIN_DELAY)
+
+# Upper bounds of the histogram buckets in seconds, Prometheus-style (the last bucket is +Inf)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+
+class CallDeadlineExceeded(TimeoutError):
+    """Raised when an LLM call runs past its deadline or the run's SLO is used up"""
+
+
+class LatencyHistogram:
+    """Bucketed latency histogram that also keeps recent samples for percentiles"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, window=1000):
+        """
+        Args:
+            buckets: Ascending bucket upper bounds in seconds
+            window: Number of recent samples kept for percentiles
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        """Record one latency"""
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self._recent.append(seconds)
+
+    def percentile(self, q):
+        """Return the q-th quantile (0..1) of the recent samples, or None without samples"""
+        if not self._recent:
+            return None
+        ordered = sorted(self._recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self):
+        """Return counts, quantiles and cumulative bucket counts as a dict"""
+        cumulative, total = {}, 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            cumulative["+Inf" if bound == float("inf") else str(bound)] = total
+        quantiles = {name: self.percentile(q) for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))}
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 4),
+            **{name: round(value, 4) if value is not None else None for name, value in quantiles.items()},
+            "buckets": cumulative
+        }
+
+
+class LatencyTracker:
+    """Process-wide time-to-first-token and duration histograms per model"""
+
+    def __init__(self, hedge_percentile=HEDGE_PERCENTILE, hedge_min_samples=HEDGE_MIN_SAMPLES,
+                 hedge_min_delay=HEDGE_MIN_DELAY):
+        """
+        Args:
+            hedge_percentile: Time-to-first-token quantile after which a call is hedged
+            hedge_min_samples: Calls a model needs before its calls are hedged
+            hedge_min_delay: Never hedge sooner than this many seconds
+        """
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _histograms(self, model):
+        if model not in self._models:
+            self._models[model] = {"ttft": LatencyHistogram(), "duration": LatencyHistogram()}
+        return self._models[model]
+
+    def observe(self, model, ttft=None, duration=None):
+        """Record the time to first token and/or total duration of a call"""
+        with self._lock:
+            histograms = self._histograms(model)
+            if ttft is not None:
+                histograms["ttft"].observe(ttft)
+            if duration is not None:
+                histograms["duration"].observe(duration)
+
+    def hedge_delay(self, model):
+        """
+        Seconds to wait for a first token before hedging a call to a model
+
+        Returns:
+            The observed time-to-first-token quantile (at least hedge_min_delay), or
+            None while the model has too few samples
+        """
+        with self._lock:
+            ttft = self._histograms(model)["ttft"]
+            if ttft.count < self.hedge_min_samples:
+                return None
+            return max(self.hedge_min_delay, ttft.percentile(self.hedge_percentile))
+
+    def snapshot(self):
+        """Return every model's histograms as a dict"""
+        with self._lock:
+            return {
+                model: {name: histogram.snapshot() for name, histogram in histograms.items()}
+                for model, histograms in self._models.items()
+            }
+
+
+class RunDeadline:
+    """Run-level SLO that bounds every LLM call of a run"""
+
+    def __init__(self, slo_seconds=RUN_SLO_SECONDS, call_timeout=LLM_CALL_TIMEOUT, hedge=HEDGE_REQUESTS):
+        """
+        Args:
+            slo_seconds: Wall-time budget of a whole run; 0 disables the run deadline
+            call_timeout: Upper bound for a single call in seconds; 0 disables it
+            hedge: Send a duplicate request when the first token is late
+        """
+        self.slo_seconds = slo_seconds
+        self.call_timeout_seconds = call_timeout
+        self.hedge = hedge
+        self._lock = threading.Lock()
+        self.start()
+
+    def start(self):
+        """Begin a new run, resetting the budget and counters"""
+        with self._lock:
+            self.started_at = time.monotonic()
+            self.hedged_calls = 0
+            self.hedge_wins = 0
+            self.timeouts = 0
+
+    def remaining(self):
+        """Seconds left of the run's SLO, or None without one"""
+        if not self.slo_seconds:
+            return None
+        return self.slo_seconds - (time.monotonic() - self.started_at)
+
+    def call_timeout(self):
+        """
+        Deadline in seconds for the next call
+
+        Returns:
+            The smaller of the per-call timeout and the run's remaining budget, or
+            None when neither is configured
+
+        Raises:
+            CallDeadlineExceeded: When the run's SLO is already used up
+        """
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            self.record_timeout()
+            raise CallDeadlineExceeded(f"Run exceeded its {self.slo_seconds:.0f}s SLO")
+        limits = [limit for limit in (self.call_timeout_seconds or None, remaining) if limit is not None]
+        return min(limits) if limits else None
+
+    def record_hedge(self, won):
+        """Count a hedged call and whether the duplicate answered first"""
+        with self._lock:
+            self.hedged_calls += 1
+            self.hedge_wins += int(won)
+
+    def record_timeout(self):
+        """Count a call that ran past its deadline"""
+        with self._lock:
+            self.timeouts += 1
+
+    def report(self, wall_s):
+        """Return the SLO and this run's hedging and timeout counters"""
+        with self._lock:
+            return {
+                "slo_s": self.slo_seconds or None,
+                "met": wall_s <= self.slo_seconds if self.slo_seconds and wall_s is not None else None,
+                "call_timeout_s": self.call_timeout_seconds or None,
+                "hedged_calls": self.hedged_calls,
+                "hedge_wins": self.hedge_wins,
+                "timeouts": self.timeouts
+            }
+
+
+class _Attempt:
+    """One request of a (possibly hedged) call, read on its own thread"""
+
+    def __init__(self, number, open_stream, results, cancelled=None):
+        self.number = number
+        self.cancelled = cancelled or threading.Event()
+        self._open_stream = open_stream
+        self._results = results
+        threading.Thread(target=self._run, name=f"llm-attempt-{number}", daemon=True).start()
+
+    def _run(self):
+        stream = None
+        try:
+            stream = self._open_stream()
+            for part in stream:
+                if self.cancelled.is_set():
+                    break
+                self._results.put((self.number, "part", part))
+            self._results.put((self.number, "done", None))
+        except BaseException as e:
+            self._results.put((self.number, "error", e))
+        finally:
+            # Closing the stream drops the connection, which makes Ollama stop generating
+            if stream is not None and hasattr(stream, "close"):
+                stream.close()
+
+
+def guarded_stream(open_stream, timeout=None, hedge_after=None, on_first_part=None, on_hedge=None, open_hedge=None):
+    """
+    Stream a call with a deadline and an optional hedged duplicate
+
+    Args:
+        open_stream: Callable that starts the request and returns an iterator of response parts
+        timeout: Seconds the whole call may take, or None
+        hedge_after: Seconds without a first part after which a duplicate request is sent, or None
+        on_first_part: Optional callable invoked with the time to the first part
+        on_hedge: Optional callable invoked with True/False once a hedged call knows which request won
+        open_hedge: Optional callable that starts the hedged duplicate instead of open_stream; it is
+            passed a threading.Event that is set once the duplicate is no longer needed
+
+    Yields:
+        The parts of whichever request answered first
+
+    Raises:
+        CallDeadlineExceeded: When the call runs past its timeout
+    """
+    started = time.monotonic()
+    deadline = started + timeout if timeout else None
+    results = queue.Queue()
+    attempts = [_Attempt(0, open_stream, results)]
+    winner = None
+    failed = 0
+
+    try:
+        while True:
+            wake_at = deadline
+            if winner is None and hedge_after is not None and len(attempts) == 1:
+                wake_at = min(filter(None, (deadline, started + hedge_after)))
+            try:
+                number, kind, payload = results.get(timeout=max(0.0, wake_at - time.monotonic()) if wake_at else None)
+            except queue.Empty:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise CallDeadlineExceeded(f"LLM call exceeded its {timeout:.1f}s deadline")
+                if winner is None and hedge_after is not None and len(attempts) == 1:
+                    cancelled = threading.Event()
+                    open_duplicate = partial(open_hedge, cancelled) if open_hedge else open_stream
+                    attempts.append(_Attempt(1, open_duplicate, results, cancelled))
+                continue
+
+            if winner is not None and number != winner:
+                continue
+            if kind == "error":
+                failed += 1
+                # A failed request only fails the call once no other request can answer
+                if winner is None and failed < len(attempts):
+                    continue
+                raise payload
+            if winner is None:
+                winner = number
+                for attempt in attempts:
+                    if attempt.number != winner:
+                        attempt.cancelled.set()
+                if on_first_part:
+                    on_first_part(time.monotonic() - started)
+                if on_hedge and len(attempts) > 1:
+                    on_hedge(winner != 0)
+            if kind == "done":
+                return
+            yield payload
+    finally:
+        for attempt in attempts:
+            attempt.cancelled.set()
+
+
+_default_tracker = None
+_default_tracker_lock = threading.Lock()
+
+
+def get_default_latency_tracker():
+    """
+    Return the process-wide latency tracker shared by every crew
+
+    Returns:
+        A shared LatencyTracker
+    """
+    global _default_tracker
+
+    with _default_tracker_lock:
+        if _default_tracker is None:
+            _default_tracker = LatencyTracker()
+        return _default_tracker
@@ -5,6 +5,7 @@ This script demonstrates different ways to use the crew for various story types.
 """
 
 from crew import StoryWritingCrew
+from batch import BatchStoryRunner
 from dotenv import load_dotenv
 import os
 
@@ -54,6 +55,23 @@ def example_mystery_story():
     return result
 
 
+def example_all_stories():
+    """Example: Run all example prompts concurrently through the batch runner"""
+    print("Running all examples...")
+    print("=" * 40)
+    
+    jobs = [
+        {"id": "sci-fi", "prompt": "A short sci-fi story about a rogue AI discovering emotions"},
+        {"id": "fantasy", "prompt": "A fantasy story about a young mage who must choose between power and love"},
+        {"id": "mystery", "prompt": "A detective story set in 1920s Paris involving a stolen painting and secret society"},
+    ]
+    
+    runner = BatchStoryRunner(concurrency=len(jobs))
+    summary = runner.run(jobs, "example_results.jsonl")
+    print(f"Stories completed! {summary['ok']}/{summary['total']} succeeded, results in example_results.jsonl")
+    return summary
+
+
 def main():
     """Run example stories"""
     # Check if Ollama is running
@@ -85,12 +103,7 @@ def main():
     elif choice == "3":
         example_mystery_story()
     elif choice == "4":
-        print("Running all examples...")
-        example_sci_fi_story()
-        print("\n")
-        example_fantasy_story()
-        print("\n")
-        example_mystery_story()
+        example_all_stories()
     elif choice == "5":
         print("Goodbye!")
     else:
@@ -0,0 +1,299 @@
+"""
+Fake Ollama Server
+
+This module provides a local stand-in for the parts of the Ollama HTTP API the
+crew uses (/api/tags, /api/ps, /api/chat, /api/embed and model loads via
+/api/generate). Responses are synthetic text produced with a configurable time
+to first token, decode speed and output size, so the orchestration overhead of
+a crew run can be measured without a real model. Like Ollama, the server keeps
+the last prompt of every model and only counts the part of a new prompt after
+their shared prefix as prompt_eval_count.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FILLER = ("the station hummed while she weighed every choice against the quiet promise "
+          "of morning and the long road home").split()
+
+
+def synthetic_answer(num_tokens):
+    """
+    Build a CrewAI-style final answer split into roughly num_tokens tokens
+
+    The text is laid out as a three-act outline so every stage, including the
+    parallel act splitter, has the structure it expects.
+    """
+    per_act = max(1, num_tokens // 3)
+    acts = [
+        f"Act {act}\n" + " ".join(FILLER[i % len(FILLER)] for i in range(per_act))
+        for act in ("I", "II", "III")
+    ]
+    text = "Thought: I now can give a great answer\nFinal Answer:\n" + "\n\n".join(acts)
+    return [word + " " for word in text.split(" ")]
+
+
+def synthetic_embedding(text, dimensions=64):
+    """
+    Embed text as a normalised bag of hashed words
+
+    Prompts that share most of their words get similar vectors, which is enough
+    to exercise similarity lookups without a real embedding model.
+    """
+    vector = [0.0] * dimensions
+    for word in text.lower().split():
+        bucket = int.from_bytes(hashlib.md5(word.strip(".,!?\"'").encode("utf-8")).digest()[:4], "little")
+        vector[bucket % dimensions] += 1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+class FakeOllamaServer:
+    """Threaded HTTP server emulating Ollama's chat and tags endpoints"""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.05, tokens_per_sec=200.0, output_tokens=300,
+                 models=("llama3.2:latest",), load_time=0.0):
+        """
+        Initialize the server
+
+        Args:
+            host: Interface to bind to
+            port: Port to bind to; 0 picks a free port
+            latency: Seconds before the first token of every chat response
+            tokens_per_sec: Decode speed of the simulated model
+            output_tokens: Approximate number of tokens per chat response
+            models: Model names reported by /api/tags
+            load_time: Seconds the first request for a model spends loading it
+        """
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.output_tokens = output_tokens
+        self.models = list(models)
+        self.load_time = load_time
+        self.loaded = set()
+        self.last_prompt = {}
+
+        self.requests = 0
+        self.busy_seconds = 0.0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        """Base URL of the running server"""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve requests on a background thread"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Shut the server down"""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def stats(self):
+        """Return request counters"""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "busy_seconds": round(self.busy_seconds, 3),
+                "peak_in_flight": self.peak_in_flight
+            }
+
+    def _begin(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def _load(self, model):
+        """Simulate loading a model on first use; returns the load time in seconds"""
+        with self._lock:
+            if model in self.loaded:
+                return 0.0
+            self.loaded.add(model)
+        time.sleep(self.load_time)
+        return self.load_time
+
+    def _prefill(self, model, prompt):
+        """Return the characters of a prompt not covered by the model's cached prefix"""
+        with self._lock:
+            cached = len(os.path.commonprefix([self.last_prompt.get(model, ""), prompt]))
+            self.last_prompt[model] = prompt
+        return len(prompt) - cached
+
+    def _end(self, elapsed):
+        with self._lock:
+            self.in_flight -= 1
+            self.busy_seconds += elapsed
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, payload, status=200):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _read_json(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._send_json({"models": [{"name": name, "model": name} for name in server.models]})
+                elif self.path == "/api/ps":
+                    self._send_json({"models": [{"name": name, "model": name} for name in sorted(server.loaded)]})
+                else:
+                    self._send_json({"error": "not found"}, status=404)
+
+            def do_POST(self):
+                if self.path == "/api/chat":
+                    self._chat(self._read_json())
+                elif self.path == "/api/generate":
+                    self._generate(self._read_json())
+                elif self.path == "/api/embed":
+                    self._embed(self._read_json())
+                else:
+                    self._send_json({"error": "not found"}, status=404)
+
+            def _embed(self, request):
+                inputs = request.get("input", "")
+                if isinstance(inputs, str):
+                    inputs = [inputs]
+                with server._lock:
+                    server.requests += 1
+                self._send_json({
+                    "model": request.get("model", ""),
+                    "embeddings": [synthetic_embedding(text) for text in inputs]
+                })
+
+            def _generate(self, request):
+                # Only empty-prompt model loads and unloads (keep_alive 0) are supported
+                model = request.get("model", "")
+                if request.get("keep_alive") in (0, "0", "0s"):
+                    with server._lock:
+                        server.loaded.discard(model)
+                    self._send_json({"model": model, "response": "", "done": True, "done_reason": "unload"})
+                    return
+                load_s = server._load(model)
+                self._send_json({
+                    "model": model,
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "response": "",
+                    "done": True,
+                    "done_reason": "load",
+                    "load_duration": int(load_s * 1e9)
+                })
+
+            def _chat(self, request):
+                started = time.perf_counter()
+                server._begin()
+                try:
+                    model = request.get("model", "")
+                    load_s = server._load(model)
+                    prompt_chars = server._prefill(
+                        model, "".join(m.get("content") or "" for m in request.get("messages", [])))
+                    words = synthetic_answer(server.output_tokens)
+                    time.sleep(server.latency)
+
+                    if request.get("stream", True):
+                        self.send_response(200)
+                        self.send_header("Content-Type", "application/x-ndjson")
+                        self.send_header("Transfer-Encoding", "chunked")
+                        self.end_headers()
+                        for word in words:
+                            time.sleep(1.0 / server.tokens_per_sec)
+                            self._write_chunk(self._message(model, word, done=False))
+                        self._write_chunk(self._final(model, prompt_chars, len(words), started, load_s))
+                        self.wfile.write(b"0\r\n\r\n")
+                    else:
+                        time.sleep(len(words) / server.tokens_per_sec)
+                        final = self._final(model, prompt_chars, len(words), started, load_s)
+                        final["message"]["content"] = "".join(words)
+                        self._send_json(final)
+                finally:
+                    server._end(time.perf_counter() - started)
+
+            def _write_chunk(self, payload):
+                data = (json.dumps(payload) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            @staticmethod
+            def _message(model, content, done):
+                return {
+                    "model": model,
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "message": {"role": "assistant", "content": content},
+                    "done": done
+                }
+
+            def _final(self, model, prompt_chars, eval_count, started, load_s):
+                total_ns = int((time.perf_counter() - started) * 1e9)
+                final = self._message(model, "", done=True)
+                final.update({
+                    "done_reason": "stop",
+                    "total_duration": total_ns,
+                    "load_duration": int(load_s * 1e9),
+                    "prompt_eval_count": max(1, prompt_chars // 4),
+                    "prompt_eval_duration": int(server.latency * 1e9),
+                    "eval_count": eval_count,
+                    "eval_duration": max(0, total_ns - int((server.latency + load_s) * 1e9))
+                })
+                return final
+
+        return Handler
+
+
+def main():
+    """Run the fake server in the foreground"""
+    parser = argparse.ArgumentParser(description="Local stand-in for the Ollama API")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds to first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0)
+    parser.add_argument("--output-tokens", type=int, default=300)
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(port=args.port, latency=args.latency, tokens_per_sec=args.tokens_per_sec,
+                              output_tokens=args.output_tokens)
+    print(f"Fake Ollama listening on {server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
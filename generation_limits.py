@@ -0,0 +1,304 @@
+"""
+Generation Limits
+
+This module keeps the long-form stages from rambling past their targets.
+StageChatOllama runs a streaming validator over every response as it is
+generated; once the validator is satisfied - the story passed its word limit,
+or a character sheet is about to start one profile too many - the response is
+ended at the last paragraph break and the HTTP stream is closed, which makes
+Ollama stop generating. The reason each response stopped ("stop", "length" or
+the validator's reason) is reported as its done_reason.
+
+StageChatOllama also enforces the run's call deadlines and hedges slow calls
+(see deadlines.py), and waits for the process-wide concurrency limiter to
+admit each call (see concurrency.py).
+"""
+
+import re
+import time
+from functools import partial
+from typing import Any
+
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration
+from langchain_ollama import ChatOllama
+
+from concurrency import latency_class
+from deadlines import CallDeadlineExceeded, guarded_stream
+
+FINAL_ANSWER = "Final Answer:"
+
+# Lines that can start a character profile, in the order they are preferred as a sheet's profile marker
+NAME_LINE = re.compile(r"^\s*(?:[-*]\s+)?\**\s*name\s*\**\s*:", re.IGNORECASE | re.MULTILINE)
+CHARACTER_LINE = re.compile(r"^\s*(?:#{1,6}\s+)?\**\s*character\s+\d+\b", re.IGNORECASE | re.MULTILINE)
+HEADING = re.compile(r"^\s*(#{1,6})\s+(\S.*)$", re.MULTILINE)
+NUMBERED_NAME = re.compile(r"^\s*\d+[.)]\s+\*\*\S", re.MULTILINE)
+# Heading of the sheet as a whole rather than of one character: "# Character Profiles", "## Main Cast"
+SHEET_TITLE = re.compile(r"\b(characters|character (sheets?|profiles?)|cast|profiles|dramatis personae)\b", re.IGNORECASE)
+
+
+def count_profiles(text):
+    """
+    Count the character profiles started so far in a character sheet
+
+    Only one kind of marker is counted: "Name:" lines if there are any, else
+    "Character N" lines, else the headings at the shallowest level below the
+    sheet's title, else numbered bold names ("1. **Mara Quinn**"). A title such
+    as "# Character Profiles" and the subsection headings inside a profile
+    ("### Background") are therefore not counted as characters.
+    """
+    for marker in (NAME_LINE, CHARACTER_LINE):
+        count = len(marker.findall(text))
+        if count:
+            return count
+
+    headings = [(len(hashes), title) for hashes, title in HEADING.findall(text)]
+    if headings and SHEET_TITLE.search(headings[0][1]):
+        headings = headings[1:]
+    if headings:
+        top = min(level for level, _ in headings)
+        return sum(1 for level, _ in headings if level == top)
+
+    return len(NUMBERED_NAME.findall(text))
+
+
+def trim_to_paragraph(text):
+    """Cut text back to its last paragraph break, keeping it whole when there is none"""
+    cut = text.rstrip().rfind("\n\n")
+    return text[:cut].rstrip() if cut > 0 else text
+
+
+class WordLimit:
+    """Ends the final answer at the first paragraph break after max_words"""
+
+    reason = "word_limit"
+
+    def __init__(self, max_words, hard_factor=1.15):
+        """
+        Args:
+            max_words: Words of the final answer after which generation may stop
+            hard_factor: Stop outright, without waiting for a paragraph break, at
+                max_words * hard_factor
+        """
+        self.max_words = max_words
+        self.hard_limit = int(max_words * hard_factor)
+        self._text = []
+        self._tokens = 0
+        self._over = False
+
+    def __call__(self, token):
+        self._text.append(token)
+        self._tokens += 1
+
+        if not self._over:
+            # Counting words is linear in the text so far; only do it every few tokens
+            if self._tokens % 16:
+                return None
+            self._over = self._answer_words() >= self.max_words
+            if not self._over:
+                return None
+
+        if "\n\n" in "".join(self._text[-2:]):
+            return self.reason
+        if self._tokens % 16 == 0 and self._answer_words() >= self.hard_limit:
+            return self.reason
+        return None
+
+    def _answer_words(self):
+        text = "".join(self._text)
+        start = text.find(FINAL_ANSWER)
+        return len(text[start + len(FINAL_ANSWER):].split()) if start >= 0 else len(text.split())
+
+
+class CharacterLimit:
+    """Ends a character sheet when a profile beyond max_characters starts"""
+
+    reason = "character_limit"
+
+    def __init__(self, max_characters):
+        """
+        Args:
+            max_characters: Number of character profiles allowed
+        """
+        self.max_characters = max_characters
+        self._text = []
+
+    def __call__(self, token):
+        self._text.append(token)
+        if "\n" not in token:
+            return None
+
+        # Only the final answer counts; the reasoning before it may name characters too
+        text = "".join(self._text)
+        start = text.find(FINAL_ANSWER)
+        if start < 0:
+            return None
+        profiles = count_profiles(text[start + len(FINAL_ANSWER):])
+        return self.reason if profiles > self.max_characters else None
+
+
+class StageValidator:
+    """Runs several limits over one response; the first one met stops it"""
+
+    reasons = {WordLimit.reason, CharacterLimit.reason}
+
+    def __init__(self, max_words=None, max_characters=None):
+        """
+        Args:
+            max_words: Word limit of the final answer, or None
+            max_characters: Number of character profiles allowed, or None
+        """
+        self.max_words = max_words
+        self.max_characters = max_characters
+
+    def __bool__(self):
+        return bool(self.max_words or self.max_characters)
+
+    def __repr__(self):
+        return f"StageValidator(max_words={self.max_words}, max_characters={self.max_characters})"
+
+    def start(self):
+        """Return a fresh checker for one response"""
+        limits = []
+        if self.max_words:
+            limits.append(WordLimit(self.max_words))
+        if self.max_characters:
+            limits.append(CharacterLimit(self.max_characters))
+
+        def _check(token):
+            for limit in limits:
+                reason = limit(token)
+                if reason:
+                    return reason
+            return None
+
+        return _check
+
+
+class StageChatOllama(ChatOllama):
+    """ChatOllama that stops a response early once its stage's validator is satisfied"""
+
+    validator: Any = None
+    # deadlines.RunDeadline bounding every call, and the LatencyTracker that records them
+    deadline: Any = None
+    latency: Any = None
+    # concurrency.AdaptiveConcurrencyLimiter every call has to get a slot from
+    limiter: Any = None
+
+    def _create_chat_stream(self, messages, stop=None, **kwargs):
+        stream = self._limited_chat_stream(messages, stop, **kwargs)
+        if not self.validator:
+            yield from stream
+            return
+
+        check = self.validator.start()
+        tokens = 0
+        # Ollama sends the prompt's token count with its last part, so a response
+        # stopped early usually has none; None leaves it unknown rather than 0
+        prompt_tokens = None
+        try:
+            for part in stream:
+                yield part
+                if isinstance(part, str) or part.get("done"):
+                    continue
+                tokens += 1
+                if part.get("prompt_eval_count") is not None:
+                    prompt_tokens = part["prompt_eval_count"]
+                reason = check((part.get("message") or {}).get("content") or "")
+                if reason:
+                    # Closing the stream drops the connection, which makes Ollama stop generating
+                    yield {
+                        "model": part.get("model", self.model),
+                        "created_at": part.get("created_at"),
+                        "message": {"role": "assistant", "content": ""},
+                        "done": True,
+                        "done_reason": reason,
+                        "prompt_eval_count": prompt_tokens,
+                        "eval_count": tokens
+                    }
+                    return
+        finally:
+            stream.close()
+
+    def _limited_chat_stream(self, messages, stop=None, **kwargs):
+        """Stream a response once the concurrency limiter has a slot for it"""
+        if self.limiter is None:
+            yield from self._guarded_chat_stream(messages, stop, **kwargs)
+            return
+
+        key = latency_class(self.model, sum(len(str(message.content)) for message in messages))
+        # call_timeout() counts the timeout itself when the run's SLO is already used up
+        timeout = self.deadline.call_timeout() if self.deadline is not None else None
+        try:
+            slot = self.limiter.acquire(key, timeout)
+        except CallDeadlineExceeded:
+            if self.deadline is not None:
+                self.deadline.record_timeout()
+            raise
+
+        with slot:
+            stream = self._guarded_chat_stream(messages, stop, slot_key=key, **kwargs)
+            try:
+                for part in stream:
+                    slot.first_token()
+                    yield part
+            finally:
+                stream.close()
+
+    def _hedge_chat_stream(self, key, timeout, cancelled, messages, stop=None, **kwargs):
+        """Stream a hedged duplicate request, which takes a concurrency limiter slot of its own"""
+        slot = self.limiter.acquire(key, timeout, cancelled)
+        if slot is None:
+            return
+        if cancelled.is_set():
+            # The original request answered while this one waited for its slot
+            slot.abandon()
+            return
+        with slot:
+            for part in ChatOllama._create_chat_stream(self, messages, stop, **kwargs):
+                slot.first_token()
+                yield part
+
+    def _guarded_chat_stream(self, messages, stop=None, slot_key=None, **kwargs):
+        """Stream a response within the run's deadline, hedging it when its first token is late"""
+        open_stream = partial(ChatOllama._create_chat_stream, self, messages, stop, **kwargs)
+        if self.deadline is None:
+            yield from open_stream()
+            return
+
+        started = time.monotonic()
+        timeout = self.deadline.call_timeout()
+        hedge_after = self.latency.hedge_delay(self.model) if self.deadline.hedge and self.latency else None
+        open_hedge = None
+        if self.limiter is not None and slot_key is not None:
+            open_hedge = partial(self._hedge_chat_stream, slot_key, timeout, messages=messages, stop=stop, **kwargs)
+        first_part = []
+        timed_out = False
+        try:
+            yield from guarded_stream(open_stream, timeout, hedge_after, on_first_part=first_part.append,
+                                      on_hedge=self.deadline.record_hedge, open_hedge=open_hedge)
+        except CallDeadlineExceeded:
+            timed_out = True
+            self.deadline.record_timeout()
+            raise
+        finally:
+            if self.latency is not None:
+                self.latency.observe(self.model, first_part[0] if first_part else None,
+                                     None if timed_out else time.monotonic() - started)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        result = super()._generate(messages, stop, run_manager, **kwargs)
+        generation = result.generations[0]
+        reason = (generation.generation_info or {}).get("done_reason")
+        if self.validator and reason in self.validator.reasons:
+            # Drop the partial paragraph (or heading) the response was cut in
+            message = generation.message
+            result.generations[0] = ChatGeneration(
+                message=AIMessage(
+                    content=trim_to_paragraph(str(message.content)),
+                    usage_metadata=message.usage_metadata,
+                    additional_kwargs=message.additional_kwargs
+                ),
+                generation_info=generation.generation_info
+            )
+        return result
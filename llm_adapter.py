@@ -0,0 +1,83 @@
+"""
+LangChain LLM Adapter
+
+CrewAI turns any LLM object it does not recognise into its own LiteLLM-backed
+LLM, copying only the model name and a few sampling settings. This module
+wraps the agents' ChatOllama instances in a CrewAI BaseLLM instead, so every
+agent call really goes through the ChatOllama object together with its
+cache, callbacks, keep-alive and HTTP transport. The adapter can also re-lay
+CrewAI's messages before they are sent (see prompt_prefix.py).
+"""
+
+from typing import Any
+
+from crewai.llms.base_llm import BaseLLM
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+MESSAGE_TYPES = {
+    "system": SystemMessage,
+    "user": HumanMessage,
+    "assistant": AIMessage,
+}
+
+
+class LangChainChatLLM(BaseLLM):
+    """CrewAI LLM that delegates every call to a LangChain chat model"""
+
+    llm_type: str = "langchain"
+    provider: str = "ollama"
+    chat_model: Any = None
+    # Optional callable (messages, task) -> messages, and prompt_prefix.PrefixReuseTracker with its stage name
+    prompt_layout: Any = None
+    prefix_tracker: Any = None
+    stage: Any = None
+
+    def __init__(self, chat_model, **kwargs):
+        """
+        Wrap a LangChain chat model
+
+        Args:
+            chat_model: The chat model (e.g. ChatOllama) that handles the calls
+        """
+        super().__init__(
+            model=chat_model.model,
+            temperature=getattr(chat_model, "temperature", None),
+            chat_model=chat_model,
+            **kwargs
+        )
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None,
+             from_agent=None, response_model=None):
+        """Send the messages to the chat model and return the response text"""
+        messages = self._format_messages(messages)
+        if self.prompt_layout is not None:
+            messages = self.prompt_layout(messages, from_task)
+        if self.prefix_tracker is not None:
+            self.prefix_tracker.observe_prompt(self.stage, self.model, "".join(m["content"] for m in messages))
+        lc_messages = [
+            MESSAGE_TYPES.get(message["role"], HumanMessage)(content=message["content"])
+            for message in messages
+        ]
+
+        response = self.chat_model.invoke(lc_messages, stop=self.stop_sequences or None)
+
+        usage = getattr(response, "usage_metadata", None)
+        if usage and self.prefix_tracker is not None:
+            self.prefix_tracker.observe_prefill(self.stage, usage.get("input_tokens", 0))
+        if usage:
+            self._track_token_usage_internal({
+                "prompt_tokens": usage.get("input_tokens", 0),
+                "completion_tokens": usage.get("output_tokens", 0),
+                "total_tokens": usage.get("total_tokens", 0)
+            })
+
+        return self._apply_stop_words(str(response.content))
+
+    def supports_function_calling(self):
+        """Agents drive tools through the ReAct text format"""
+        return False
+
+    def get_context_window_size(self):
+        """Use the model's configured num_ctx when it is set"""
+        num_ctx = getattr(self.chat_model, "num_ctx", None)
+        return num_ctx or super().get_context_window_size()
@@ -1,52 +1,151 @@
+"""
+Story Writing Crew CLI
 
+Run without arguments for the interactive flow, or pass --prompt to write a
+story without any questions asked (for cron jobs and scripts). --dry-run only
+checks the configuration and that Ollama serves the configured models, which
+makes it a cheap container health check.
 
+crewai and langchain are imported only once a crew actually runs, so --help,
+--dry-run and argument errors return in a fraction of a second.
+"""
+
+import argparse
 import os
 import sys
 
-from crew import StoryWritingCrew
 from dotenv import load_dotenv
 
+DEFAULT_PROMPT = "A short sci-fi story about a rogue AI discovering emotions"
+DEFAULT_OUTPUT = "generated_story.txt"
+
+
+def parse_args(argv=None):
+    """Parse the command-line arguments"""
+    parser = argparse.ArgumentParser(description="Write a short story with the AI story-writing crew")
+    parser.add_argument("-p", "--prompt", help="Story prompt; skips the interactive questions")
+    parser.add_argument("-m", "--model", help="Ollama model for every stage, e.g. mistral (overrides per-stage settings)")
+    parser.add_argument("-o", "--output",
+                        help="File the final story is saved to (default: generated_story.txt, or only the run's "
+                             "artifact directory when ARTIFACT_DIR is set)")
+    parser.add_argument("-n", "--variants", type=int, help="Write this many story variants from one plot and cast")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Check the configuration and Ollama without writing a story")
+    parser.add_argument("--no-warmup", action="store_true", help="Don't preload the models before the run")
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument("--record", metavar="CASSETTE", help="Record every Ollama call to a cassette file")
+    cassette.add_argument("--replay", metavar="CASSETTE",
+                          help="Answer every Ollama call from a recorded cassette; no server needed")
+    return parser.parse_args(argv)
+
+
+def apply_model_override(model):
+    """Use one model for every stage; must run before config is imported"""
+    os.environ["LLM_MODEL"] = model
+    for stage in ("PLOT", "CHARACTERS", "SCENES", "EDITING"):
+        os.environ[f"{stage}_LLM_MODEL"] = model
+
+
+def apply_cassette(mode, path):
+    """Record Ollama calls to, or replay them from, a cassette; must run before config is imported"""
+    os.environ["OLLAMA_CASSETTE_MODE"] = mode
+    os.environ["OLLAMA_CASSETTE"] = path
+
+
 def load_environment():
-    """Load environment variables from .env file"""
-    load_dotenv()
-    
+    """Check that Ollama is running"""
+    from config import OLLAMA_URL
+
     # Check if Ollama is running (optional check)
     try:
         import requests
-        response = requests.get("http://localhost:11434/api/tags", timeout=5)
+        response = requests.get(f"{OLLAMA_URL}/api/tags", timeout=5)
         if response.status_code == 200:
             print("✓ Ollama is running and accessible")
+            return True
         else:
             print("⚠️  Ollama might not be running. Please start Ollama service.")
     except:
         print("⚠️  Could not verify Ollama connection. Make sure Ollama is installed and running.")
         print("   Install Ollama from: https://ollama.ai/")
         print("   Then run: ollama serve")
+    return False
+
+
+def dry_run(story_prompt, output_file):
+    """
+    Validate the configuration without importing crewai or calling a model
+
+    Returns:
+        0 when every Ollama endpoint is reachable and has every configured model, 1 otherwise
+    """
+    import requests
+    from config import OLLAMA_URLS, STAGE_LLM_SETTINGS
+    from warmup import configured_models
+
+    print("Dry run: nothing will be written")
+    print(f"  Prompt: {story_prompt}")
+    print(f"  Output: {output_file}")
+    for stage, settings in STAGE_LLM_SETTINGS.items():
+        print(f"  {stage}: {settings['model']} (temperature {settings['temperature']})")
+
+    models = configured_models()
+    ok = True
+    for base_url in OLLAMA_URLS:
+        try:
+            response = requests.get(f"{base_url}/api/tags", timeout=5)
+            response.raise_for_status()
+        except Exception as e:
+            print(f"⚠️  {base_url}: not reachable ({e})")
+            ok = False
+            continue
+
+        available = set()
+        for model in response.json().get("models", []):
+            name = model.get("name", "")
+            available.add(name)
+            if name.endswith(":latest"):
+                available.add(name[:-len(":latest")])
+        missing = [model for model in models if model not in available]
+        if missing:
+            print(f"⚠️  {base_url}: missing {', '.join(missing)} (run: ollama pull {missing[0]})")
+            ok = False
+        else:
+            print(f"✓ {base_url}: all {len(models)} models available")
+
+    return 0 if ok else 1
+
+
+def warm_up_models():
+    """Preload every configured model in parallel and pin it for this run"""
+    from warmup import preload_models, print_warmup_report
+
+    print("Preloading models...")
+    results = preload_models()
+    print_warmup_report(results)
+    return results
 
 
 def get_story_prompt():
     """Get story prompt from user input or use default"""
     print("Welcome to the AI Story Writing Crew!")
     print("=" * 50)
-    
-    # Default prompt
-    default_prompt = "A short sci-fi story about a rogue AI discovering emotions"
-    
-    print(f"Default story prompt: '{default_prompt}'")
+
+    print(f"Default story prompt: '{DEFAULT_PROMPT}'")
     print()
-    
+
     user_input = input("Enter your own story prompt (or press Enter to use default): ").strip()
-    
+
     if user_input:
         return user_input
     else:
-        return default_prompt
+        return DEFAULT_PROMPT
 
 
 def display_crew_info(crew):
     """Display information about the crew setup"""
     info = crew.get_crew_info()
-    
+
     print("\nCrew Configuration:")
     print("=" * 30)
     print(f"Story Prompt: {info['story_prompt']}")
@@ -55,69 +154,165 @@ def display_crew_info(crew):
     for i, agent in enumerate(info['agents'], 1):
         print(f"  {i}. {agent['role']}")
         print(f"     Goal: {agent['goal']}")
-    
+
     print("\nTasks:")
     for i, task in enumerate(info['tasks'], 1):
         print(f"  {i}. {task['expected_output']}")
-    
+
     print("\n" + "=" * 50)
 
 
-def main():
+def display_run_report(report):
+    """Display per-stage timings from the run report"""
+    if not report:
+        return
+
+    print("\nRun Report:")
+    print("=" * 30)
+    for stage, entry in report['stages'].items():
+        if entry['restored']:
+            print(f"  {stage:<11} restored from checkpoint")
+            continue
+        print(f"  {stage:<11} {entry['model'] or '-':<20} {entry['wall_s'] or 0:>8.1f}s  "
+              f"{entry['prompt_tokens']:>6} prompt / {entry['completion_tokens']:>6} completion tokens  "
+              f"{entry['llm_calls']} calls, {entry['retries']} retries")
+        early_stops = {reason: count for reason, count in entry.get('stop_reasons', {}).items()
+                       if reason not in ('stop', 'unknown')}
+        if early_stops:
+            print(f"  {'':<11} stopped by: {', '.join(f'{reason} x{count}' for reason, count in early_stops.items())}")
+        prefix = entry.get('prefix_cache') or {}
+        if prefix.get('saved_tokens'):
+            print(f"  {'':<11} prompt cache: ~{prefix['saved_tokens']} of ~{prefix['prompt_tokens_est']} "
+                  f"prompt tokens not prefilled ({prefix['saved_tokens_basis']}), {prefix['prefill_tokens']} prefilled")
+    print(f"  Total: {report['wall_s']:.1f}s (slowest stage: {report['slowest_stage']})")
+    deadline = report.get('deadline') or {}
+    if deadline.get('slo_s'):
+        print(f"  SLO: {deadline['slo_s']:.0f}s {'met' if deadline['met'] else 'missed'}, "
+              f"{deadline['timeouts']} timed-out calls")
+    if deadline.get('hedged_calls'):
+        print(f"  Hedged calls: {deadline['hedged_calls']} ({deadline['hedge_wins']} won by the duplicate)")
+
+
+def save_variants(variants, output_file=None):
+    """Save every story variant to its own file (when output_file is given) and print their timings"""
+    print("\nVariants:")
+    print("=" * 30)
+    for variant in variants:
+        saved_to = ""
+        if output_file:
+            base, extension = os.path.splitext(output_file)
+            variant_file = f"{base}_v{variant['variant']}{extension}"
+            with open(variant_file, 'w', encoding='utf-8') as f:
+                f.write(variant['story'])
+            saved_to = f" -> {variant_file}"
+        print(f"  v{variant['variant']}: scenes {variant['scenes_s']:.1f}s, editing {variant['editing_s']:.1f}s"
+              f"{saved_to}")
+
+
+def main(argv=None):
     """Main execution function"""
-    # Load environment variables
-    load_environment()
-    
-    # Get story prompt
-    story_prompt = get_story_prompt()
-    
-    # Get model preference
-    model_name = os.getenv("OLLAMA_MODEL", "llama3.2")
-    print(f"\nUsing Ollama model: {model_name}")
-    
-    # Create the crew
+    args = parse_args(argv)
+
+    # config reads the environment at import time, so .env and overrides go first
+    load_dotenv()
+    if args.model:
+        apply_model_override(args.model)
+    if args.record or args.replay:
+        apply_cassette("record" if args.record else "replay", args.record or args.replay)
+
+    from config import (OLLAMA_WARMUP, STREAM_OUTPUT, STAGE_LLM_SETTINGS, STORY_VARIANTS, OLLAMA_CASSETTE,
+                        OLLAMA_CASSETTE_MODE)
+
+    interactive = args.prompt is None and not args.dry_run
+    story_prompt = args.prompt or (get_story_prompt() if interactive else DEFAULT_PROMPT)
+    variants = args.variants or STORY_VARIANTS
+
+    if args.dry_run:
+        return dry_run(story_prompt, args.output or DEFAULT_OUTPUT)
+
+    # Check Ollama; a replayed run never talks to it
+    replaying = bool(OLLAMA_CASSETTE) and OLLAMA_CASSETTE_MODE == "replay"
+    if replaying:
+        print(f"Replaying Ollama calls from: {OLLAMA_CASSETTE}")
+    ollama_available = not replaying and load_environment()
+
+    # Show the model used by each stage
+    print("\nUsing Ollama models:")
+    for stage, settings in STAGE_LLM_SETTINGS.items():
+        print(f"  {stage}: {settings['model']}")
+
+    # Create the crew; this is where crewai gets imported
     print("\nInitializing Story Writing Crew...")
-    crew = StoryWritingCrew(story_prompt=story_prompt)
-    
-    # Display crew information
-    display_crew_info(crew)
-    
-    # Confirm execution
-    print("The crew is ready to start writing your story!")
-    confirm = input("Proceed with story creation? (y/n): ").strip().lower()
-    
-    if confirm not in ['y', 'yes']:
-        print("Story creation cancelled.")
-        return
-    
+    from crew import StoryWritingCrew
+    from streaming import ConsolePrinter
+    crew = StoryWritingCrew(
+        story_prompt=story_prompt,
+        on_token=ConsolePrinter() if STREAM_OUTPUT else None
+    )
+
+    if interactive:
+        # Display crew information
+        display_crew_info(crew)
+
+        # Confirm execution
+        print("The crew is ready to start writing your story!")
+        confirm = input("Proceed with story creation? (y/n): ").strip().lower()
+
+        if confirm not in ['y', 'yes']:
+            print("Story creation cancelled.")
+            return 0
+
+    # Runs with an artifact directory already hold the final story; --output still saves a copy
+    output_file = args.output or (None if crew.artifacts is not None else DEFAULT_OUTPUT)
+
+    # Load the models before the first agent call so the run doesn't pay for it
+    warmed_up = OLLAMA_WARMUP and ollama_available and not args.no_warmup
+    if warmed_up:
+        warm_up_models()
+
     # Execute the story writing process
     try:
         print("\nStarting story writing process...")
         print("This may take several minutes depending on story complexity.")
         print()
-        
+
+        if variants > 1:
+            save_variants(crew.write_variants(variants), output_file)
+            if crew.run_artifacts is not None:
+                print(f"Run artifacts saved to: {crew.report['artifacts']}")
+            display_run_report(crew.report)
+            return 0
+
         result = crew.write_story()
-        
+
         print("\n" + "=" * 60)
         print("STORY WRITING COMPLETE!")
         print("=" * 60)
         print("\nFinal Result:")
         print("-" * 30)
         print(result)
-        
+
         # Save result to file
-        output_file = "generated_story.txt"
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(str(result))
-        
-        print(f"\nStory saved to: {output_file}")
-        
+        if output_file:
+            with open(output_file, 'w', encoding='utf-8') as f:
+                f.write(str(result))
+            print(f"\nStory saved to: {output_file}")
+        if crew.run_artifacts is not None:
+            print(f"Run artifacts saved to: {crew.report['artifacts']}")
+
+        display_run_report(crew.report)
+        return 0
+
     except Exception as e:
         print(f"\nError during story creation: {str(e)}")
         print("Please check that Ollama is running and the model is available.")
         print("Try running: ollama list")
-        return
+        return 1
+    finally:
+        if warmed_up:
+            from warmup import release_models
+            release_models()
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,316 @@
+"""
+Run Metrics
+
+This module records per-stage performance of a crew run. A StageMetricsHandler
+is attached to the LLM of each agent and measures every call (time to first
+token, prompt and completion tokens, rendered prompt size, failed calls),
+while task completion hooks record each stage's wall time. RunMetrics turns
+this into a structured report that can be exported as JSONL or in the
+Prometheus text format.
+"""
+
+import json
+import threading
+import time
+import uuid
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from tasks import get_context_tasks
+
+
+class StageMetricsHandler(BaseCallbackHandler):
+    """Collects LLM call measurements for one stage"""
+
+    def __init__(self, stage):
+        self.stage = stage
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.reset()
+
+    def reset(self):
+        """Clear all measurements"""
+        with self._lock:
+            self._calls.clear()
+            self.started_at = None
+            self.finished_at = None
+            self.restored = False
+            self.llm_calls = 0
+            self.failed_calls = 0
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+            self.prompt_chars = 0
+            self.max_prompt_chars = 0
+            self.llm_seconds = 0.0
+            self.load_seconds = 0.0
+            self.time_to_first_token = None
+            # Why each call stopped: "stop", "length", "word_limit", ...
+            self.stop_reasons = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        """Record the start of a call and the size of its rendered prompt"""
+        chars = sum(len(str(message.content)) for batch in messages for message in batch)
+        self._start(run_id, chars)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        """Record the start of a completion-style call"""
+        self._start(run_id, sum(len(prompt) for prompt in prompts))
+
+    def _start(self, run_id, chars):
+        now = time.perf_counter()
+        with self._lock:
+            if self.started_at is None:
+                self.started_at = now
+            self._calls[run_id] = {"started": now, "first_token": None}
+            self.llm_calls += 1
+            self.prompt_chars += chars
+            self.max_prompt_chars = max(self.max_prompt_chars, chars)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        """Record the first token of a call"""
+        with self._lock:
+            call = self._calls.get(run_id)
+            if call is not None and call["first_token"] is None:
+                call["first_token"] = time.perf_counter()
+                if self.time_to_first_token is None:
+                    self.time_to_first_token = call["first_token"] - call["started"]
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        """Record duration and token usage of a completed call"""
+        prompt_tokens, completion_tokens = _token_usage(response)
+        load_seconds = _load_seconds(response)
+        stop_reasons = _stop_reasons(response)
+        with self._lock:
+            self.load_seconds += load_seconds
+            for reason in stop_reasons:
+                self.stop_reasons[reason] = self.stop_reasons.get(reason, 0) + 1
+            call = self._calls.pop(run_id, None)
+            if call is not None:
+                self.llm_seconds += time.perf_counter() - call["started"]
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        """Count a failed call; the agent retries it"""
+        with self._lock:
+            call = self._calls.pop(run_id, None)
+            if call is not None:
+                self.llm_seconds += time.perf_counter() - call["started"]
+            self.failed_calls += 1
+
+    def snapshot(self):
+        """Return the measurements as a dict"""
+        with self._lock:
+            wall = None
+            if self.started_at is not None and self.finished_at is not None:
+                wall = round(self.finished_at - self.started_at, 4)
+            return {
+                "restored": self.restored,
+                "wall_s": wall,
+                "llm_s": round(self.llm_seconds, 4),
+                # Model (re)load time reported by Ollama, included in llm_s
+                "load_s": round(self.load_seconds, 4),
+                "time_to_first_token_s": (round(self.time_to_first_token, 4)
+                                          if self.time_to_first_token is not None else None),
+                "llm_calls": self.llm_calls,
+                "retries": self.failed_calls,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "prompt_chars": self.prompt_chars,
+                "max_prompt_chars": self.max_prompt_chars,
+                "stop_reasons": dict(self.stop_reasons)
+            }
+
+
+def _token_usage(response):
+    """Extract (prompt tokens, completion tokens) from an LLMResult"""
+    prompt_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+                continue
+            info = generation.generation_info or {}
+            prompt_tokens += info.get("prompt_eval_count") or 0
+            completion_tokens += info.get("eval_count") or 0
+    return prompt_tokens, completion_tokens
+
+
+def _load_seconds(response):
+    """Extract the model load time Ollama reports for an LLMResult"""
+    nanoseconds = 0
+    for generations in response.generations:
+        for generation in generations:
+            nanoseconds += (generation.generation_info or {}).get("load_duration") or 0
+    return nanoseconds / 1e9
+
+
+def _stop_reasons(response):
+    """Extract the done_reason Ollama (or a generation limit) reports for each generation of an LLMResult"""
+    return [
+        (generation.generation_info or {}).get("done_reason") or "unknown"
+        for generations in response.generations
+        for generation in generations
+    ]
+
+
+class RunMetrics:
+    """Per-run collection of stage metrics"""
+
+    def __init__(self):
+        self.handlers = {}
+        self.run_id = None
+        self.started_at = None
+        self._lock = threading.Lock()
+
+    def handler(self, stage):
+        """Return the metrics handler for a stage, creating it on first use"""
+        with self._lock:
+            if stage not in self.handlers:
+                self.handlers[stage] = StageMetricsHandler(stage)
+            return self.handlers[stage]
+
+    def attach(self, stage, task):
+        """Record the stage's finish time when its task completes"""
+        handler = self.handler(stage)
+        previous_callback = task.callback
+
+        def _finished(output):
+            handler.finished_at = time.perf_counter()
+            if previous_callback:
+                previous_callback(output)
+
+        task.callback = _finished
+
+    def start(self):
+        """Begin a new run, clearing measurements from any previous run"""
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started_at = time.perf_counter()
+        for handler in self.handlers.values():
+            handler.reset()
+
+    def mark_restored(self, stage):
+        """Mark a stage as restored from a checkpoint rather than executed"""
+        self.handler(stage).restored = True
+
+    def report(self, story_prompt, stage_tasks, status="ok", error=None):
+        """
+        Build the structured report for the current run
+
+        Args:
+            story_prompt: The run's story prompt
+            stage_tasks: (stage name, task) pairs in pipeline order
+            status: "ok" or "error"
+            error: Error message for failed runs
+
+        Returns:
+            A JSON-serialisable dict with per-stage and total measurements
+        """
+        stages = {}
+        for stage, task in stage_tasks:
+            entry = self.handler(stage).snapshot()
+            entry["agent"] = task.agent.role if task.agent else None
+            llm = getattr(task.agent, "llm", None)
+            llm = getattr(llm, "chat_model", llm)
+            entry["model"] = getattr(llm, "model", None)
+            entry["num_ctx"] = getattr(llm, "num_ctx", None)
+            entry["num_predict"] = getattr(llm, "num_predict", None)
+            # Size of the upstream outputs handed to the task as context
+            entry["context_chars"] = sum(
+                len(str(upstream.output.raw)) for upstream in get_context_tasks(task) if upstream.output
+            )
+            stages[stage] = entry
+
+        totals = {
+            key: sum(entry[key] for entry in stages.values())
+            for key in ("llm_calls", "retries", "prompt_tokens", "completion_tokens", "prompt_chars")
+        }
+        slowest = max(stages, key=lambda stage: stages[stage]["wall_s"] or 0) if stages else None
+
+        return {
+            "run_id": self.run_id,
+            "timestamp": time.time(),
+            "story_prompt": story_prompt,
+            "status": status,
+            "error": error,
+            "wall_s": round(time.perf_counter() - self.started_at, 4) if self.started_at else None,
+            "slowest_stage": slowest,
+            "stages": stages,
+            "totals": totals
+        }
+
+
+def export_jsonl(report, path):
+    """Append a run report to a JSONL file"""
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(report, ensure_ascii=False) + "\n")
+
+
+PROMETHEUS_METRICS = [
+    ("wall_s", "story_stage_wall_seconds", "Wall time of the stage"),
+    ("llm_s", "story_stage_llm_seconds", "Time spent inside LLM calls"),
+    ("load_s", "story_stage_model_load_seconds", "Model load time inside LLM calls"),
+    ("time_to_first_token_s", "story_stage_time_to_first_token_seconds", "Time to the first streamed token"),
+    ("llm_calls", "story_stage_llm_calls", "Number of LLM calls"),
+    ("retries", "story_stage_retries", "Failed LLM calls that were retried"),
+    ("prompt_tokens", "story_stage_prompt_tokens", "Prompt tokens processed"),
+    ("completion_tokens", "story_stage_completion_tokens", "Completion tokens generated"),
+    ("prompt_chars", "story_stage_prompt_chars", "Characters of rendered prompts"),
+    ("context_chars", "story_stage_context_chars", "Characters of upstream context"),
+]
+
+
+# Process-wide latency histograms from deadlines.LatencyTracker, per model
+LATENCY_HISTOGRAMS = [
+    ("ttft", "story_llm_time_to_first_token_seconds", "Time to the first streamed part of an LLM call"),
+    ("duration", "story_llm_call_seconds", "Duration of LLM calls that finished"),
+]
+
+
+# Process-wide adaptive concurrency limiter state from concurrency.AdaptiveConcurrencyLimiter
+CONCURRENCY_METRICS = [
+    ("limit", "story_llm_concurrency_limit", "Current limit on concurrent LLM calls"),
+    ("in_flight", "story_llm_calls_in_flight", "LLM calls holding a concurrency slot"),
+    ("queue_depth", "story_llm_queue_depth", "LLM calls waiting for a concurrency slot"),
+]
+
+
+def to_prometheus(report):
+    """Render a run report in the Prometheus text exposition format"""
+    lines = []
+    for key, name, help_text in PROMETHEUS_METRICS:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for stage, entry in report["stages"].items():
+            value = entry.get(key)
+            if value is not None:
+                labels = f'run_id="{report["run_id"]}",stage="{stage}",model="{entry.get("model") or ""}"'
+                lines.append(f'{name}{{{labels}}} {value}')
+    if report.get("wall_s") is not None:
+        lines.append("# HELP story_run_wall_seconds Wall time of the whole run")
+        lines.append("# TYPE story_run_wall_seconds gauge")
+        lines.append(f'story_run_wall_seconds{{run_id="{report["run_id"]}"}} {report["wall_s"]}')
+    for key, name, help_text in LATENCY_HISTOGRAMS:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for model, histograms in report.get("latency", {}).items():
+            histogram = histograms[key]
+            for bound, count in histogram["buckets"].items():
+                lines.append(f'{name}_bucket{{model="{model}",le="{bound}"}} {count}')
+            lines.append(f'{name}_sum{{model="{model}"}} {histogram["sum"]}')
+            lines.append(f'{name}_count{{model="{model}"}} {histogram["count"]}')
+    concurrency = report.get("concurrency")
+    if concurrency:
+        for key, name, help_text in CONCURRENCY_METRICS:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {concurrency[key]}")
+    return "\n".join(lines) + "\n"
+
+
+def export_prometheus(report, path):
+    """Write a run report to a Prometheus text file (e.g. for the node exporter textfile collector)"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(to_prometheus(report))
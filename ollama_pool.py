@@ -0,0 +1,295 @@
+"""
+Ollama Endpoint Pool
+
+This module spreads LLM calls over several Ollama servers. OllamaEndpointPool
+tracks the in-flight requests, health and loaded models of every endpoint,
+probing /api/tags and /api/ps in the background and ejecting endpoints that
+keep failing. LoadBalancingTransport plugs the pool into the HTTP client used
+by ChatOllama and sends each request to the least-loaded healthy endpoint,
+preferring endpoints that already have the requested model loaded. Requests
+that carry a session header stay on the endpoint their session last used, so
+one run's calls keep hitting the server that holds its prompt prefix in cache.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+import httpx
+
+from config import OLLAMA_URLS, OLLAMA_PROBE_INTERVAL, OLLAMA_EJECT_AFTER_FAILURES, OLLAMA_EJECT_SECONDS, ollama_model_tag
+
+# Request header naming the session (e.g. one crew) whose calls should stay on one endpoint
+SESSION_HEADER = "X-Story-Session"
+
+
+class NoHealthyEndpointError(RuntimeError):
+    """Raised when every endpoint in the pool is ejected"""
+
+
+class Endpoint:
+    """State of a single Ollama server"""
+
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        parts = urlsplit(self.url)
+        self.scheme = parts.scheme or "http"
+        self.host = parts.hostname
+        self.port = parts.port
+
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.models = set()
+
+    @property
+    def available(self):
+        return time.monotonic() >= self.ejected_until
+
+    def as_dict(self):
+        return {
+            "url": self.url,
+            "available": self.available,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "loaded_models": sorted(self.models)
+        }
+
+
+class OllamaEndpointPool:
+    """Least-loaded routing over several Ollama servers with health checks"""
+
+    def __init__(self, urls=None, probe_interval=OLLAMA_PROBE_INTERVAL,
+                 eject_after_failures=OLLAMA_EJECT_AFTER_FAILURES, eject_seconds=OLLAMA_EJECT_SECONDS,
+                 affinity_slack=1, max_sessions=1024):
+        """
+        Initialize the pool
+
+        Args:
+            urls: Base URLs of the Ollama servers (defaults to OLLAMA_URLS)
+            probe_interval: Seconds between background health probes; 0 disables probing
+            eject_after_failures: Consecutive failures after which an endpoint is ejected
+            eject_seconds: How long an ejected endpoint is skipped before it is tried again
+            affinity_slack: Extra in-flight requests tolerated to keep a model on an endpoint
+                where it is already loaded (or, for a session, where its last call went)
+            max_sessions: Number of sessions whose endpoint is remembered
+        """
+        urls = urls or OLLAMA_URLS
+        if not urls:
+            raise ValueError("At least one Ollama endpoint is required")
+
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.probe_interval = probe_interval
+        self.eject_after_failures = eject_after_failures
+        self.eject_seconds = eject_seconds
+        self.affinity_slack = affinity_slack
+        self.max_sessions = max_sessions
+
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._transport = None
+        self._next = 0
+        self._stopped = threading.Event()
+        self._prober = None
+        if probe_interval > 0:
+            self._prober = threading.Thread(target=self._probe_loop, name="ollama-pool-probe", daemon=True)
+            self._prober.start()
+
+    def acquire(self, model=None, exclude=(), session=None):
+        """
+        Pick an endpoint for a request and count it as in flight
+
+        The endpoint with the fewest in-flight requests wins, except that the
+        endpoint a session's previous call for the model went to, or else an
+        endpoint with the model already loaded, is preferred as long as it is
+        at most affinity_slack requests busier.
+        """
+        with self._lock:
+            candidates = [e for e in self.endpoints if e.available and e not in exclude]
+            if not candidates:
+                raise NoHealthyEndpointError("No healthy Ollama endpoint available")
+
+            # Rotate the starting point so ties are spread round-robin
+            self._next = (self._next + 1) % len(self.endpoints)
+            candidates.sort(key=lambda e: (e.in_flight, (self.endpoints.index(e) - self._next) % len(self.endpoints)))
+
+            endpoint = candidates[0]
+            # Loaded models are tracked by their tagged name, as /api/ps reports them
+            tagged = ollama_model_tag(model) if model else None
+            affine = [e for e in candidates if tagged and tagged in e.models]
+            if affine and affine[0].in_flight <= endpoint.in_flight + self.affinity_slack:
+                endpoint = affine[0]
+            if session:
+                pinned = self._sessions.get((session, model))
+                if pinned in candidates and pinned.in_flight <= candidates[0].in_flight + self.affinity_slack:
+                    endpoint = pinned
+                self._sessions[(session, model)] = endpoint
+                self._sessions.move_to_end((session, model))
+                if len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def release(self, endpoint, ok, model=None):
+        """Finish a request and update the endpoint's health"""
+        with self._lock:
+            endpoint.in_flight -= 1
+            if ok:
+                endpoint.consecutive_failures = 0
+                if model:
+                    endpoint.models.add(ollama_model_tag(model))
+            else:
+                self._record_failure(endpoint)
+
+    def _record_failure(self, endpoint):
+        endpoint.failures += 1
+        endpoint.consecutive_failures += 1
+        if endpoint.consecutive_failures >= self.eject_after_failures:
+            endpoint.ejected_until = time.monotonic() + self.eject_seconds
+            endpoint.models.clear()
+
+    def probe(self):
+        """Check every endpoint's health and refresh its loaded models"""
+        for endpoint in self.endpoints:
+            try:
+                with httpx.Client(timeout=5) as client:
+                    client.get(f"{endpoint.url}/api/tags").raise_for_status()
+                    running = client.get(f"{endpoint.url}/api/ps")
+                    models = {ollama_model_tag(m["name"]) for m in running.json().get("models", []) if m.get("name")} if running.is_success else None
+            except Exception:
+                with self._lock:
+                    self._record_failure(endpoint)
+                continue
+
+            with self._lock:
+                endpoint.consecutive_failures = 0
+                endpoint.ejected_until = 0.0
+                if models is not None:
+                    endpoint.models = models
+
+    def transport(self):
+        """
+        Return the httpx transport that routes requests through this pool
+
+        It is created on first use and shared by every client of the pool, so
+        connections to the endpoints are pooled across LLMs and crews.
+        """
+        with self._lock:
+            if self._transport is None:
+                self._transport = LoadBalancingTransport(self)
+            return self._transport
+
+    def _probe_loop(self):
+        while not self._stopped.wait(self.probe_interval):
+            self.probe()
+
+    def close(self):
+        """Stop background probing and close the pool's connections"""
+        self._stopped.set()
+        if self._transport is not None:
+            self._transport.close()
+
+    def stats(self):
+        """Return the state of every endpoint"""
+        with self._lock:
+            return [endpoint.as_dict() for endpoint in self.endpoints]
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Response body that hands its endpoint back to the pool once it is consumed or closed"""
+
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            if self._on_close is not None:
+                on_close, self._on_close = self._on_close, None
+                on_close()
+
+
+def _request_model(request):
+    """Read the model name from a JSON request body"""
+    try:
+        return json.loads(request.content or b"{}").get("model")
+    except (ValueError, AttributeError):
+        return None
+
+
+class LoadBalancingTransport(httpx.BaseTransport):
+    """httpx transport that routes every request through an OllamaEndpointPool"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._transport = httpx.HTTPTransport()
+
+    def handle_request(self, request):
+        model = _request_model(request)
+        session = request.headers.get(SESSION_HEADER)
+        tried = []
+
+        while True:
+            endpoint = self.pool.acquire(model, exclude=tried, session=session)
+            tried.append(endpoint)
+            routed = httpx.Request(
+                request.method,
+                request.url.copy_with(scheme=endpoint.scheme, host=endpoint.host, port=endpoint.port),
+                headers=[(k, v) for k, v in request.headers.raw if k.lower() != b"host"],
+                content=request.content,
+                extensions=request.extensions
+            )
+
+            try:
+                response = self._transport.handle_request(routed)
+            except httpx.TransportError:
+                # Nothing reached the server; try the next endpoint if there is one
+                self.pool.release(endpoint, ok=False)
+                if len(tried) >= len(self.pool.endpoints):
+                    raise
+                continue
+
+            ok = response.status_code < 500
+            return httpx.Response(
+                status_code=response.status_code,
+                headers=response.headers,
+                stream=_ReleasingStream(response.stream, lambda: self.pool.release(endpoint, ok, model)),
+                extensions=response.extensions
+            )
+
+    def close(self):
+        self._transport.close()
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool():
+    """
+    Return the process-wide pool configured by OLLAMA_URLS
+
+    Returns:
+        A shared OllamaEndpointPool, or None when only one endpoint is configured
+    """
+    global _default_pool
+
+    if len(OLLAMA_URLS) < 2:
+        return None
+
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = OllamaEndpointPool()
+        return _default_pool
@@ -0,0 +1,150 @@
+"""
+Prompt Prefix Reuse
+
+Ollama keeps the KV cache of the last prompt it processed and only prefills
+the part of a new prompt after the longest shared prefix. CrewAI puts each
+agent's role and backstory first and the upstream outputs (plot, characters,
+draft) last, so consecutive stages never share more than a few tokens.
+
+This module lays prompts out the other way round: a static crew preamble,
+then the story materials in pipeline order, then the agent's own system
+prompt and task. Consecutive prompts to a model then open with the same
+preamble and the materials both stages receive, e.g. the preamble and the
+plot for the character and scene stages; what follows differs. Stages
+that use the same model are also given the same num_ctx, since a different
+context size makes Ollama reload the model and drop its cache.
+
+PrefixReuseTracker measures how much of every prompt repeats the previous
+prompt sent to the same model, and how many prompt tokens Ollama actually
+prefilled.
+"""
+
+import os
+import threading
+
+from crewai.utilities.formatter import aggregate_raw_outputs_from_tasks
+
+from context_budget import CHARS_PER_TOKEN
+from tasks import get_context_tasks
+
+# Identical at the start of every prompt of every stage
+CREW_PREAMBLE = (
+    "You are part of a story-writing crew: a Plot Architect, a Character Crafter, a Scene Weaver and a "
+    "Narrative Editor build one short story in turn, each from the work of the ones before. The story "
+    "materials written so far come first; your own role and task follow after them."
+)
+
+# How CrewAI appends the upstream outputs to a task prompt (its "task_with_context" slice)
+CONTEXT_MARKER = "\n\nThis is the context you're working with:\n"
+
+
+def shared_num_ctx(stage_settings):
+    """
+    Give stages that run on the same model one num_ctx, the largest configured for it
+
+    Args:
+        stage_settings: Dict of stage name to its settings (see config.STAGE_LLM_SETTINGS)
+
+    Returns:
+        A dict of stage name to num_ctx (None where no stage of that model sets one)
+    """
+    largest = {}
+    for settings in stage_settings.values():
+        if settings.get("num_ctx"):
+            largest[settings["model"]] = max(largest.get(settings["model"], 0), settings["num_ctx"])
+    return {stage: largest.get(settings["model"]) for stage, settings in stage_settings.items()}
+
+
+def prefix_first_layout(messages, task):
+    """
+    Move the story materials of a CrewAI prompt in front of the agent's system prompt
+
+    Args:
+        messages: CrewAI messages ({"role": ..., "content": ...} dicts)
+        task: The task being executed, whose context tasks produced the materials
+
+    Returns:
+        The reordered messages, or the messages unchanged when their layout is not recognised
+    """
+    context = aggregate_raw_outputs_from_tasks(get_context_tasks(task)) if task is not None else ""
+    if not messages or messages[0]["role"] != "system":
+        return messages
+
+    user_index = next((index for index, message in enumerate(messages) if message["role"] == "user"), None)
+    if user_index is None:
+        return messages
+
+    user_content = messages[user_index]["content"]
+    materials = CREW_PREAMBLE
+    if context:
+        if CONTEXT_MARKER + context not in user_content:
+            return messages
+        user_content = user_content.replace(
+            CONTEXT_MARKER + context, "\n\nUse the story materials at the start of this conversation as your context."
+        )
+        materials += f"\n\nStory materials:\n{context}"
+
+    reordered = [dict(message) for message in messages]
+    reordered[0]["content"] = f"{materials}\n\n{messages[0]['content']}"
+    reordered[user_index]["content"] = user_content
+    return reordered
+
+
+class PrefixReuseTracker:
+    """Per-stage measurements of prompt prefixes shared with the previous call to the same model"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_prompt = {}
+        self._stages = {}
+
+    def reset(self):
+        """Clear all measurements; the last prompt per model is kept, as Ollama keeps its cache"""
+        with self._lock:
+            self._stages.clear()
+
+    def _stage(self, stage):
+        if stage not in self._stages:
+            self._stages[stage] = {"calls": 0, "prompt_chars": 0, "shared_prefix_chars": 0, "prefill_tokens": 0}
+        return self._stages[stage]
+
+    def observe_prompt(self, stage, model, prompt):
+        """Record a prompt about to be sent and how much of it repeats the model's previous prompt"""
+        with self._lock:
+            previous = self._last_prompt.get(model, "")
+            self._last_prompt[model] = prompt
+            entry = self._stage(stage)
+            entry["calls"] += 1
+            entry["prompt_chars"] += len(prompt)
+            entry["shared_prefix_chars"] += len(os.path.commonprefix([previous, prompt]))
+
+    def observe_prefill(self, stage, prompt_tokens):
+        """Record the prompt tokens Ollama reports it evaluated for a call"""
+        with self._lock:
+            self._stage(stage)["prefill_tokens"] += prompt_tokens
+
+    def report(self):
+        """
+        Return the prefix measurements per stage
+
+        prefill_tokens is what Ollama reports it evaluated; the other token counts
+        are estimates from character counts. saved_tokens is the estimated prompt
+        size minus what Ollama prefilled when it reported a prefill count
+        (saved_tokens_basis "measured"), and the repeated prefix otherwise
+        ("estimated").
+        """
+        with self._lock:
+            report = {}
+            for stage, entry in self._stages.items():
+                prompt_tokens = entry["prompt_chars"] // CHARS_PER_TOKEN
+                shared_tokens = entry["shared_prefix_chars"] // CHARS_PER_TOKEN
+                measured = entry["prefill_tokens"] > 0
+                report[stage] = {
+                    "calls": entry["calls"],
+                    "prompt_tokens_est": prompt_tokens,
+                    "shared_prefix_tokens_est": shared_tokens,
+                    "prefill_tokens": entry["prefill_tokens"],
+                    "saved_tokens": max(0, prompt_tokens - entry["prefill_tokens"]) if measured else shared_tokens,
+                    "saved_tokens_basis": "measured" if measured else "estimated"
+                }
+            return report
@@ -0,0 +1,233 @@
+"""
+Semantic Stage Cache
+
+This module reuses stage outputs across prompts that mean the same thing.
+Every finished run's prompt is embedded with EMBED_MODEL and stored in a
+vector index next to the outputs of its cacheable stages (plot and characters
+by default). A new prompt whose embedding is close enough to a stored one -
+cosine similarity at or above the threshold - gets those outputs back instead
+of regenerating them; if every stage is cacheable the whole story is reused.
+
+The vectors live in a NumPy memory-mapped .npy file, so lookups don't load
+the index into memory, and the prompts and outputs in a JSON file beside it.
+"""
+
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import requests
+
+from config import (OLLAMA_URL, EMBED_MODEL, SEMANTIC_CACHE_PATH, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_STAGES,
+                    SEMANTIC_CACHE_MAX_ENTRIES)
+from tasks import set_task_output, get_context_tasks
+
+
+def _stage_model(task):
+    """Model of the agent that runs a task"""
+    return getattr(getattr(task.agent, "llm", None), "model", "")
+
+
+class SemanticStageCache:
+    """Embedding index of past prompts and their stage outputs"""
+
+    def __init__(self, path=SEMANTIC_CACHE_PATH, threshold=SEMANTIC_CACHE_THRESHOLD, stages=SEMANTIC_CACHE_STAGES,
+                 max_entries=SEMANTIC_CACHE_MAX_ENTRIES, embed_model=EMBED_MODEL, base_url=OLLAMA_URL):
+        """
+        Open (or create) the index
+
+        Args:
+            path: Path prefix of the index; <path>.vectors.npy and <path>.json are written
+            threshold: Minimum cosine similarity for a stored prompt to count as a match
+            stages: Stage names whose outputs are stored and reused, in pipeline order
+            max_entries: Maximum number of prompts kept; the oldest are overwritten first
+            embed_model: Ollama embedding model
+            base_url: Ollama server used for embeddings
+        """
+        self.vectors_path = f"{path}.vectors.npy"
+        self.index_path = f"{path}.json"
+        self.threshold = threshold
+        self.stages = list(stages)
+        self.max_entries = max_entries
+        self.embed_model = embed_model
+        self.base_url = base_url
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self._entries = []
+        self._next = 0
+        self._vectors = None
+        if os.path.exists(self.index_path) and os.path.exists(self.vectors_path):
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get("embed_model") == embed_model:
+                self._entries = index["entries"]
+                self._next = index["next"]
+                self._vectors = np.load(self.vectors_path, mmap_mode="r+")
+
+    def embed(self, text):
+        """
+        Embed a prompt
+
+        Returns:
+            A unit-length float32 vector, or None when the embedding model is unavailable
+        """
+        try:
+            response = requests.post(f"{self.base_url}/api/embed",
+                                     json={"model": self.embed_model, "input": text}, timeout=60)
+            response.raise_for_status()
+            vector = np.asarray(response.json()["embeddings"][0], dtype=np.float32)
+        except Exception as e:
+            print(f"⚠️  Semantic cache disabled for this run: could not embed with {self.embed_model} ({e})")
+            return None
+
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, vector):
+        """
+        Find the stored prompt most similar to an embedded prompt
+
+        Returns:
+            A (entry, similarity) tuple; entry is None when nothing reaches the threshold
+        """
+        with self._lock:
+            count = len(self._entries)
+            if vector is None or count == 0 or self._vectors.shape[1] != vector.shape[0]:
+                self.misses += 1
+                return None, 0.0
+
+            # Rows are unit length, so the dot product is the cosine similarity
+            similarities = self._vectors[:count] @ vector
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold:
+                self.misses += 1
+                return None, similarity
+
+            self.hits += 1
+            return self._entries[best], similarity
+
+    def add(self, prompt, vector, outputs):
+        """
+        Store a prompt's embedding and stage outputs
+
+        Args:
+            prompt: The story prompt
+            vector: Its embedding from embed()
+            outputs: Dict of stage name to {"model": ..., "output": ...}
+        """
+        with self._lock:
+            if self._vectors is not None and self._vectors.shape[1] != vector.shape[0]:
+                # The embedding model changed its dimensions; start over
+                self._entries, self._next, self._vectors = [], 0, None
+
+            slot = self._next % self.max_entries
+            if self._vectors is None or slot >= self._vectors.shape[0]:
+                self._grow(vector.shape[0], slot + 1)
+
+            self._vectors[slot] = vector
+            self._vectors.flush()
+            entry = {"prompt": prompt, "created": time.time(), "outputs": outputs}
+            if slot < len(self._entries):
+                self._entries[slot] = entry
+            else:
+                self._entries.append(entry)
+            self._next = slot + 1
+            self._save_index()
+
+    def _grow(self, dimensions, min_rows):
+        """Move the vectors to a larger memory-mapped file"""
+        rows = min(self.max_entries, max(min_rows, 2 * (self._vectors.shape[0] if self._vectors is not None else 32)))
+        tmp_path = f"{self.vectors_path}.tmp.npy"
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(rows, dimensions))
+        if self._vectors is not None:
+            grown[:self._vectors.shape[0]] = self._vectors
+        grown.flush()
+        del grown
+        self._vectors = None
+        os.replace(tmp_path, self.vectors_path)
+        self._vectors = np.load(self.vectors_path, mmap_mode="r+")
+
+    def _save_index(self):
+        """Atomically write the prompts and outputs"""
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"embed_model": self.embed_model, "next": self._next, "entries": self._entries},
+                      f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def restore(self, entry, stage_tasks):
+        """
+        Give pending stages the outputs of a matched prompt
+
+        Stages are restored in pipeline order until one is not cacheable, was
+        stored with a different model, or depends on a stage that was not
+        restored from the same entry.
+
+        Args:
+            entry: A matching entry from lookup()
+            stage_tasks: (stage name, task) pairs still to run, in pipeline order
+
+        Returns:
+            A (restored stage names, (stage name, task) pairs still to run) tuple
+        """
+        restored = []
+        restored_tasks = set()
+        for index, (stage, task) in enumerate(stage_tasks):
+            cached = entry["outputs"].get(stage)
+            if (stage not in self.stages or cached is None or cached["model"] != _stage_model(task)
+                    or not all(id(upstream) in restored_tasks for upstream in get_context_tasks(task))):
+                return restored, stage_tasks[index:]
+
+            set_task_output(task, cached["output"])
+            restored_tasks.add(id(task))
+            restored.append(stage)
+        return restored, []
+
+    def store(self, prompt, vector, stage_tasks):
+        """Store the outputs of the cacheable stages of a finished run"""
+        outputs = {
+            stage: {"model": _stage_model(task), "output": str(task.output.raw)}
+            for stage, task in stage_tasks
+            if stage in self.stages and task.output is not None
+        }
+        if vector is not None and outputs:
+            self.add(prompt, vector, outputs)
+
+    def stats(self):
+        """Return hit/miss counters and the number of stored prompts"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_semantic_cache():
+    """
+    Return the process-wide semantic cache configured by SEMANTIC_CACHE_PATH
+
+    Returns:
+        A shared SemanticStageCache, or None when SEMANTIC_CACHE_PATH is not set
+    """
+    global _default_cache
+
+    if not SEMANTIC_CACHE_PATH:
+        return None
+
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = SemanticStageCache()
+        return _default_cache
@@ -0,0 +1,405 @@
+"""
+Story Generation Service
+
+This module serves story generation over a small local HTTP API. Jobs are
+accepted into a bounded queue and run by a fixed pool of worker threads on
+reusable crews in the same long-lived process, so crewai, the agents and the
+models are only loaded once. When the queue is full new jobs are rejected
+with 429 and a Retry-After estimate instead of piling up.
+
+Endpoints:
+    POST   /jobs        {"prompt": "...", "id": optional string} -> 202 with the job id
+    GET    /jobs        All known jobs without their results
+    GET    /jobs/<id>   Job status, and the story and run report once done
+    DELETE /jobs/<id>   Cancel a job that has not started yet
+    GET    /health      Queue depth, busy workers, throughput and the LLM concurrency limit
+"""
+
+import argparse
+import json
+import math
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+
+# config reads the environment at import time, so .env has to be loaded first
+load_dotenv()
+
+from artifacts import RunArtifactStore, get_default_artifact_store
+from concurrency import get_default_concurrency_limiter
+from config import (SERVICE_HOST, SERVICE_PORT, SERVICE_WORKERS, SERVICE_QUEUE_SIZE, SERVICE_MAX_FINISHED_JOBS,
+                    SERVICE_DEFAULT_RETRY_AFTER, SERVICE_ARTIFACT_DIR, OLLAMA_WARMUP)
+
+FINISHED = ("done", "error", "cancelled")
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is full"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Job queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class StoryJob:
+    """A single story request and its outcome"""
+
+    def __init__(self, prompt, job_id=None):
+        self.id = job_id or uuid.uuid4().hex[:12]
+        self.prompt = prompt
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.report = None
+        self.error = None
+        self.artifacts = None
+
+    def as_dict(self, include_result=True):
+        record = {
+            "id": self.id,
+            "prompt": self.prompt,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+        if self.error:
+            record["error"] = self.error
+        if self.artifacts:
+            record["artifacts"] = self.artifacts
+        if include_result and self.status == "done":
+            record["result"] = self.result
+            record["report"] = self.report
+        return record
+
+
+@contextmanager
+def _fresh_crew(crew_factory, story_prompt):
+    """Build a throwaway crew for one job"""
+    yield crew_factory(story_prompt)
+
+
+class StoryJobQueue:
+    """Bounded job queue drained by a fixed pool of crew workers"""
+
+    def __init__(self, workers=SERVICE_WORKERS, max_queue=SERVICE_QUEUE_SIZE,
+                 max_finished=SERVICE_MAX_FINISHED_JOBS, crew_factory=None, artifact_store=None):
+        """
+        Initialize the job queue
+
+        Args:
+            workers: Number of crews running at the same time
+            max_queue: Jobs that may wait for a worker before submissions are rejected
+            max_finished: Finished jobs kept for status queries; older ones are forgotten
+            crew_factory: Optional callable taking a prompt and returning an object with
+                write_story(); by default jobs run on a crew_template.StoryCrewTemplate
+                holding one reusable crew per worker
+            artifact_store: artifacts.RunArtifactStore the default crews write each job's files
+                to; defaults to ARTIFACT_DIR, or else SERVICE_ARTIFACT_DIR, so concurrent jobs
+                never share the fixed output file names
+        """
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+
+        self.workers = workers
+        self.max_finished = max_finished
+        if crew_factory is None:
+            from crew_template import StoryCrewTemplate
+            if artifact_store is None:
+                artifact_store = get_default_artifact_store() or RunArtifactStore(SERVICE_ARTIFACT_DIR)
+            self.template = StoryCrewTemplate(size=workers, artifact_store=artifact_store)
+            self._checkout = self.template.checkout
+        else:
+            self.template = None
+            self._checkout = lambda story_prompt: _fresh_crew(crew_factory, story_prompt)
+
+        # Capacity is enforced in submit() on the waiting jobs only, so cancelled jobs
+        # still sitting in the queue don't count against it
+        self.max_queue = max_queue
+        self._queue = queue.Queue()
+        self._waiting = 0
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._busy = 0
+        self._completed = 0
+        self._avg_duration = None
+        # Process-wide limit on Ollama calls shared by every worker's crew
+        self.limiter = get_default_concurrency_limiter()
+
+    def start(self):
+        """Start the worker threads"""
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"story-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """Let the workers finish their current job and exit"""
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, prompt, job_id=None):
+        """
+        Queue a story job
+
+        Returns:
+            The queued StoryJob
+
+        Raises:
+            QueueFullError: When the queue is at capacity
+        """
+        job = StoryJob(prompt, job_id)
+        with self._lock:
+            if job.id in self._jobs:
+                raise ValueError(f"Job {job.id} already exists")
+            if self._waiting >= self.max_queue:
+                raise QueueFullError(self.retry_after())
+            self._queue.put(job)
+            self._waiting += 1
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        """Return a job by id, or None when it is unknown"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        """Return every known job, oldest first"""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id):
+        """
+        Cancel a job that is still waiting in the queue
+
+        Returns:
+            True when the job was cancelled, False when it is unknown or already started
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != "queued":
+                return False
+            job.status = "cancelled"
+            job.finished_at = time.time()
+            self._waiting -= 1
+            return True
+
+    def retry_after(self):
+        """Estimate the seconds until a queue slot frees up"""
+        if self._avg_duration is None:
+            return SERVICE_DEFAULT_RETRY_AFTER
+        # A slot opens as soon as the first of the running jobs finishes
+        return max(1, math.ceil(self._avg_duration / self.workers))
+
+    def stats(self):
+        """Return queue depth, worker usage and throughput"""
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {
+                "workers": self.workers,
+                "busy_workers": self._busy,
+                "queued": self._waiting,
+                "queue_capacity": self.max_queue,
+                "completed": self._completed,
+                "avg_job_seconds": round(self._avg_duration, 3) if self._avg_duration is not None else None,
+                "jobs": counts,
+                "llm_concurrency": self.limiter.snapshot() if self.limiter is not None else None
+            }
+
+    def _worker(self):
+        """Run queued jobs until a stop sentinel arrives"""
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+
+            with self._lock:
+                if job.status == "cancelled":
+                    continue
+                self._waiting -= 1
+                job.status = "running"
+                job.started_at = time.time()
+                self._busy += 1
+
+            try:
+                with self._checkout(job.prompt) as crew:
+                    try:
+                        result = crew.write_story()
+                    finally:
+                        job.artifacts = (getattr(crew, "report", None) or {}).get("artifacts")
+                    job.result = str(result)
+                    job.report = getattr(crew, "report", None)
+                job.status = "done"
+            except Exception as e:
+                job.error = str(e)
+                job.status = "error"
+            finally:
+                job.finished_at = time.time()
+                self._finish(job)
+
+    def _finish(self, job):
+        """Update throughput stats and forget the oldest finished jobs"""
+        duration = job.finished_at - job.started_at
+        with self._lock:
+            self._busy -= 1
+            self._completed += 1
+            # Exponential moving average keeps the Retry-After estimate current
+            if self._avg_duration is None:
+                self._avg_duration = duration
+            else:
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+
+            finished = [job_id for job_id, entry in self._jobs.items() if entry.status in FINISHED]
+            for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+                del self._jobs[job_id]
+
+
+def _handler_class(jobs):
+    """Build a request handler bound to a job queue"""
+
+    class StoryServiceHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, payload, headers=None):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _job_id(self):
+            parts = self.path.rstrip("/").split("/")
+            return parts[2] if len(parts) == 3 and parts[1] == "jobs" else None
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json(200, jobs.stats())
+            elif self.path.rstrip("/") == "/jobs":
+                self._send_json(200, {"jobs": [job.as_dict(include_result=False) for job in jobs.jobs()]})
+            elif self._job_id():
+                job = jobs.get(self._job_id())
+                if job is None:
+                    self._send_json(404, {"error": "Unknown job"})
+                else:
+                    self._send_json(200, job.as_dict())
+            else:
+                self._send_json(404, {"error": "Not found"})
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/jobs":
+                self._send_json(404, {"error": "Not found"})
+                return
+
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                prompt = (payload.get("prompt") or "").strip()
+            except (ValueError, AttributeError):
+                self._send_json(400, {"error": "Body must be a JSON object"})
+                return
+            if not prompt:
+                self._send_json(400, {"error": "A non-empty prompt is required"})
+                return
+            job_id = payload.get("id")
+            if job_id is not None and (not isinstance(job_id, str) or not job_id or "/" in job_id):
+                self._send_json(400, {"error": "id must be a non-empty string without '/'"})
+                return
+
+            try:
+                job = jobs.submit(prompt, job_id)
+            except QueueFullError as e:
+                self._send_json(429, {"error": str(e), "retry_after": e.retry_after},
+                                headers={"Retry-After": str(e.retry_after)})
+                return
+            except ValueError as e:
+                self._send_json(409, {"error": str(e)})
+                return
+
+            self._send_json(202, job.as_dict(), headers={"Location": f"/jobs/{job.id}"})
+
+        def do_DELETE(self):
+            job_id = self._job_id()
+            if job_id is None or jobs.get(job_id) is None:
+                self._send_json(404, {"error": "Unknown job"})
+            elif jobs.cancel(job_id):
+                self._send_json(200, jobs.get(job_id).as_dict())
+            else:
+                self._send_json(409, {"error": "Job has already started"})
+
+    return StoryServiceHandler
+
+
+def create_server(jobs, host=SERVICE_HOST, port=SERVICE_PORT):
+    """
+    Create the HTTP server for a job queue
+
+    Args:
+        jobs: The StoryJobQueue that requests are served from
+        host: Interface to bind to
+        port: Port to bind to; 0 picks a free port
+
+    Returns:
+        A ThreadingHTTPServer; call serve_forever() to start serving
+    """
+    httpd = ThreadingHTTPServer((host, port), _handler_class(jobs))
+    httpd.daemon_threads = True
+    return httpd
+
+
+def main():
+    """Command-line entry point for the service"""
+    parser = argparse.ArgumentParser(description="Serve story generation over HTTP")
+    parser.add_argument("--host", default=SERVICE_HOST, help="Interface to bind to")
+    parser.add_argument("--port", type=int, default=SERVICE_PORT, help="Port to listen on")
+    parser.add_argument("-w", "--workers", type=int, default=SERVICE_WORKERS, help="Crews to run at once")
+    parser.add_argument("-q", "--queue-size", type=int, default=SERVICE_QUEUE_SIZE,
+                        help="Jobs that may wait before new ones are rejected")
+    args = parser.parse_args()
+
+    # Import crewai and pin the models once, before the first job arrives
+    import crew  # noqa: F401
+    if OLLAMA_WARMUP:
+        from warmup import preload_models, release_models, print_warmup_report
+        print("Preloading models...")
+        print_warmup_report(preload_models())
+
+    jobs = StoryJobQueue(workers=args.workers, max_queue=args.queue_size)
+    jobs.start()
+    httpd = create_server(jobs, args.host, args.port)
+    print(f"Story service listening on http://{args.host}:{httpd.server_address[1]} "
+          f"({args.workers} workers, queue size {args.queue_size})")
+
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+    finally:
+        httpd.server_close()
+        jobs.stop(timeout=5)
+        if jobs.template is not None:
+            jobs.template.close()
+        if OLLAMA_WARMUP:
+            release_models()
+
+
+if __name__ == "__main__":
+    main()
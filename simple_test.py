@@ -1,18 +1,48 @@
 #!/usr/bin/env python3
 """
-Simple test script to verify Ollama connection and basic functionality
+Setup test and throughput diagnostic for the Ollama server configured in config.py
+
+The script checks that Ollama answers at OLLAMA_URL and that a ChatOllama
+call to the crew's first model succeeds. With --benchmark it then benchmarks
+every model the crew is configured to use: load time, time to first token and
+prefill/decode tokens per second at several prompt lengths, and aggregate
+throughput at 1..N concurrent requests. The results are written to a JSON
+report, for sizing num_ctx, Ollama's parallel slots (OLLAMA_NUM_PARALLEL) and
+BATCH_CONCURRENCY on a new inference host. --cold-load unloads each model
+first to measure a cold load, which evicts models other clients are using.
 """
 
+import argparse
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
 import requests
+from dotenv import load_dotenv
 from langchain_ollama import ChatOllama
 
-def test_ollama_connection():
+load_dotenv()
+from cassette import cassette_transport
+from config import OLLAMA_URL, OLLAMA_CASSETTE, OLLAMA_CASSETTE_MODE, STAGE_LLM_SETTINGS, ollama_model_name
+from context_budget import CHARS_PER_TOKEN
+from deadlines import LatencyHistogram
+from warmup import configured_models
+
+PROMPT_FILLER = ("The archive ship drifted past the last beacon of the old colonies, its crew asleep and its "
+                 "navigator awake, counting stars that no longer matched any chart she had learned. ")
+PROMPT_TASK = "\n\nSummarise the passage above in one paragraph."
+
+
+def check_ollama_connection(base_url=OLLAMA_URL):
     """Test if Ollama is running and accessible"""
     try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=5)
+        response = requests.get(f"{base_url}/api/tags", timeout=5)
         if response.status_code == 200:
             models = response.json().get('models', [])
-            print(f"✅ Ollama is running with {len(models)} models available:")
+            print(f"✅ Ollama is running at {base_url} with {len(models)} models available:")
             for model in models[:3]:  # Show first 3 models
                 print(f"  - {model.get('name', 'Unknown')}")
             return True
@@ -23,44 +53,319 @@ def test_ollama_connection():
         print(f"❌ Cannot connect to Ollama: {e}")
         return False
 
-def test_langchain_ollama():
+def check_langchain_ollama(model, base_url=OLLAMA_URL):
     """Test basic LangChain Ollama functionality"""
     try:
-        # Create a simple ChatOllama instance
+        # Create a simple ChatOllama instance; OLLAMA_CASSETTE_MODE records or replays its calls
+        transport = cassette_transport()
         llm = ChatOllama(
-            model="llama3.2",
-            temperature=0.7
+            model=model,
+            base_url=base_url,
+            temperature=0.7,
+            sync_client_kwargs={"transport": transport} if transport is not None else None
         )
-        
+
         # Test a simple completion
-        print("\n🧪 Testing LangChain Ollama...")
+        print(f"\n🧪 Testing LangChain Ollama with {model}...")
         response = llm.invoke("Write a one-sentence story about a robot learning to dance.")
         print(f"✅ LangChain Ollama test successful!")
         print(f"Response: {response.content[:100]}...")
         return True
-        
+
     except Exception as e:
         print(f"❌ LangChain Ollama test failed: {e}")
         return False
 
+def build_prompt(tokens):
+    """
+    Build a prompt of roughly the given number of tokens
+
+    Every prompt starts with a fresh nonce, so no part of it can be served from
+    the server's prompt cache and the whole prompt is prefilled.
+    """
+    nonce = f"[{uuid.uuid4().hex}] "
+    chars = max(0, tokens * CHARS_PER_TOKEN - len(nonce) - len(PROMPT_TASK))
+    body = (PROMPT_FILLER * (chars // len(PROMPT_FILLER) + 1))[:chars]
+    return nonce + body + PROMPT_TASK
+
+def default_num_ctx(model, prompt_lengths, num_predict):
+    """
+    Context size to benchmark a model with
+
+    Returns:
+        The largest num_ctx a stage configures for the model, or else the smallest
+        power of two (at least 2048) that fits the longest prompt and the response
+    """
+    configured = [settings["num_ctx"] for settings in STAGE_LLM_SETTINGS.values()
+                  if settings.get("num_ctx") and ollama_model_name(settings["model"]) == model]
+    if configured:
+        return max(configured)
+    num_ctx = 2048
+    while num_ctx < max(prompt_lengths) + num_predict:
+        num_ctx *= 2
+    return num_ctx
+
+def unload_model(model, base_url=OLLAMA_URL):
+    """Ask the server to unload a model so its next load is cold"""
+    response = requests.post(f"{base_url}/api/generate", json={"model": model, "keep_alive": 0}, timeout=60)
+    response.raise_for_status()
+
+def load_model(model, num_ctx, base_url=OLLAMA_URL, timeout=600):
+    """
+    Load a model with an empty request and time it
+
+    Returns:
+        A dict with the load time reported by the server and the request's wall time
+    """
+    started = time.perf_counter()
+    response = requests.post(
+        f"{base_url}/api/generate",
+        json={"model": model, "prompt": "", "stream": False, "options": {"num_ctx": num_ctx}},
+        timeout=timeout
+    )
+    response.raise_for_status()
+    return {
+        "cold_load_s": round((response.json().get("load_duration") or 0) / 1e9, 3),
+        "request_s": round(time.perf_counter() - started, 3)
+    }
+
+def _rate(count, duration_ns):
+    """Tokens per second from a count and a duration in nanoseconds, or None"""
+    return round(count / (duration_ns / 1e9), 1) if count and duration_ns else None
+
+def timed_chat(model, prompt, num_ctx, num_predict, base_url=OLLAMA_URL, timeout=600):
+    """
+    Send one streaming chat request and measure it
+
+    Args:
+        model: Model to call
+        prompt: User message
+        num_ctx: Context size the model is loaded with
+        num_predict: Maximum tokens to generate
+        base_url: Ollama server URL
+        timeout: Seconds the request may take
+
+    Returns:
+        A dict with the time to first token, wall time, token counts and the
+        prefill and decode rates reported by the server
+    """
+    started = time.perf_counter()
+    ttft = None
+    final = {}
+    with requests.post(
+        f"{base_url}/api/chat",
+        json={
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": True,
+            "options": {"num_ctx": num_ctx, "num_predict": num_predict, "temperature": 0}
+        },
+        stream=True,
+        timeout=timeout
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if ttft is None and (chunk.get("message") or {}).get("content"):
+                ttft = time.perf_counter() - started
+            if chunk.get("done"):
+                final = chunk
+
+    return {
+        "ttft_s": round(ttft, 4) if ttft is not None else None,
+        "wall_s": round(time.perf_counter() - started, 4),
+        "prompt_tokens": final.get("prompt_eval_count", 0),
+        "completion_tokens": final.get("eval_count", 0),
+        "prefill_tokens_per_s": _rate(final.get("prompt_eval_count"), final.get("prompt_eval_duration")),
+        "decode_tokens_per_s": _rate(final.get("eval_count"), final.get("eval_duration"))
+    }
+
+def benchmark_prompt_lengths(model, prompt_lengths, num_ctx, num_predict, base_url=OLLAMA_URL):
+    """Measure time to first token and prefill/decode rates of single requests at each prompt length"""
+    results = []
+    for tokens in prompt_lengths:
+        try:
+            results.append({"target_prompt_tokens": tokens,
+                            **timed_chat(model, build_prompt(tokens), num_ctx, num_predict, base_url)})
+        except Exception as e:
+            results.append({"target_prompt_tokens": tokens, "error": str(e)})
+    return results
+
+def concurrency_levels(max_concurrency):
+    """Powers of two up to max_concurrency, and max_concurrency itself"""
+    levels, level = [], 1
+    while level < max_concurrency:
+        levels.append(level)
+        level *= 2
+    return levels + [max_concurrency]
+
+def benchmark_concurrency(model, levels, prompt_tokens, num_ctx, num_predict, rounds=2, base_url=OLLAMA_URL):
+    """
+    Measure aggregate throughput with several requests in flight
+
+    Args:
+        model: Model to call
+        levels: Numbers of concurrent requests to try
+        prompt_tokens: Approximate prompt size of every request
+        num_ctx: Context size the model is loaded with
+        num_predict: Maximum tokens to generate per request
+        rounds: Requests each concurrent client sends one after the other
+        base_url: Ollama server URL
+
+    Returns:
+        A list with one result per level: request and error counts, wall time,
+        generated tokens per second across all requests and time-to-first-token quantiles
+    """
+    results = []
+    for level in levels:
+        ttfts = LatencyHistogram()
+        lock = threading.Lock()
+        totals = {"requests": 0, "errors": 0, "completion_tokens": 0}
+
+        def _client(_):
+            for _ in range(rounds):
+                try:
+                    result = timed_chat(model, build_prompt(prompt_tokens), num_ctx, num_predict, base_url)
+                except Exception:
+                    with lock:
+                        totals["errors"] += 1
+                    continue
+                with lock:
+                    totals["requests"] += 1
+                    totals["completion_tokens"] += result["completion_tokens"]
+                    if result["ttft_s"] is not None:
+                        ttfts.observe(result["ttft_s"])
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=level) as pool:
+            list(pool.map(_client, range(level)))
+        wall_s = time.perf_counter() - started
+
+        results.append({
+            "concurrency": level,
+            **totals,
+            "wall_s": round(wall_s, 3),
+            "tokens_per_s": round(totals["completion_tokens"] / wall_s, 1) if wall_s else None,
+            "ttft_p50_s": ttfts.percentile(0.5),
+            "ttft_p95_s": ttfts.percentile(0.95)
+        })
+    return results
+
+def suggest_concurrency(results, share=0.9):
+    """Return the lowest concurrency that reaches share of the best throughput, or None"""
+    measured = [result for result in results if result["tokens_per_s"] and not result["errors"]]
+    if not measured:
+        return None
+    best = max(result["tokens_per_s"] for result in measured)
+    return min(result["concurrency"] for result in measured if result["tokens_per_s"] >= share * best)
+
+def benchmark_model(model, prompt_lengths, max_concurrency, num_predict, rounds, num_ctx=None, cold=False,
+                    base_url=OLLAMA_URL):
+    """Run every measurement for one model and return its section of the report"""
+    num_ctx = num_ctx or default_num_ctx(model, prompt_lengths, num_predict)
+    report = {"model": model, "num_ctx": num_ctx, "num_predict": num_predict, "cold_load": cold}
+    try:
+        if cold:
+            unload_model(model, base_url)
+        report["load"] = load_model(model, num_ctx, base_url)
+    except Exception as e:
+        report["error"] = f"Could not load {model}: {e}"
+        return report
+
+    report["prompt_lengths"] = benchmark_prompt_lengths(model, prompt_lengths, num_ctx, num_predict, base_url)
+    report["concurrency"] = benchmark_concurrency(model, concurrency_levels(max_concurrency), min(prompt_lengths),
+                                                  num_ctx, num_predict, rounds, base_url)
+    report["suggested_concurrency"] = suggest_concurrency(report["concurrency"])
+    return report
+
+def print_model_report(report):
+    """Print one model's benchmark results"""
+    print(f"\n📊 {report['model']} (num_ctx {report['num_ctx']})")
+    if "error" in report:
+        print(f"  ⚠️  {report['error']}")
+        return
+    label = "Cold load" if report["cold_load"] else "Load"
+    print(f"  {label}: {report['load']['cold_load_s']}s (request {report['load']['request_s']}s)")
+    for result in report["prompt_lengths"]:
+        if "error" in result:
+            print(f"  ~{result['target_prompt_tokens']:>5} prompt tokens: ⚠️  {result['error']}")
+            continue
+        print(f"  {result['prompt_tokens']:>6} prompt tokens: first token {result['ttft_s']}s, "
+              f"prefill {result['prefill_tokens_per_s']} tok/s, decode {result['decode_tokens_per_s']} tok/s")
+    for result in report["concurrency"]:
+        print(f"  {result['concurrency']:>3} concurrent: {result['tokens_per_s']} tok/s total, "
+              f"first token p50 {result['ttft_p50_s']}s / p95 {result['ttft_p95_s']}s, {result['errors']} errors")
+    suggested = report["suggested_concurrency"]
+    if suggested and suggested == report["concurrency"][-1]["concurrency"]:
+        print(f"  Throughput still grows at {suggested} concurrent requests; try a higher --max-concurrency")
+    elif suggested:
+        print(f"  Throughput levels off at {suggested} concurrent requests")
+
 def main():
     """Main test function"""
+    parser = argparse.ArgumentParser(description="Check the Ollama setup and benchmark the configured models")
+    parser.add_argument("--url", default=OLLAMA_URL, help="Ollama server to test (default: OLLAMA_URL)")
+    parser.add_argument("--models", help="Comma-separated models (default: every model in config.py)")
+    parser.add_argument("--prompt-lengths", default="128,512,2048", help="Comma-separated prompt sizes in tokens")
+    parser.add_argument("-n", "--max-concurrency", type=int, default=8, help="Most concurrent requests to try")
+    parser.add_argument("--rounds", type=int, default=2, help="Requests per concurrent client")
+    parser.add_argument("--num-predict", type=int, default=128, help="Tokens to generate per request")
+    parser.add_argument("--num-ctx", type=int, help="Context size (default: the stage setting, or fitted)")
+    parser.add_argument("--benchmark", action="store_true", help="Benchmark the models after the setup check")
+    parser.add_argument("--cold-load", action="store_true",
+                        help="Unload each model first to measure a cold load (evicts it for other clients)")
+    parser.add_argument("-o", "--output", default="ollama_diagnostic.json", help="JSON report file")
+    args = parser.parse_args()
+
+    models = [model.strip() for model in args.models.split(",")] if args.models else configured_models()
+
     print("🔍 Testing Story Writing Crew Setup")
     print("=" * 40)
-    
-    # Test Ollama connection
-    if not test_ollama_connection():
+
+    # Test Ollama connection (a replayed cassette needs no server)
+    replaying = OLLAMA_CASSETTE and OLLAMA_CASSETTE_MODE == "replay"
+    if replaying:
+        print(f"Replaying Ollama calls from: {OLLAMA_CASSETTE}")
+    elif not check_ollama_connection(args.url):
         print("\n❌ Setup test failed. Please ensure Ollama is running.")
         return
-    
+
     # Test LangChain Ollama
-    if not test_langchain_ollama():
+    if not check_langchain_ollama(models[0], args.url):
         print("\n❌ Setup test failed. Please check your Python environment.")
         return
-    
+
     print("\n✅ All tests passed! Your setup is ready.")
-    print("\nYou can now try running the full story writing crew:")
-    print("  python3 main.py")
+    if not args.benchmark or replaying:
+        print("\nYou can now try running the full story writing crew:")
+        print("  python3 main.py")
+        return
+
+    prompt_lengths = [int(length) for length in args.prompt_lengths.split(",") if length.strip()]
+    print(f"\n⏱️  Benchmarking {len(models)} model(s) at {args.url}...")
+    report = {
+        "host": args.url,
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "settings": {
+            "prompt_lengths": prompt_lengths,
+            "max_concurrency": args.max_concurrency,
+            "rounds": args.rounds,
+            "num_predict": args.num_predict,
+            "cold_load": args.cold_load
+        },
+        "models": []
+    }
+    for model in models:
+        result = benchmark_model(model, prompt_lengths, args.max_concurrency, args.num_predict, args.rounds,
+                                 args.num_ctx, cold=args.cold_load, base_url=args.url)
+        report["models"].append(result)
+        print_model_report(result)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nDiagnostic report saved to: {args.output}")
 
 if __name__ == "__main__":
     main()
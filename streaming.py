@@ -0,0 +1,141 @@
+"""
+Token Streaming
+
+This module streams tokens from each agent's LLM as they are generated. A
+StageStreamHandler is attached to the LLM of every stage; it writes tokens
+incrementally to the stage's output file and forwards them to listeners such
+as a console printer or a TokenStream iterator.
+"""
+
+import queue
+import sys
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+class StageStreamHandler(BaseCallbackHandler):
+    """Forwards the tokens of one stage to its output file and to listeners"""
+
+    def __init__(self, stage, output_file=None, listeners=None):
+        """
+        Initialize the handler
+
+        Args:
+            stage: Stage name the tokens belong to
+            output_file: File the stage's tokens are written to as they arrive
+            listeners: Callables invoked with (stage, token) for every token
+        """
+        self.stage = stage
+        self.output_file = output_file
+        self.listeners = listeners if listeners is not None else []
+
+        self.token_count = 0
+        self.started_at = None
+        self.first_token_at = None
+
+        self._file = None
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Clear the measurements of a previous run so the handler can be reused"""
+        with self._lock:
+            self.token_count = 0
+            self.started_at = None
+            self.first_token_at = None
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        """Record the start of a call"""
+        self._on_start()
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        """Record the start of a chat call"""
+        self._on_start()
+
+    def _on_start(self):
+        with self._lock:
+            if self.started_at is None:
+                self.started_at = time.perf_counter()
+            if self._file is None and self.output_file:
+                self._file = open(self.output_file, 'w', encoding='utf-8')
+            elif self._file is not None:
+                # Agents may call the LLM several times per task; keep each call apart
+                self._file.write("\n\n")
+
+    def on_llm_new_token(self, token, **kwargs):
+        """Write a token to the output file and forward it to listeners"""
+        with self._lock:
+            if self.first_token_at is None:
+                self.first_token_at = time.perf_counter()
+            self.token_count += 1
+            if self._file is not None:
+                self._file.write(token)
+                self._file.flush()
+
+        for listener in self.listeners:
+            listener(self.stage, token)
+
+    def on_llm_end(self, response, **kwargs):
+        """Flush the output file at the end of a call"""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        """Close the output file"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    @property
+    def time_to_first_token(self):
+        """Seconds from the first call starting to the first token, or None"""
+        if self.started_at is None or self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+
+class ConsolePrinter:
+    """Listener that prints tokens to the console with a header per stage"""
+
+    def __init__(self, out=None):
+        self.out = out or sys.stdout
+        self._stage = None
+        self._lock = threading.Lock()
+
+    def __call__(self, stage, token):
+        with self._lock:
+            if stage != self._stage:
+                self._stage = stage
+                self.out.write(f"\n\n--- {stage} ---\n")
+            self.out.write(token)
+            self.out.flush()
+
+
+class TokenStream:
+    """Listener that exposes the tokens as an iterator of (stage, token) tuples"""
+
+    _DONE = object()
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self.error = None
+
+    def __call__(self, stage, token):
+        self._queue.put((stage, token))
+
+    def close(self, error=None):
+        """End the stream, optionally with the error that stopped the run"""
+        self.error = error
+        self._queue.put(self._DONE)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is self._DONE:
+                if self.error is not None:
+                    raise self.error
+                return
+            yield item
@@ -5,7 +5,164 @@ This module defines the tasks for our story-writing crew, with proper dependenci
 to ensure sequential execution: Plot → Characters → Scenes → Editing
 """
 
+import re
+
 from crewai import Task
+from crewai.tasks.task_output import TaskOutput
+
+
+# Stage names, in pipeline order, for the four tasks
+STAGES = ["plot", "characters", "scenes", "editing"]
+
+# Matches act headings such as "Act 1", "## Act II: Confrontation" or "**Act Three**"
+ACT_HEADING = re.compile(r"^[\s#*_>-]*act\s+(1|2|3|iii|ii|i|one|two|three)\b", re.IGNORECASE | re.MULTILINE)
+ACT_NUMBERS = {"1": 1, "i": 1, "one": 1, "2": 2, "ii": 2, "two": 2, "3": 3, "iii": 3, "three": 3}
+
+# Scene boundaries in a draft: "* * *", "***", "---", "###", or a heading such as "## Scene 2" or "Act II"
+SCENE_BREAK = re.compile(
+    r"^\s*((\*\s*){3,}|-{3,}|#{1,6}(\s.*)?|[*_]*(act|scene|chapter|part)\s+"
+    r"(\d+|[ivx]+|one|two|three|four|five|six|seven|eight|nine|ten)\b[^.!?]*)\s*$",
+    re.IGNORECASE
+)
+
+# The notes an editor appends to an edited chunk: a heading on its own line, or "Editor's notes: ..." with the
+# first note on the same line
+EDITOR_NOTES = re.compile(
+    r"^[\s#*_]*editor'?s?\s+notes[\s*_]*(?:$|:[ \t*_]*(?P<inline>[^\n]*?)[ \t*_]*$)",
+    re.IGNORECASE | re.MULTILINE
+)
+
+
+def get_context_tasks(task):
+    """Return the tasks listed as the task's context (CrewAI leaves it unset when there are none)"""
+    return task.context if isinstance(task.context, list) else []
+
+
+def set_task_output(task, raw):
+    """
+    Mark a task as completed with a known output
+    
+    Downstream tasks that list this task in their context will read this output
+    instead of requiring the task to run.
+    
+    Args:
+        task: The task to complete
+        raw: The output text
+    """
+    task.output = TaskOutput(
+        description=task.description,
+        expected_output=task.expected_output,
+        raw=raw,
+        agent=task.agent.role if task.agent else ""
+    )
+    return task.output
+
+
+def split_acts(plot_outline):
+    """
+    Split a plot outline into its acts
+    
+    Args:
+        plot_outline: Output of the plot task
+    
+    Returns:
+        A (premise, acts) tuple: the text before the first act heading and the
+        outline text of each act in order. acts is empty when no act headings
+        are found.
+    """
+    starts = []
+    seen = set()
+    for match in ACT_HEADING.finditer(plot_outline):
+        number = ACT_NUMBERS[match.group(1).lower()]
+        if number not in seen:
+            seen.add(number)
+            starts.append(match.start())
+    
+    if not starts:
+        return plot_outline.strip(), []
+    
+    bounds = starts + [len(plot_outline)]
+    acts = [plot_outline[bounds[i]:bounds[i + 1]].strip() for i in range(len(starts))]
+    return plot_outline[:starts[0]].strip(), acts
+
+
+def stitch_acts(act_drafts):
+    """Merge separately drafted acts into a single story draft"""
+    return "\n\n* * *\n\n".join(draft.strip() for draft in act_drafts if draft.strip())
+
+
+def split_scenes(draft):
+    """
+    Split a story draft into its scenes
+    
+    A scene starts at a scene break ("* * *", "---", "###") or a heading; the
+    break or heading stays at the start of its scene, so joining the scenes
+    with blank lines gives back the draft.
+    
+    Returns:
+        The scenes in order; a draft without breaks is a single scene
+    """
+    scenes, current = [], []
+    for line in draft.strip().splitlines():
+        # A break directly followed by a heading starts one scene, not two
+        if SCENE_BREAK.match(line) and any(text.strip() and not SCENE_BREAK.match(text) for text in current):
+            scenes.append("\n".join(current).strip())
+            current = []
+        current.append(line)
+    if any(text.strip() for text in current):
+        scenes.append("\n".join(current).strip())
+    return scenes
+
+
+def chunk_scenes(scenes, max_words):
+    """
+    Group consecutive scenes into chunks of about max_words words
+    
+    Chunks end at scene boundaries; only a scene longer than max_words on its
+    own is split, at its paragraph breaks.
+    
+    Returns:
+        The chunks' text in order
+    """
+    units = []
+    for scene in scenes:
+        if len(scene.split()) > max_words:
+            units.extend(paragraph for paragraph in scene.split("\n\n") if paragraph.strip())
+        else:
+            units.append(scene)
+    
+    chunks, current, words = [], [], 0
+    for unit in units:
+        unit_words = len(unit.split())
+        if current and words + unit_words > max_words:
+            chunks.append("\n\n".join(current))
+            current, words = [], 0
+        current.append(unit)
+        words += unit_words
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def split_editor_notes(edited_chunk):
+    """
+    Separate an edited chunk from the editor notes it ends with
+    
+    Returns:
+        A (revised passage, notes) tuple; notes is empty when the editor left none
+    """
+    matches = list(EDITOR_NOTES.finditer(edited_chunk))
+    if not matches:
+        return edited_chunk.strip(), ""
+    notes = matches[-1]
+    inline = notes.group("inline") or ""
+    return edited_chunk[:notes.start()].strip(), f"{inline}\n{edited_chunk[notes.end():].strip()}".strip()
+
+
+def stitch_edited_chunks(passages, editorial_report):
+    """Merge separately edited passages and the editorial report into the editing stage's output"""
+    story = "\n\n".join(passage.strip() for passage in passages if passage.strip())
+    return f"{story}\n\n---\n\nEditorial Report\n\n{editorial_report.strip()}"
 
 
 class StoryWritingTasks:
@@ -21,13 +178,9 @@ class StoryWritingTasks:
         self.story_prompt = story_prompt
         self.tasks = self._create_tasks()
     
-    def _create_tasks(self):
-        """Create all tasks with proper dependencies"""
-        tasks = []
-        
-        # Task 1: Plot Architecture
-        plot_task = Task(
-            description=f"""
+    def _plot_description(self):
+        """Description of the plot task, the only task that embeds the story prompt"""
+        return f"""
             Create a comprehensive plot structure for the following story concept:
             "{self.story_prompt}"
             
@@ -43,7 +196,33 @@ class StoryWritingTasks:
             - Act-by-act breakdown
             - Key scenes and plot points
             - Character needs (what characters are required)
-            """,
+            """
+    
+    def bind_prompt(self, story_prompt):
+        """
+        Point the existing tasks at a new story prompt
+        
+        Rewrites the prompt-specific task descriptions and clears every task's
+        output, so the same Task objects can be reused for another story.
+        
+        Args:
+            story_prompt: The new story concept or prompt
+        """
+        self.story_prompt = story_prompt
+        plot_task = self.tasks[0]
+        plot_task.description = self._plot_description()
+        # CrewAI remembers the first description it saw for input interpolation
+        plot_task._original_description = None
+        for task in self.tasks:
+            task.output = None
+    
+    def _create_tasks(self):
+        """Create all tasks with proper dependencies"""
+        tasks = []
+        
+        # Task 1: Plot Architecture
+        plot_task = Task(
+            description=self._plot_description(),
             expected_output="A detailed plot structure with three-act breakdown, key plot points, themes, and character requirements",
             agent=None,  # Will be assigned when creating the crew
             output_file="plot_structure.txt"
@@ -135,3 +314,180 @@ class StoryWritingTasks:
         self.tasks[3].agent = narrative_editor
         
         return self.tasks
+    
+    def create_act_tasks(self, premise, acts):
+        """
+        Create one scene-writing task per act for parallel drafting
+        
+        Each act task shares the character profiles as context and receives the
+        story premise plus its own act outline.
+        
+        Args:
+            premise: Story premise and theme from the plot outline
+            acts: Outline text of each act
+        
+        Returns:
+            A list of act tasks without agents assigned
+        """
+        character_task = self.tasks[1]
+        total = len(acts)
+        min_words, max_words = 1000 // total, 2000 // total
+        
+        act_tasks = []
+        for number, act_outline in enumerate(acts, 1):
+            if number == 1:
+                continuity = "Open the story and establish the characters and setting"
+            else:
+                continuity = f"Begin right after the events of Act {number - 1}"
+            
+            act_tasks.append(Task(
+                description=f"""
+            Using the character profiles, write Act {number} of {total} of the short story
+            for the following story concept:
+            "{self.story_prompt}"
+            
+            Story premise:
+            {premise}
+            
+            Outline of this act:
+            {act_outline}
+            
+            Your act should:
+            1. Cover only the events of Act {number}; the other acts are written separately
+            2. Feature the developed characters with their unique voices
+            3. Include vivid descriptions and engaging dialogue
+            4. Be approximately {min_words}-{max_words} words
+            5. {continuity}
+            
+            Write only the prose of this act, without headings or commentary.
+            """,
+                expected_output=f"Act {number} of the short story ({min_words}-{max_words} words) following its outline",
+                agent=None,  # Will be assigned when the act is drafted
+                context=[character_task]  # All acts share the same character context
+            ))
+        
+        return act_tasks
+    
+    def create_edit_chunk_tasks(self, chunks, brief):
+        """
+        Create one editing task per chunk of the draft for parallel editing
+        
+        Instead of the full plot and character outputs, each chunk task gets a
+        compact style-and-continuity brief, plus the paragraphs right before and
+        after its chunk so the edited passages still join up.
+        
+        Args:
+            chunks: Text of each chunk of the draft, in order
+            brief: Style and continuity brief drawn from the plot and characters
+        
+        Returns:
+            A list of chunk editing tasks without agents assigned
+        """
+        total = len(chunks)
+        chunk_tasks = []
+        for number, chunk in enumerate(chunks, 1):
+            before = chunks[number - 2].split("\n\n")[-1] if number > 1 else "(this is the opening of the story)"
+            after = chunks[number].split("\n\n")[0] if number < total else "(this is the end of the story)"
+            
+            chunk_tasks.append(Task(
+                description=f"""
+            Edit part {number} of {total} of a short story. The other parts are edited separately.
+            
+            Style and continuity brief:
+            {brief}
+            
+            The passage right before this part (for continuity only, do not edit it):
+            {before}
+            
+            Part {number} to edit:
+            {chunk}
+            
+            The passage right after this part (for continuity only, do not edit it):
+            {after}
+            
+            Edit part {number} for:
+            1. Narrative flow, pacing and vivid, clear description
+            2. Character consistency and voice, following the brief
+            3. Dialogue quality and authenticity
+            4. Grammar, punctuation, and style
+            
+            Keep any scene break or heading at its start, keep the events and their order,
+            and make the part join up with the passages around it.
+            Return the revised part only, followed by a line "Editor notes:" and at most
+            three short bullet points on what you changed and why.
+            """,
+                expected_output=f"The revised part {number} of the story followed by brief editor notes",
+                agent=None  # Will be assigned when the chunk is edited
+            ))
+        
+        return chunk_tasks
+    
+    def create_edit_report_task(self, chunk_notes):
+        """
+        Create the final editing pass that writes the editorial report for a chunked edit
+        
+        Args:
+            chunk_notes: Editor notes of each edited chunk, in order
+        
+        Returns:
+            The report task without an agent assigned
+        """
+        notes = "\n\n".join(
+            f"Part {number}:\n{note or '(no notes)'}" for number, note in enumerate(chunk_notes, 1)
+        )
+        return Task(
+            description=f"""
+            The story "{self.story_prompt}" was edited in {len(chunk_notes)} parts. These are the
+            editors' notes for each part:
+            
+            {notes}
+            
+            Write a brief editorial report for the whole story: the main improvements made and
+            why, grouped by theme (coherence and flow, character consistency, pacing, dialogue,
+            description, style) rather than by part.
+            """,
+            expected_output="A brief editorial report highlighting the changes made and why",
+            agent=None  # Will be assigned when the report is written
+        )
+    
+    def create_variant_tasks(self, number, total):
+        """
+        Create a scene-writing and an editing task for one story variant
+        
+        The variant tasks take the shared plot and character tasks as context, so
+        several variants can be drafted from a single plot and cast. Each one is
+        told which variant it is, which steers it in its own direction and keeps
+        its prompts (and LLM cache entries) apart from the other variants.
+        
+        Args:
+            number: Variant number, starting at 1
+            total: Number of variants being written
+        
+        Returns:
+            A (scene task, editing task) tuple without agents assigned
+        """
+        plot_task, character_task, scene_task, editing_task = self.tasks
+        variant_note = f"""
+            This is variant {number} of {total} written from the same plot and characters.
+            Give it its own voice, imagery and scene choices so it stands apart from the others.
+            """
+        
+        variant_scene_task = Task(
+            description=scene_task.description + variant_note,
+            expected_output=scene_task.expected_output,
+            agent=None,  # Will be assigned when the variant is written
+            context=[plot_task, character_task],
+            output_file=f"story_draft_v{number}.txt"
+        )
+        variant_editing_task = Task(
+            description=editing_task.description,
+            expected_output=editing_task.expected_output,
+            agent=None,  # Will be assigned when the variant is written
+            context=[plot_task, character_task, variant_scene_task],
+            output_file=f"final_story_v{number}.txt"
+        )
+        return variant_scene_task, variant_editing_task
+    
+    def get_stage_tasks(self):
+        """Return (stage name, task) pairs in pipeline order"""
+        return list(zip(STAGES, self.tasks))
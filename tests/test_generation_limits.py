@@ -0,0 +1,139 @@
+"""Tests for the streaming generation limits"""
+
+from langchain_core.messages import HumanMessage
+
+from config import STAGE_LIMIT_DEFAULTS
+from fake_ollama import FakeOllamaServer
+from generation_limits import CharacterLimit, StageChatOllama, StageValidator, WordLimit, count_profiles
+
+SHEET = """# Character Profiles
+
+## Mara Quinn
+**Role:** Protagonist, night-shift engineer on the relay station
+
+### Background
+Grew up on the orbital docks and took the station job to pay off her brother's debts.
+
+### Motivation
+Keep the station running long enough for the relief crew to arrive.
+
+### Arc
+Learns to trust the crew she has always kept at arm's length.
+
+### Relationships
+1. **Tomas Reyes** - her supervisor, whom she resents
+2. **Ilse Varga** - the only friend she has aboard
+
+## Tomas Reyes
+**Role:** Station supervisor
+
+### Background
+A veteran of three deep-space postings who no longer believes in rescue.
+
+### Motivation
+Protect the crew from a truth he has hidden from them.
+
+## Ilse Varga
+**Role:** Communications officer
+
+### Background
+Joined the station to get away from a family that runs the shipping guild.
+
+### Motivation
+Send the distress call no one else will.
+"""
+
+EXTRA_PROFILE = """
+## Dmitri Holt
+**Role:** Stowaway
+"""
+
+
+def stream(limit, text):
+    """Feed a response to a limit one line at a time and return the first reason it stops with"""
+    for line in ("Thought: I now know the characters\nFinal Answer:\n" + text).splitlines(keepends=True):
+        reason = limit(line)
+        if reason:
+            return reason
+    return None
+
+
+def test_counts_top_level_profiles_of_a_sectioned_sheet():
+    assert count_profiles(SHEET) == 3
+
+
+def test_sheet_title_and_subsections_do_not_stop_the_limit():
+    assert stream(CharacterLimit(3), SHEET) is None
+
+
+def test_stops_when_a_profile_beyond_the_limit_starts():
+    assert stream(CharacterLimit(3), SHEET + EXTRA_PROFILE) == CharacterLimit.reason
+
+
+def test_name_lines_take_precedence_over_section_headings():
+    sheet = "\n".join(
+        f"**Name:** {name}\n## Background\nA life.\n## Motivation\nA goal.\n"
+        for name in ("Mara Quinn", "Tomas Reyes")
+    )
+    assert count_profiles(sheet) == 2
+
+
+def test_character_numbers_and_numbered_names():
+    assert count_profiles("Character 1: Mara\nAge 34\n\nCharacter 2: Tomas\nAge 51\n") == 2
+    assert count_profiles("1. **Mara Quinn** - engineer\n2. **Tomas Reyes** - supervisor\n") == 2
+
+
+def test_character_limit_is_off_by_default():
+    assert "max_characters" not in STAGE_LIMIT_DEFAULTS["characters"]
+
+
+def paragraphs(count, words):
+    """A final answer of count paragraphs of words words each"""
+    return "\n\n".join(" ".join(["word"] * words) for _ in range(count))
+
+
+def stream_tokens(limit, text):
+    """Feed a response to a limit one word at a time; return the reason it stops with and the text fed so far"""
+    fed = ""
+    for token in ("Thought: I can write it\nFinal Answer:\n" + text).split(" "):
+        fed += token + " "
+        reason = limit(token + " ")
+        if reason:
+            return reason, fed
+    return None, fed
+
+
+def test_word_limit_stops_at_the_first_paragraph_break_past_the_limit():
+    reason, fed = stream_tokens(WordLimit(50), paragraphs(6, 30))
+    assert reason == WordLimit.reason
+    answer = fed.split("Final Answer:")[1]
+    assert 50 <= len(answer.split()) <= 70
+
+
+def test_word_limit_stops_without_a_paragraph_break_at_the_hard_limit():
+    reason, fed = stream_tokens(WordLimit(100), paragraphs(1, 400))
+    assert reason == WordLimit.reason
+    assert len(fed.split("Final Answer:")[1].split()) < 140
+
+
+def test_word_limit_lets_a_short_answer_finish():
+    assert stream_tokens(WordLimit(500), paragraphs(3, 30))[0] is None
+
+
+def test_stage_validator_stops_with_the_first_limit_met():
+    assert not StageValidator()
+    assert stream_tokens(StageValidator(max_words=50).start(), paragraphs(6, 30))[0] == WordLimit.reason
+    assert stream(StageValidator(max_words=5000, max_characters=3).start(), SHEET + EXTRA_PROFILE) == \
+        CharacterLimit.reason
+
+
+def test_early_stop_is_recorded_as_the_done_reason():
+    with FakeOllamaServer(latency=0.0, tokens_per_sec=100000, output_tokens=600) as server:
+        llm = StageChatOllama(model="llama3.2", base_url=server.url, validator=StageValidator(max_words=50))
+        generation = llm._generate([HumanMessage(content="Write a story")]).generations[0]
+
+    info = generation.generation_info
+    assert info["done_reason"] == WordLimit.reason
+    assert info["eval_count"] < 600
+    # Ollama sends the prompt's token count with its last part, which an early stop never reads
+    assert info["prompt_eval_count"] is None
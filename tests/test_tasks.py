@@ -0,0 +1,33 @@
+"""Tests for splitting edited chunks into passages and editor notes"""
+
+from tasks import split_editor_notes
+
+PASSAGE = "The relay hummed through the night.\n\nMara waited for the call that never came."
+
+
+def test_notes_under_a_heading():
+    passage, notes = split_editor_notes(f"{PASSAGE}\n\n**Editor's Notes:**\n- Tightened pacing\n- Cut a repeated line")
+    assert passage == PASSAGE
+    assert notes == "- Tightened pacing\n- Cut a repeated line"
+
+
+def test_notes_starting_on_the_heading_line():
+    passage, notes = split_editor_notes(f"{PASSAGE}\n\nEditor's notes: tightened pacing in the second scene.\n"
+                                        "Kept Mara's voice terse.")
+    assert passage == PASSAGE
+    assert notes == "tightened pacing in the second scene.\nKept Mara's voice terse."
+
+
+def test_bold_inline_notes():
+    passage, notes = split_editor_notes(f"{PASSAGE}\n\n**Editor notes:** cut the flashback.")
+    assert passage == PASSAGE
+    assert notes == "cut the flashback."
+
+
+def test_chunk_without_notes():
+    assert split_editor_notes(f"{PASSAGE}\n") == (PASSAGE, "")
+
+
+def test_prose_mentioning_editor_notes_is_not_split():
+    text = "She read the editor's notes twice before she slept."
+    assert split_editor_notes(text) == (text, "")
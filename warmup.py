@@ -0,0 +1,106 @@
+"""
+Model Warm-up
+
+This module preloads every model the crew will use before the first agent
+call, in parallel, and pins them in memory with an explicit keep-alive for the
+lifetime of a run or batch. The cold-load time of each model is reported on
+its own so it is not mistaken for generation time.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from config import OLLAMA_URL, OLLAMA_URLS, OLLAMA_KEEP_ALIVE, OLLAMA_RELEASE_KEEP_ALIVE, STAGE_LLM_SETTINGS, ollama_model_name, ollama_model_tag
+
+
+def configured_models():
+    """Return the distinct models used by the crew's stages"""
+    return sorted({ollama_model_name(settings['model']) for settings in STAGE_LLM_SETTINGS.values()})
+
+
+def loaded_models(base_url=OLLAMA_URL):
+    """Return the tagged names ("llama3.2:latest") of the models currently loaded on the server"""
+    response = requests.get(f"{base_url}/api/ps", timeout=5)
+    response.raise_for_status()
+    return {ollama_model_tag(model['name']) for model in response.json().get('models', []) if model.get('name')}
+
+
+def _load(model, keep_alive, base_url, timeout, already_loaded):
+    """Load one model with an empty generate request and time it"""
+    started = time.perf_counter()
+    try:
+        response = requests.post(
+            f"{base_url}/api/generate",
+            json={"model": model, "prompt": "", "keep_alive": keep_alive, "stream": False},
+            timeout=timeout
+        )
+        response.raise_for_status()
+        body = response.json()
+        return {
+            "model": model,
+            "endpoint": base_url,
+            "ok": True,
+            "already_loaded": already_loaded,
+            "cold_load_s": round((body.get("load_duration") or 0) / 1e9, 3),
+            "request_s": round(time.perf_counter() - started, 3)
+        }
+    except Exception as e:
+        return {
+            "model": model,
+            "endpoint": base_url,
+            "ok": False,
+            "error": str(e),
+            "request_s": round(time.perf_counter() - started, 3)
+        }
+
+
+def preload_models(models=None, keep_alive=OLLAMA_KEEP_ALIVE, base_urls=None, timeout=600, only_loaded=False):
+    """
+    Load models in parallel on every endpoint and pin them with a keep-alive
+
+    Args:
+        models: Model names to load (defaults to every configured model)
+        keep_alive: How long the server keeps each model loaded (e.g. "30m", -1 for forever)
+        base_urls: Ollama server URLs (defaults to OLLAMA_URLS)
+        timeout: Seconds to wait for a single model to load
+        only_loaded: Only re-set the keep-alive of models an endpoint already has loaded;
+            models that are not loaded are skipped rather than loaded
+
+    Returns:
+        A list of per-model, per-endpoint results with the cold-load time reported by the server
+    """
+    models = models or configured_models()
+    jobs = []
+    for base_url in base_urls or OLLAMA_URLS:
+        try:
+            loaded = loaded_models(base_url)
+        except Exception:
+            loaded = set()
+        for model in models:
+            already_loaded = ollama_model_tag(model) in loaded
+            if already_loaded or not only_loaded:
+                jobs.append((model, base_url, already_loaded))
+    if not jobs:
+        return []
+
+    with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        return list(pool.map(lambda job: _load(job[0], keep_alive, job[1], timeout, job[2]), jobs))
+
+
+def release_models(models=None, keep_alive=OLLAMA_RELEASE_KEEP_ALIVE, base_urls=None):
+    """Hand pinned models back to the server's normal keep-alive once a run or batch ends (loaded models only)"""
+    return preload_models(models, keep_alive=keep_alive, base_urls=base_urls, timeout=60, only_loaded=True)
+
+
+def print_warmup_report(results):
+    """Print the outcome of a warm-up"""
+    for result in results:
+        name = f"{result['model']} @ {result['endpoint']}" if len(OLLAMA_URLS) > 1 else result['model']
+        if result["ok"] and result["already_loaded"]:
+            print(f"  ✓ {name}: already loaded")
+        elif result["ok"]:
+            print(f"  ✓ {name}: cold load {result['cold_load_s']}s (request {result['request_s']}s)")
+        else:
+            print(f"  ⚠️  {name}: could not preload ({result['error']})")